@@ -1,6 +1,7 @@
 import os
 from pathlib import Path
 from datetime import timedelta
+from django.core.exceptions import ImproperlyConfigured
 try:
     from dotenv import load_dotenv
     load_dotenv()
@@ -38,6 +39,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',  # Must be top
+    'core.middleware.RequestMetricsMiddleware', # No-op unless REQUEST_METRICS=True
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware', # <--- Add this after SecurityMiddleware
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -74,10 +76,65 @@ WSGI_APPLICATION = 'config.wsgi.application'
 DATABASES = {
     'default': dj_database_url.config(
         default=f"sqlite:///{BASE_DIR / 'db.sqlite3'}",
-        conn_max_age=600
+        # Persistent connections are per thread; under ASGI every sync_to_async
+        # thread would keep its own open, so they're off there (see ASYNC_VIEWS)
+        conn_max_age=0 if os.getenv('ASYNC_VIEWS') == 'True' else 600
     )
 }
 
+# Connection pooling on Postgres (DATABASE_POOL):
+#   unset       Django's own connections, one per thread (CONN_MAX_AGE above)
+#   'psycopg'   a psycopg pool per process, DATABASE_POOL_MAX_SIZE connections
+#               at most however many threads ask; they live on between requests,
+#               so psycopg's prepared statements get reused
+#   'pgbouncer' DATABASE_URL points at PgBouncer in transaction mode, where a
+#               session can't be relied on: no server-side cursors, and no
+#               prepared statements unless DATABASE_PREPARE_THRESHOLD is set
+#               (PgBouncer >= 1.21 with max_prepared_statements)
+DATABASE_POOL = os.getenv('DATABASE_POOL', '')
+if DATABASE_POOL not in ('', 'psycopg', 'pgbouncer'):
+    raise ImproperlyConfigured(f"DATABASE_POOL must be 'psycopg' or 'pgbouncer', not {DATABASE_POOL!r}")
+# psycopg prepares a query once a connection has run it this many times
+# (its default is 5); 'off' never prepares
+DATABASE_PREPARE_THRESHOLD = os.getenv('DATABASE_PREPARE_THRESHOLD')
+
+
+def pooled(database):
+    """Applies DATABASE_POOL to one DATABASES entry."""
+    if database['ENGINE'] != 'django.db.backends.postgresql':
+        return database
+    options = database.setdefault('OPTIONS', {})
+    if DATABASE_PREPARE_THRESHOLD is not None:
+        options['prepare_threshold'] = None if DATABASE_PREPARE_THRESHOLD == 'off' else int(DATABASE_PREPARE_THRESHOLD)
+    if DATABASE_POOL == 'psycopg':
+        # The pool keeps connections open; Django must close (return) them
+        database['CONN_MAX_AGE'] = 0
+        options['pool'] = {
+            'min_size': int(os.getenv('DATABASE_POOL_MIN_SIZE', '2')),
+            'max_size': int(os.getenv('DATABASE_POOL_MAX_SIZE', '20')),
+            'timeout': float(os.getenv('DATABASE_POOL_TIMEOUT_SECONDS', '10')),
+        }
+    elif DATABASE_POOL == 'pgbouncer':
+        database['DISABLE_SERVER_SIDE_CURSORS'] = True
+        options.setdefault('prepare_threshold', None)
+    return database
+
+
+pooled(DATABASES['default'])
+
+# Optional read replicas (comma-separated URLs), used by read-only
+# endpoints through core.replicas. Tests run them against 'default'.
+DATABASE_REPLICAS = []
+for _index, _url in enumerate(filter(None, os.getenv('DATABASE_REPLICA_URLS', '').split(',')), 1):
+    DATABASE_REPLICAS.append(f'replica{_index}')
+    DATABASES[f'replica{_index}'] = {
+        **dj_database_url.parse(_url.strip(), conn_max_age=DATABASES['default']['CONN_MAX_AGE']),
+        'TEST': {'MIRROR': 'default'},
+    }
+    pooled(DATABASES[f'replica{_index}'])
+if DATABASE_REPLICAS:
+    DATABASE_ROUTERS = ['core.replicas.ReplicaRouter']
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
@@ -111,7 +168,7 @@ AUTH_USER_MODEL = 'users.User'
 # 2. DRF Configuration
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'users.authentication.CachedJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
@@ -132,6 +189,13 @@ SIMPLE_JWT = {
     'ROTATE_REFRESH_TOKENS': True,
     'BLACKLIST_AFTER_ROTATION': True,
 }
+# Serve the token's user from the cache (users.authentication) only when
+# the cache is shared: a save can't drop a per-process copy held by the
+# other workers. Without REDIS_URL every request loads the row.
+AUTH_USER_CACHE = os.getenv('AUTH_USER_CACHE', 'True' if os.getenv('REDIS_URL') else 'False') == 'True'
+# How long the token's user is served from the cache; saving the user
+# drops it sooner (once the save commits)
+AUTH_USER_CACHE_TTL = int(os.getenv('AUTH_USER_CACHE_TTL_SECONDS', '60'))
 
 ALLOWED_HOSTS = ['*'] # In production, restrict this to your specific azure domain
 
@@ -150,4 +214,110 @@ CORS_ALLOW_ALL_ORIGINS = True
 CORS_ALLOW_CREDENTIALS = True
 
 # 5. Custom Security Settings
-ENCRYPTION_KEY = os.getenv('ENCRYPTION_KEY')
\ No newline at end of file
+ENCRYPTION_KEY = os.getenv('ENCRYPTION_KEY')
+# Key ring for online rotation: "kid:key,kid:key", newest (used for new
+# values) first. Unset = ENCRYPTION_KEY alone, ciphertexts without key ids.
+ENCRYPTION_KEYS = os.getenv('ENCRYPTION_KEYS')
+# Opt-in cache of decrypted Aadhaar numbers (entries, 0 = off) and how
+# long a plaintext may stay in memory
+AADHAAR_CACHE_SIZE = int(os.getenv('AADHAAR_CACHE_SIZE', '0'))
+AADHAAR_CACHE_TTL = int(os.getenv('AADHAAR_CACHE_TTL_SECONDS', '300'))
+
+# 6. Wallet Settings
+# Upper bound on lines accepted by POST /api/wallet/transfer/batch/
+WALLET_BATCH_MAX_LINES = int(os.getenv('WALLET_BATCH_MAX_LINES', '10000'))
+
+# Idempotency keys (wallet.idempotency). Keys are replayable for the TTL,
+# then `prune_idempotency` deletes them.
+WALLET_IDEMPOTENCY_STORE = os.getenv('WALLET_IDEMPOTENCY_STORE', 'wallet.idempotency.CachedIdempotencyStore')
+WALLET_IDEMPOTENCY_TTL = timedelta(hours=int(os.getenv('WALLET_IDEMPOTENCY_TTL_HOURS', '24')))
+WALLET_IDEMPOTENCY_LOCAL_CACHE_SIZE = int(os.getenv('WALLET_IDEMPOTENCY_LOCAL_CACHE_SIZE', '10000'))
+# How long a retry waits for an in-flight request with the same key before getting a 409
+WALLET_IDEMPOTENCY_WAIT = float(os.getenv('WALLET_IDEMPOTENCY_WAIT_SECONDS', '5'))
+# An in-flight claim older than this is treated as abandoned (crashed worker)
+WALLET_IDEMPOTENCY_LEASE = timedelta(seconds=int(os.getenv('WALLET_IDEMPOTENCY_LEASE_SECONDS', '60')))
+
+# Ledger rows older than this are assumed committed: transaction ids can
+# commit out of order, so jobs that follow the ledger by id
+# (`reconcile_balances`, `update_daily_summaries`) stop this far behind.
+WALLET_LEDGER_LAG = timedelta(seconds=int(os.getenv('WALLET_LEDGER_LAG_SECONDS', '300')))
+# Widest date range GET /api/wallet/summary/ answers
+WALLET_SUMMARY_MAX_DAYS = int(os.getenv('WALLET_SUMMARY_MAX_DAYS', '3660'))
+
+# 'queued': POST /api/wallet/transfer/ records a PENDING transaction and
+# answers 202; `process_transfers` settles the queue in batches, many
+# transfers per commit (wallet.transfer_queue). 'sync' settles in the request.
+# 'optimistic' settles in the request too, but debits with a version-checked
+# UPDATE instead of waiting on row locks, retrying on conflict.
+WALLET_TRANSFER_MODE = os.getenv('WALLET_TRANSFER_MODE', 'sync')
+# Retries after a version conflict, deadlock, serialization failure or lock
+# timeout, each after a random sleep of up to BACKOFF * 2^n (capped at MAX)
+WALLET_TRANSFER_RETRIES = int(os.getenv('WALLET_TRANSFER_RETRIES', '5'))
+WALLET_RETRY_BACKOFF = float(os.getenv('WALLET_RETRY_BACKOFF_SECONDS', '0.005'))
+WALLET_RETRY_BACKOFF_MAX = float(os.getenv('WALLET_RETRY_BACKOFF_MAX_SECONDS', '0.2'))
+# Optimistic mode (Postgres): longest a write waits on another transfer's row lock before it's retried
+WALLET_OPTIMISTIC_LOCK_TIMEOUT_MS = int(os.getenv('WALLET_OPTIMISTIC_LOCK_TIMEOUT_MS', '50'))
+# Transfers settled per worker transaction, worker threads, idle poll interval
+WALLET_QUEUE_BATCH_SIZE = int(os.getenv('WALLET_QUEUE_BATCH_SIZE', '200'))
+WALLET_QUEUE_WORKERS = int(os.getenv('WALLET_QUEUE_WORKERS', '2'))
+WALLET_QUEUE_POLL = float(os.getenv('WALLET_QUEUE_POLL_SECONDS', '0.05'))
+
+# 7. Async API
+# Serve transfer/history/profile with native async views. Only worth it
+# under an ASGI server (entrypoint.sh switches to uvicorn workers).
+ASYNC_VIEWS = os.getenv('ASYNC_VIEWS') == 'True'
+
+# 8. Cache
+# Shared across workers when REDIS_URL is set, per-process otherwise.
+if os.getenv('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# 9. Observability
+# Per-endpoint latency / SQL metrics, scraped from /metrics (core.middleware)
+REQUEST_METRICS = os.getenv('REQUEST_METRICS') == 'True'
+# Also send the per-request numbers back in a Server-Timing header
+SERVER_TIMING = os.getenv('SERVER_TIMING') == 'True'
+# Required to scrape /metrics (core.views); without it only DEBUG serves it
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+
+# 10. Read Replicas (core.replicas; replicas themselves are listed next to DATABASES)
+# After moving money a user reads from the primary for this long
+REPLICA_STICKY_SECONDS = int(os.getenv('REPLICA_STICKY_SECONDS', '15'))
+# A replica further behind than this is skipped
+REPLICA_MAX_LAG_SECONDS = float(os.getenv('REPLICA_MAX_LAG_SECONDS', '5'))
+# How often each process re-checks a replica's lag
+REPLICA_HEALTH_INTERVAL = float(os.getenv('REPLICA_HEALTH_INTERVAL_SECONDS', '5'))
+# The read-your-writes pin lives in the cache: a per-process one would
+# pin the user only in the worker that took the transfer, and their next
+# request could read a replica that hasn't seen it
+if DATABASE_REPLICAS and not os.getenv('REDIS_URL'):
+    raise ImproperlyConfigured('DATABASE_REPLICA_URLS needs a shared cache (REDIS_URL) to keep users on the primary after a transfer')
+
+# 11. Throttling & Admission Control (core.throttling)
+# Token buckets: tokens per second (0 = off) and burst size. Transfers are
+# limited per user, login attempts (a PBKDF2 run each) per client IP.
+THROTTLE_TRANSFER_RATE = float(os.getenv('THROTTLE_TRANSFER_RATE', '10'))
+THROTTLE_TRANSFER_BURST = int(os.getenv('THROTTLE_TRANSFER_BURST', '30'))
+THROTTLE_LOGIN_RATE = float(os.getenv('THROTTLE_LOGIN_RATE', '0.5'))
+THROTTLE_LOGIN_BURST = int(os.getenv('THROTTLE_LOGIN_BURST', '10'))
+# Buckets each process keeps (the least recently used go first)
+THROTTLE_LOCAL_KEYS = int(os.getenv('THROTTLE_LOCAL_KEYS', '100000'))
+# Window of the cross-process count in the shared cache (only with REDIS_URL)
+THROTTLE_SHARED_WINDOW = int(os.getenv('THROTTLE_SHARED_WINDOW_SECONDS', '10'))
+# Per process: new transfers get a 429 once this many are running (0 = no
+# limit) or this share of the DATABASE_POOL=psycopg pool is checked out
+ADMISSION_MAX_INFLIGHT = int(os.getenv('ADMISSION_MAX_INFLIGHT_TRANSFERS', '50'))
+ADMISSION_MAX_POOL_USAGE = float(os.getenv('ADMISSION_MAX_POOL_USAGE', '0.9'))
+# Retry-After (seconds) on a shed transfer
+ADMISSION_RETRY_AFTER = int(os.getenv('ADMISSION_RETRY_AFTER_SECONDS', '1'))
@@ -1,9 +1,14 @@
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path, include
+from core.views import metrics
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/users/', include('users.urls')),
     path('api/wallet/', include('wallet.urls')), 
 
-]
\ No newline at end of file
+]
+
+if settings.REQUEST_METRICS:
+    urlpatterns.append(path('metrics', metrics, name='metrics'))
@@ -0,0 +1,37 @@
+import uuid
+import pytest
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+User = get_user_model()
+
+
+@pytest.fixture
+def wallets(db):
+    # Receiver gets the lower id so the credit is applied before the debit,
+    # which is the order where a failed debit has to roll the credit back.
+    receiver = User.objects.create_user(email='receiver@test.com', password='password123', wallet_balance=0)
+    sender = User.objects.create_user(email='sender@test.com', password='password123', wallet_balance=100)
+    client = APIClient()
+    client.force_authenticate(user=sender)
+    return client, sender, receiver
+
+
+@pytest.fixture
+def sender(wallets):
+    return wallets[1]
+
+
+def transfer(client, amount, key=None, receiver_email='receiver@test.com'):
+    return client.post(reverse('transfer'), {
+        "receiver_email": receiver_email,
+        "amount": amount,
+        "idempotency_key": str(key or uuid.uuid4()),
+    }, format='json')
+
+
+@pytest.fixture
+def post_transfer():
+    """POSTs a transfer from `client`'s user: post_transfer(client, amount, key=None, receiver_email=...)."""
+    return transfer
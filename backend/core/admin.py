@@ -1,3 +1,7 @@
 from django.contrib import admin
+from .models import Checkpoint
 
-# Register your models here.
+@admin.register(Checkpoint)
+class CheckpointAdmin(admin.ModelAdmin):
+    list_display = ('name', 'position', 'updated_at')
+    search_fields = ('name',)
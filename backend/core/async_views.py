@@ -0,0 +1,74 @@
+import json
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import JsonResponse
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.exceptions import APIException, NotAuthenticated, ParseError, Throttled
+from rest_framework.permissions import SAFE_METHODS
+from users.authentication import AsyncJWTAuthentication
+from . import replicas, throttling
+
+
+class AsyncAPIView(View):
+    """
+    A minimal async stand-in for DRF's APIView, used for the hot endpoints
+    when running under ASGI (settings.ASYNC_VIEWS). DRF only dispatches
+    sync views, so this covers just what those endpoints need: JWT auth
+    through the async ORM, JSON in/out, and DRF exceptions rendered the
+    same way DRF renders them. Views with `read_replica` set read from a
+    replica (core.replicas) like their ReplicaReadMixin twins;
+    `throttle_classes` and `admission_control` mirror core.throttling's
+    DRF throttles and AdmissionControlMixin.
+    """
+    authentication_class = AsyncJWTAuthentication
+    throttle_classes = ()
+    read_replica = False
+    # Hold a core.throttling.transfers slot while the view runs
+    admission_control = False
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        # Token auth, not cookies: same CSRF exemption DRF's APIView applies
+        return csrf_exempt(super().as_view(**initkwargs))
+
+    async def dispatch(self, request, *args, **kwargs):
+        authenticator = self.authentication_class()
+        try:
+            auth = await authenticator.aauthenticate(request)
+            if auth is None:
+                raise NotAuthenticated()
+            request.user, request.auth = auth
+            for throttle in (throttle_class() for throttle_class in self.throttle_classes):
+                if not await throttle.aallow_request(request, self):
+                    raise Throttled(wait=throttle.wait())
+            if not self.admission_control:
+                return await self.dispatch_routed(request, *args, **kwargs)
+            throttling.transfers.admit()
+            try:
+                return await self.dispatch_routed(request, *args, **kwargs)
+            finally:
+                throttling.transfers.release()
+        except APIException as exc:
+            data = exc.detail if isinstance(exc.detail, (list, dict)) else {'detail': exc.detail}
+            response = JsonResponse(data, status=exc.status_code, safe=False)
+            if exc.status_code == 401:
+                response['WWW-Authenticate'] = authenticator.authenticate_header(request)
+            if getattr(exc, 'wait', None):
+                response['Retry-After'] = '%d' % exc.wait
+            return response
+
+    async def dispatch_routed(self, request, *args, **kwargs):
+        if not (self.read_replica and settings.DATABASE_REPLICAS and request.method in SAFE_METHODS):
+            return await super().dispatch(request, *args, **kwargs)
+        token = replicas.route_to(await sync_to_async(replicas.read_alias)(request.user))
+        try:
+            return await super().dispatch(request, *args, **kwargs)
+        finally:
+            replicas.stop_routing(token)
+
+    def parse_json(self, request):
+        try:
+            return json.loads(request.body or b'{}')
+        except ValueError as exc:
+            raise ParseError(f'JSON parse error - {exc}')
@@ -0,0 +1,36 @@
+"""
+Helpers shared by the `bench_*` / `loadtest` management commands.
+"""
+from decimal import Decimal
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+
+from wallet.models import Wallet
+
+BENCH_EMAIL = 'bench-{}@vaultpay.local'
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not samples:
+        return 0.0
+    rank = max(0, min(len(samples) - 1, round(pct / 100 * len(samples)) - 1))
+    return samples[rank]
+
+
+def bench_users(count, balance=Decimal('1000000.00')):
+    """
+    Returns `count` well-funded bench wallets (bench-0 .. bench-N), creating
+    any that don't exist yet. They can't log in with a password.
+    """
+    User = get_user_model()
+    emails = [BENCH_EMAIL.format(i) for i in range(count)]
+    existing = set(User.objects.filter(email__in=emails).values_list('email', flat=True))
+    password = make_password(None)
+    User.objects.bulk_create([User(email=email, password=password) for email in emails if email not in existing])
+    by_email = {u.email: u for u in User.objects.filter(email__in=emails)}
+    # bulk_create skips post_save, so the new users' wallets are made here
+    Wallet.objects.bulk_create([
+        Wallet(user=user, balance=balance) for email, user in by_email.items() if email not in existing
+    ])
+    return [by_email[email] for email in emails]
@@ -0,0 +1,47 @@
+import multiprocessing
+import random
+import time
+from django.core.management.base import BaseCommand
+from core.security import DecryptCache, VaultSecurity
+
+
+class Command(BaseCommand):
+    help = 'Microbenchmark of VaultSecurity: encrypt/decrypt ops/sec, cached decrypts and the batch APIs.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--values', type=int, default=20000, help='Aadhaar numbers per measurement.')
+        parser.add_argument('--workers', type=int, default=multiprocessing.cpu_count(), help='Processes for *_many.')
+
+    def handle(self, *args, **options):
+        rng = random.Random(0)
+        values = [
+            f"{rng.randint(1000, 9999)}-{rng.randint(1000, 9999)}-{rng.randint(1000, 9999)}"
+            for _ in range(options['values'])
+        ]
+        workers = options['workers']
+
+        ciphertexts = self.measure('encrypt', lambda: [VaultSecurity.encrypt(v) for v in values])
+        self.measure('decrypt (uncached)', lambda: [VaultSecurity.decrypt(c, cache=False) for c in ciphertexts])
+
+        # Cached: what a warm profile read costs. Swap in a cache sized for
+        # the run, then put back whatever the settings configured.
+        configured, VaultSecurity._cache = VaultSecurity._cache, DecryptCache(len(values), ttl=3600)
+        try:
+            self.measure('decrypt (cache miss)', lambda: [VaultSecurity.decrypt(c) for c in ciphertexts])
+            self.measure('decrypt (cache hit)', lambda: [VaultSecurity.decrypt(c) for c in ciphertexts])
+        finally:
+            VaultSecurity._cache.clear()
+            VaultSecurity._cache = configured
+
+        self.measure(f'encrypt_many ({workers} workers)', lambda: VaultSecurity.encrypt_many(values, workers))
+        decrypted = self.measure(
+            f'decrypt_many ({workers} workers)', lambda: VaultSecurity.decrypt_many(ciphertexts, workers)
+        )
+        assert decrypted == values
+
+    def measure(self, label, func):
+        started = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f"{label:<28} {len(result) / elapsed:>12,.0f} ops/s")
+        return result
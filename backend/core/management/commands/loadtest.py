@@ -0,0 +1,207 @@
+import http.client
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from rest_framework_simplejwt.tokens import AccessToken
+from core.benchmarking import bench_users, percentile
+
+ENDPOINTS = {
+    'history': ('GET', '/api/wallet/history/'),
+    'profile': ('GET', '/api/users/profile/'),
+    'transfer': ('POST', '/api/wallet/transfer/'),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Starts the app under gunicorn as WSGI (sync views) and as ASGI (uvicorn '
+        'workers + ASYNC_VIEWS) with the same worker count, drives one endpoint '
+        'with N concurrent keep-alive clients, and compares throughput/latency. '
+        'With --pools, each mode also runs under each DATABASE_POOL setting and '
+        'the Postgres connections the app held are reported.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--endpoint', choices=sorted(ENDPOINTS), default='history')
+        parser.add_argument('--modes', default='wsgi,asgi', help='Comma-separated: wsgi, asgi.')
+        parser.add_argument(
+            '--pools', default='',
+            help='Comma-separated DATABASE_POOL settings to run each mode under: none, psycopg, pgbouncer '
+                 '(pgbouncer needs DATABASE_URL pointing at one). Default: as configured.'
+        )
+        parser.add_argument('--workers', type=int, default=2, help='gunicorn worker processes (both modes).')
+        parser.add_argument('--concurrency', type=int, default=50, help='Concurrent client connections.')
+        parser.add_argument('--requests', type=int, default=2000, help='Requests per mode.')
+        parser.add_argument('--port', type=int, default=8765)
+
+    def handle(self, *args, **options):
+        # Clients share bench-1..N as senders; everybody pays bench-0
+        users = bench_users(options['concurrency'] + 1)
+        tokens = [str(AccessToken.for_user(u)) for u in users[1:]]
+
+        pools = [pool.strip() for pool in options['pools'].split(',')] if options['pools'] else [None]
+        rows = []
+        for mode in options['modes'].split(','):
+            for pool in pools:
+                server = self.start_server(mode.strip(), pool, options['workers'], options['port'])
+                try:
+                    with ConnectionSampler() as sampler:
+                        result = self.drive(options, tokens, users[0].email)
+                    rows.append((mode, pool or settings.DATABASE_POOL or 'none', result, sampler))
+                finally:
+                    server.terminate()
+                    server.wait(timeout=30)
+
+        self.stdout.write(
+            f"{'mode':<6} {'pool':<9} {'workers':>7} {'clients':>7} {'req/s':>8} {'p50 ms':>8} "
+            f"{'p95 ms':>8} {'p99 ms':>8} {'errors':>7} {'429s':>6} {'db conns':>8} {'peak':>5}"
+        )
+        for mode, pool, r, sampler in rows:
+            self.stdout.write(
+                f"{mode:<6} {pool:<9} {options['workers']:>7} {options['concurrency']:>7} {r['rps']:>8.0f} "
+                f"{r['p50']:>8.1f} {r['p95']:>8.1f} {r['p99']:>8.1f} {r['errors']:>7} {r['shed']:>6} "
+                f"{sampler.mean:>8.1f} {sampler.peak:>5}"
+            )
+
+    def start_server(self, mode, pool, workers, port):
+        env = dict(os.environ)
+        # A few bench users send everything: measure the server, not their per-user limit
+        env.setdefault('THROTTLE_TRANSFER_RATE', '0')
+        if pool is not None:
+            env['DATABASE_POOL'] = '' if pool == 'none' else pool
+        if mode == 'wsgi':
+            env['ASYNC_VIEWS'] = 'False'
+            cmd = ['config.wsgi:application']
+        elif mode == 'asgi':
+            env['ASYNC_VIEWS'] = 'True'
+            cmd = ['config.asgi:application', '-k', 'uvicorn_worker.UvicornWorker']
+        else:
+            raise CommandError(f"Unknown mode {mode!r}")
+
+        server = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', *cmd, '-w', str(workers),
+             '-b', f'127.0.0.1:{port}', '--log-level', 'warning'],
+            cwd=settings.BASE_DIR, env=env
+        )
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            try:
+                socket.create_connection(('127.0.0.1', port), timeout=1).close()
+                return server
+            except OSError:
+                time.sleep(0.2)
+        server.terminate()
+        raise CommandError(f"{mode} server did not come up on port {port}")
+
+    def drive(self, options, tokens, receiver_email):
+        method, path = ENDPOINTS[options['endpoint']]
+        remaining = [options['requests']]
+        lock = threading.Lock()
+        latencies, errors, shed = [], [0], [0]
+
+        def client(token):
+            conn = http.client.HTTPConnection('127.0.0.1', options['port'], timeout=60)
+            headers = {'Authorization': f'Bearer {token}', 'Content-Type': 'application/json'}
+            try:
+                while True:
+                    with lock:
+                        if remaining[0] <= 0:
+                            return
+                        remaining[0] -= 1
+                    body = None
+                    if method == 'POST':
+                        body = json.dumps({
+                            'receiver_email': receiver_email,
+                            'amount': '1.00',
+                            'idempotency_key': str(uuid.uuid4()),
+                        })
+                    started = time.perf_counter()
+                    status = None
+                    try:
+                        conn.request(method, path, body=body, headers=headers)
+                        response = conn.getresponse()
+                        response.read()
+                        status = response.status
+                    except (OSError, http.client.HTTPException):
+                        conn.close()
+                    elapsed = (time.perf_counter() - started) * 1000
+                    with lock:
+                        latencies.append(elapsed)
+                        # 429: throttled or shed by admission control (core.throttling)
+                        shed[0] += status == 429
+                        errors[0] += status not in (200, 429)
+            finally:
+                conn.close()
+
+        threads = [
+            threading.Thread(target=client, args=(tokens[i % len(tokens)],))
+            for i in range(options['concurrency'])
+        ]
+        started = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        wall_seconds = time.perf_counter() - started
+
+        latencies.sort()
+        return {
+            'rps': len(latencies) / wall_seconds,
+            'p50': percentile(latencies, 50),
+            'p95': percentile(latencies, 95),
+            'p99': percentile(latencies, 99),
+            'errors': errors[0],
+            'shed': shed[0],
+        }
+
+
+class ConnectionSampler:
+    """
+    Counts the other client connections to this database every `interval`
+    seconds while in use (Postgres only; zeros elsewhere).
+    """
+
+    def __init__(self, interval=0.1):
+        self.interval = interval
+        self.samples = []
+        self.stopped = threading.Event()
+
+    def __enter__(self):
+        if connection.vendor == 'postgresql':
+            self.thread = threading.Thread(target=self.run, daemon=True)
+            self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stopped.set()
+        if connection.vendor == 'postgresql':
+            self.thread.join()
+
+    def run(self):
+        # Its own connection (this thread's), left out of the count
+        try:
+            with connection.cursor() as cursor:
+                while not self.stopped.wait(self.interval):
+                    cursor.execute(
+                        "SELECT count(*) FROM pg_stat_activity WHERE datname = current_database() "
+                        "AND backend_type = 'client backend' AND pid <> pg_backend_pid()"
+                    )
+                    self.samples.append(cursor.fetchone()[0])
+        finally:
+            connection.close()
+
+    @property
+    def mean(self):
+        return sum(self.samples) / len(self.samples) if self.samples else 0.0
+
+    @property
+    def peak(self):
+        return max(self.samples, default=0)
@@ -1,17 +1,74 @@
+import csv
+import io
+import multiprocessing
 import random
+import time
 import uuid
+from datetime import timedelta
 from decimal import Decimal
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import connection, transaction
+from django.utils import timezone
 from faker import Faker
-from wallet.models import Transaction
+from core.security import VaultSecurity
+from wallet.ledger import record, transfer_entries
+from wallet.models import LedgerEntry, Transaction, Wallet
+from wallet.services import write_wallets
 
 User = get_user_model()
 
+SEED_EMAIL = 'seed{seed}-{i}@vaultpay.local'
+
+
+def encrypt_chunk(values):
+    # Runs in a pool worker: Fernet is pure CPU, so this is where the cores go
+    return [VaultSecurity.encrypt(v) for v in values]
+
+
+def simulate_transfers(rng, balances, count):
+    """
+    Yields `(sender, receiver, amount_paise, sender_balance, receiver_balance)`
+    for `count` random transfer attempts over wallet indexes, applying the
+    accepted ones to `balances` (a list of paise); the balances are each
+    side's after the transfer, for its ledger entries. Same rng state +
+    same balances => same stream, which is how the bulk mode computes
+    final balances before writing any row.
+    """
+    n = len(balances)
+    for _ in range(count):
+        sender, receiver = rng.randrange(n), rng.randrange(n)
+        amount = rng.randint(100, 5000) * 100
+        if sender == receiver or balances[sender] < amount:
+            continue
+        balances[sender] -= amount
+        balances[receiver] += amount
+        yield sender, receiver, amount, balances[sender], balances[receiver]
+
+
 class Command(BaseCommand):
-    help = 'Seeds the database with realistic users and transaction history.'
+    help = (
+        'Seeds the database with realistic users and transaction history. '
+        'Without --users it creates the small demo dataset; with --users/--transactions '
+        'it bulk-generates a reproducible perf dataset.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, help='Bulk mode: number of users to generate.')
+        parser.add_argument('--transactions', type=int, default=0, help='Bulk mode: transfer attempts to simulate.')
+        parser.add_argument('--seed', type=int, default=0, help='Bulk mode: RNG seed (same seed, same dataset).')
+        parser.add_argument('--chunk-size', type=int, default=5000, help='Bulk mode: rows per INSERT/COPY.')
+        parser.add_argument('--workers', type=int, default=multiprocessing.cpu_count(), help='Bulk mode: encryption processes.')
+        parser.add_argument('--days', type=int, default=365, help='Bulk mode: history spread over this many days.')
+
+    def handle(self, *args, **options):
+        if options['users']:
+            self.seed_bulk(options)
+        else:
+            self.seed_demo()
 
-    def handle(self, *args, **kwargs):
+    def seed_demo(self):
         fake = Faker('en_IN') # Use Indian names/addresses
         self.stdout.write(self.style.WARNING('Seeding data...'))
 
@@ -21,8 +78,8 @@ class Command(BaseCommand):
         test_user, created = User.objects.get_or_create(
             email='omtank22@gmail.com',
             defaults={
-                'first_name': 'Om', 
-                'last_name': 'Tank', 
+                'first_name': 'Om',
+                'last_name': 'Tank',
                 'wallet_balance': Decimal('50000.00'),
                 'is_staff': True,
                 'is_superuser': True
@@ -33,7 +90,7 @@ class Command(BaseCommand):
             test_user.set_aadhaar("9999-8888-7777")
             test_user.save()
             self.stdout.write(f"Created Superuser: {test_user.email}")
-        
+
         users.append(test_user)
 
         # Create 20 random users
@@ -42,7 +99,7 @@ class Command(BaseCommand):
             first_name = fake.first_name()
             last_name = fake.last_name()
             aadhaar = f"{random.randint(1000,9999)}-{random.randint(1000,9999)}-{random.randint(1000,9999)}"
-            
+
             user, created = User.objects.get_or_create(
                 email=email,
                 defaults={
@@ -62,22 +119,22 @@ class Command(BaseCommand):
 
         # 2. Create Transactions
         transactions_to_create = []
+        # Each side's balance after each transaction, for its ledger entries
+        running_balances = []
         for _ in range(100):
             sender = random.choice(users)
             receiver = random.choice(users)
-            
+
             if sender == receiver:
                 continue
 
             amount = Decimal(random.randint(100, 5000))
-            
+
             # Simple logic: only create if they have funds (simulation only)
             if sender.wallet_balance >= amount:
                 sender.wallet_balance -= amount
                 receiver.wallet_balance += amount
-                sender.save()
-                receiver.save()
-                
+
                 # Add transaction record
                 transactions_to_create.append(Transaction(
                     sender=sender,
@@ -86,6 +143,170 @@ class Command(BaseCommand):
                     status='SUCCESS',
                     reference_id=uuid.uuid4()
                 ))
+                running_balances.append((
+                    None if sender.shard_count else sender.wallet_balance,
+                    None if receiver.shard_count else receiver.wallet_balance,
+                ))
+
+        # Balances were settled in memory above; write each wallet once,
+        # bumping its version so an optimistic transfer that read it retries
+        write_wallets(u.wallet for u in users)
+        created = Transaction.objects.bulk_create(transactions_to_create)
+        record([
+            entry for tx, (sender_balance, receiver_balance) in zip(created, running_balances)
+            for entry in transfer_entries(
+                tx.pk, tx.sender_id, tx.receiver_id, tx.amount, tx.created_at, sender_balance, receiver_balance
+            )
+        ])
+        self.stdout.write(self.style.SUCCESS(f'Successfully created {len(transactions_to_create)} transactions.'))
+
+    def seed_bulk(self, options):
+        seed, chunk = options['seed'], options['chunk_size']
+        n_users, n_attempts = options['users'], options['transactions']
+        if User.objects.filter(email=SEED_EMAIL.format(seed=seed, i=0)).exists():
+            raise CommandError(f"Seed {seed} is already loaded; pick another --seed.")
+
+        rng = random.Random(seed)
+        initial = [rng.randint(1000, 50000) * 100 for _ in range(n_users)]
+
+        # Pass 1: settle every transfer in memory so each wallet is written
+        # once, with its final balance, when it is inserted.
+        started = time.perf_counter()
+        final = list(initial)
+        accepted = sum(1 for _ in simulate_transfers(random.Random(f"{seed}-tx"), final, n_attempts))
+        self.stdout.write(f"Simulated {n_attempts} transfers ({accepted} accepted) in {time.perf_counter() - started:.1f}s")
+
+        started = time.perf_counter()
+        user_ids = self.insert_users(rng, seed, final, chunk, options['workers'])
+        self.report('users', len(user_ids), started)
+
+        # Pass 2: replay the identical stream and write the history rows,
+        # with their ledger entries
+        started = time.perf_counter()
+        written = self.insert_transactions(
+            simulate_transfers(random.Random(f"{seed}-tx"), list(initial), n_attempts),
+            random.Random(f"{seed}-ref"), user_ids, accepted, chunk, options['days']
+        )
+        self.report('transactions', written, started)
+
+    def insert_users(self, rng, seed, balances, chunk, workers):
+        # One PBKDF2 run shared by every seeded user (they all log in with
+        # "password") instead of one per user.
+        password = make_password('password')
+        fake = Faker('en_IN')
+        fake.seed_instance(seed)
+        first_names = [fake.first_name() for _ in range(500)]
+        last_names = [fake.last_name() for _ in range(500)]
+
+        def aadhaar_chunks():
+            # Consumed by the pool's feeder thread, hence its own rng
+            aadhaar_rng = random.Random(f"{seed}-aadhaar")
+            for start in range(0, len(balances), chunk):
+                size = min(chunk, len(balances) - start)
+                yield [
+                    f"{aadhaar_rng.randint(1000, 9999)}-{aadhaar_rng.randint(1000, 9999)}-{aadhaar_rng.randint(1000, 9999)}"
+                    for _ in range(size)
+                ]
+
+        user_ids = []
+        with multiprocessing.get_context('fork').Pool(max(1, workers)) as pool:
+            # imap keeps chunk order and lets the workers encrypt ahead
+            # while this process is inserting
+            for ciphertexts in pool.imap(encrypt_chunk, aadhaar_chunks()):
+                start = len(user_ids)
+                users = [
+                    User(
+                        email=SEED_EMAIL.format(seed=seed, i=start + i),
+                        password=password,
+                        first_name=rng.choice(first_names),
+                        last_name=rng.choice(last_names),
+                        aadhaar_encrypted=aadhaar,
+                    )
+                    for i, aadhaar in enumerate(ciphertexts)
+                ]
+                User.objects.bulk_create(users)
+                Wallet.objects.bulk_create([
+                    Wallet(user_id=u.pk, balance=Decimal(balances[start + i]) / 100) for i, u in enumerate(users)
+                ])
+                user_ids.extend(u.pk for u in users)
+        return user_ids
+
+    def insert_transactions(self, transfers, ref_rng, user_ids, count, chunk, days):
+        # History is spread evenly over the last `days`, oldest first
+        now = timezone.now()
+        start = now - timedelta(days=days)
+        step = (now - start) / max(count, 1)
+
+        def rows():
+            for i, (sender, receiver, amount, sender_balance, receiver_balance) in enumerate(transfers):
+                created_at = start + step * i
+                reference_id = uuid.UUID(int=ref_rng.getrandbits(128), version=4)
+                yield (user_ids[sender], user_ids[receiver], Decimal(amount) / 100,
+                       reference_id, created_at, Decimal(sender_balance) / 100, Decimal(receiver_balance) / 100)
+
+        write = self.copy_transactions if connection.vendor == 'postgresql' else self.bulk_create_transactions
+        written, batch = 0, []
+        for row in rows():
+            batch.append(row)
+            if len(batch) == chunk:
+                written += write(batch)
+                batch = []
+        if batch:
+            written += write(batch)
+        return written
+
+    def copy_transactions(self, batch):
+        """COPY one chunk of rows and their ledger entries straight into the tables (Postgres only)."""
+        table = Transaction._meta.db_table
+        columns = ['id', 'sender_id', 'receiver_id', 'amount', 'status', 'reference_id', 'created_at', 'updated_at']
+        entry_columns = ['user_id', 'transaction_id', 'amount', 'balance_after', 'created_at']
+        with transaction.atomic(), connection.cursor() as cursor:
+            # Ids up front, so the entries can point at their transactions
+            cursor.execute(
+                "SELECT nextval(pg_get_serial_sequence(%s, 'id')) FROM generate_series(1, %s)", [table, len(batch)]
+            )
+            ids = [tx_id for tx_id, in cursor.fetchall()]
+            rows, entries = [], []
+            for tx_id, row in zip(ids, batch):
+                sender_id, receiver_id, amount, reference_id, created_at, sender_balance, receiver_balance = row
+                stamp = created_at.isoformat()
+                rows.append([tx_id, sender_id, receiver_id, amount, 'SUCCESS', reference_id, stamp, stamp])
+                entries.append([sender_id, tx_id, -amount, sender_balance, stamp])
+                entries.append([receiver_id, tx_id, amount, receiver_balance, stamp])
+            self.copy(cursor, table, columns, rows)
+            self.copy(cursor, LedgerEntry._meta.db_table, entry_columns, entries)
+        return len(batch)
+
+    def copy(self, cursor, table, columns, rows):
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        buffer.seek(0)
+        sql = f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)"
+        if hasattr(cursor, 'copy_expert'):  # psycopg2
+            cursor.copy_expert(sql, buffer)
+        else:  # psycopg 3
+            with cursor.copy(sql) as copy:
+                copy.write(buffer.getvalue())
+
+    def bulk_create_transactions(self, batch):
+        # bulk_create can't backdate created_at (auto_now_add), so off
+        # Postgres the whole history (and its ledger) carries the load time.
+        with transaction.atomic():
+            created = Transaction.objects.bulk_create([
+                Transaction(sender_id=sender_id, receiver_id=receiver_id, amount=amount,
+                            status='SUCCESS', reference_id=reference_id)
+                for sender_id, receiver_id, amount, reference_id, *_ in batch
+            ])
+            record([
+                entry for tx, (*_, sender_balance, receiver_balance) in zip(created, batch)
+                for entry in transfer_entries(
+                    tx.pk, tx.sender_id, tx.receiver_id, tx.amount, tx.created_at, sender_balance, receiver_balance
+                )
+            ])
+        return len(batch)
 
-        Transaction.objects.bulk_create(transactions_to_create)
-        self.stdout.write(self.style.SUCCESS(f'Successfully created {len(transactions_to_create)} transactions.'))
\ No newline at end of file
+    def report(self, label, rows, started):
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Inserted {rows} {label} in {elapsed:.1f}s ({rows / elapsed if elapsed else 0:.0f} rows/s)"
+        ))
@@ -0,0 +1,186 @@
+"""
+A small in-process metrics registry rendered in the Prometheus text format.
+
+Each server process keeps its own numbers (like prometheus_client without
+multiprocess mode), so with several gunicorn workers a scrape sees the
+worker that answered it.
+"""
+import threading
+from bisect import bisect_left
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)
+
+
+def takes_row_locks(sql):
+    """Statements that take (and may wait for) row locks."""
+    return sql.lstrip()[:6].upper() == 'UPDATE' or 'FOR UPDATE' in sql
+
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(names, values, extra=()):
+    pairs = [f'{name}="{escape(value)}"' for name, value in (*zip(names, values), *extra)]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def key(self, labels):
+        return tuple(labels[name] for name in self.labels)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        with self.lock:
+            items = list(self.values.items())
+        for key, value in items:
+            lines.extend(self.render_value(key, value))
+        return lines
+
+    def render_value(self, key, value):
+        return [f"{self.name}{format_labels(self.labels, key)} {value}"]
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self.key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        with self.lock:
+            self.values[self.key(labels)] = value
+
+    def inc(self, amount=1, **labels):
+        key = self.key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self.key(labels)
+        with self.lock:
+            counts = self.values.get(key)
+            if counts is None:
+                # Per-bucket counts (+Inf last), then sum
+                counts = self.values[key] = [0] * (len(self.buckets) + 1) + [0]
+            counts[bisect_left(self.buckets, value)] += 1
+            counts[-1] += value
+
+    def render_value(self, key, counts):
+        lines, cumulative = [], 0
+        for bound, count in zip((*self.buckets, '+Inf'), counts):
+            cumulative += count
+            lines.append(f"{self.name}_bucket{format_labels(self.labels, key, [('le', bound)])} {cumulative}")
+        lines.append(f"{self.name}_sum{format_labels(self.labels, key)} {counts[-1]}")
+        lines.append(f"{self.name}_count{format_labels(self.labels, key)} {cumulative}")
+        return lines
+
+
+class SlowestQuery(Metric):
+    """Gauge holding the slowest statement seen per label set, SQL as a label."""
+    kind = 'gauge'
+    max_sql_length = 300
+
+    def record(self, seconds, sql, **labels):
+        key = self.key(labels)
+        with self.lock:
+            current = self.values.get(key)
+            if current is None or seconds > current[0]:
+                self.values[key] = (seconds, sql[:self.max_sql_length])
+
+    def render_value(self, key, value):
+        seconds, sql = value
+        return [f"{self.name}{format_labels(self.labels, key, [('sql', sql)])} {seconds}"]
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+        self.lock = threading.Lock()
+
+    def register(self, metric):
+        with self.lock:
+            # Re-importing a module (e.g. autoreload) returns the live metric
+            return self.metrics.setdefault(metric.name, metric)
+
+    def counter(self, name, help_text, labels=()):
+        return self.register(Counter(name, help_text, labels))
+
+    def gauge(self, name, help_text, labels=()):
+        return self.register(Gauge(name, help_text, labels))
+
+    def histogram(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, help_text, labels, buckets))
+
+    def slowest_query(self, name, help_text, labels=()):
+        return self.register(SlowestQuery(name, help_text, labels))
+
+    def render(self):
+        with self.lock:
+            metrics = list(self.metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+ENDPOINT = ('method', 'endpoint')
+REQUESTS = registry.counter(
+    'vaultpay_requests_total', 'Requests served.', (*ENDPOINT, 'status'))
+REQUEST_SECONDS = registry.histogram(
+    'vaultpay_request_duration_seconds', 'Time to produce the response.', ENDPOINT)
+REQUEST_QUERIES = registry.histogram(
+    'vaultpay_request_queries', 'SQL statements per request.', ENDPOINT, COUNT_BUCKETS)
+DB_SECONDS = registry.counter(
+    'vaultpay_db_seconds_total', 'Time spent executing SQL.', ENDPOINT)
+LOCK_SECONDS = registry.counter(
+    'vaultpay_db_lock_seconds_total',
+    'Time spent in row-locking statements (UPDATE / SELECT ... FOR UPDATE), lock waits included.', ENDPOINT)
+SLOWEST_QUERY = registry.slowest_query(
+    'vaultpay_slowest_query_seconds', 'Slowest SQL statement seen per endpoint.', ENDPOINT)
+REPLICA_LAG = registry.gauge(
+    'vaultpay_replica_lag_seconds', 'Replication lag at the last health check (-1: unreachable).', ('alias',))
+REPLICA_READS = registry.counter(
+    'vaultpay_replica_routed_total', 'Read-only requests by the database they were sent to.', ('alias',))
+TRANSFER_RETRIES = registry.counter(
+    'vaultpay_transfer_retries_total',
+    'Transfer attempts rolled back and run again, by mode and cause (version conflict, deadlock, ...).',
+    ('mode', 'reason'))
+TRANSFER_ABORTS = registry.counter(
+    'vaultpay_transfer_aborts_total',
+    'Transfers that ran out of retries (optimistic mode then falls back to sync), by mode and last cause.',
+    ('mode', 'reason'))
+THROTTLED = registry.counter(
+    'vaultpay_throttled_total',
+    'Requests refused by a token bucket (core.throttling), by scope and by the check that refused them.',
+    ('scope', 'tier'))
+SHED = registry.counter(
+    'vaultpay_shed_total', 'Transfers shed by admission control, by reason (inflight, pool).', ('reason',))
+INFLIGHT_TRANSFERS = registry.gauge(
+    'vaultpay_inflight_transfers', 'Transfers running in this process.')
@@ -0,0 +1,103 @@
+import time
+from contextlib import ExitStack
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from . import metrics
+
+
+class QueryRecorder:
+    """
+    `connection.execute_wrapper` that tallies one request's SQL: statement
+    count, total time, time in row-locking statements and the slowest
+    statement.
+    """
+    __slots__ = ('count', 'seconds', 'lock_seconds', 'slowest_seconds', 'slowest_sql')
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = self.lock_seconds = self.slowest_seconds = 0.0
+        self.slowest_sql = ''
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.count += 1
+            self.seconds += elapsed
+            if metrics.takes_row_locks(sql):
+                self.lock_seconds += elapsed
+            if elapsed > self.slowest_seconds:
+                self.slowest_seconds, self.slowest_sql = elapsed, sql
+
+    def installed(self):
+        stack = ExitStack()
+        for conn in connections.all():
+            stack.enter_context(conn.execute_wrapper(self))
+        return stack
+
+
+class RequestMetricsMiddleware:
+    """
+    Records latency, query count, DB time, row-lock time and the slowest
+    statement per endpoint into core.metrics (scraped at /metrics), and
+    optionally adds a `Server-Timing` header so the same numbers show up
+    in the browser's network panel.
+
+    Endpoints are labelled by URL route pattern, not path, to keep the
+    label set small. With settings.REQUEST_METRICS off the middleware
+    removes itself at startup, so it costs nothing.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.REQUEST_METRICS:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        self.server_timing = settings.SERVER_TIMING
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        recorder = QueryRecorder()
+        started = time.perf_counter()
+        with recorder.installed():
+            response = self.get_response(request)
+        return self.finish(request, response, recorder, time.perf_counter() - started)
+
+    async def __acall__(self, request):
+        # Connections are context-local, so the wrapper also sees queries
+        # the async views run through sync_to_async
+        recorder = QueryRecorder()
+        started = time.perf_counter()
+        with recorder.installed():
+            response = await self.get_response(request)
+        return self.finish(request, response, recorder, time.perf_counter() - started)
+
+    def finish(self, request, response, recorder, elapsed):
+        match = request.resolver_match
+        labels = {'method': request.method, 'endpoint': match.route if match else 'unmatched'}
+
+        metrics.REQUESTS.inc(status=response.status_code, **labels)
+        metrics.REQUEST_SECONDS.observe(elapsed, **labels)
+        metrics.REQUEST_QUERIES.observe(recorder.count, **labels)
+        if recorder.count:
+            metrics.DB_SECONDS.inc(recorder.seconds, **labels)
+            metrics.LOCK_SECONDS.inc(recorder.lock_seconds, **labels)
+            metrics.SLOWEST_QUERY.record(recorder.slowest_seconds, recorder.slowest_sql, **labels)
+
+        if self.server_timing:
+            response['Server-Timing'] = (
+                f'db;dur={recorder.seconds * 1000:.1f};desc="{recorder.count} queries", '
+                f'lock;dur={recorder.lock_seconds * 1000:.1f}, '
+                f'total;dur={elapsed * 1000:.1f}'
+            )
+        return response
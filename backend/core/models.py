@@ -9,4 +9,16 @@ class TimeStampedModel(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
-        abstract = True
\ No newline at end of file
+        abstract = True
+
+
+class Checkpoint(TimeStampedModel):
+    """
+    Where a resumable background job (key rotation, ...) got to, so a
+    re-run carries on from `position` instead of starting over.
+    """
+    name = models.CharField(max_length=100, unique=True)
+    position = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.name} @ {self.position}"
@@ -0,0 +1,159 @@
+"""
+Read-replica routing.
+
+With DATABASE_REPLICA_URLS set, read-only endpoints (history, profile,
+statements, summaries, admin changelists) run their queries against a
+replica. Everything else, including the authentication lookup that
+precedes a view, stays on the primary. Views opt in through
+`ReplicaReadMixin` (or `read_replica = True` on the async views). While a
+view runs, a context variable holds the chosen alias and ReplicaRouter
+sends reads there.
+
+A replica is skipped, in favour of the primary, when:
+
+* the user moved money in the last REPLICA_STICKY_SECONDS. Transfers pin
+  both parties in the shared cache (settings refuse replicas without
+  REDIS_URL), so a transfer they just made always shows up
+  (read-your-writes);
+* its replication lag exceeds REPLICA_MAX_LAG_SECONDS or it can't be
+  reached. The check is cached per process for REPLICA_HEALTH_INTERVAL.
+"""
+import contextvars
+import logging
+import random
+import time
+from contextlib import contextmanager
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from rest_framework.permissions import SAFE_METHODS
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+_read_alias = contextvars.ContextVar('read_alias', default=None)
+
+# alias -> (checked at, healthy)
+_health = {}
+
+
+def pin_key(user_id):
+    return f'replica-pin:{user_id}'
+
+
+def pin_to_primary(*user_ids):
+    """Keeps these users' reads on the primary for REPLICA_STICKY_SECONDS."""
+    if settings.DATABASE_REPLICAS and user_ids:
+        cache.set_many(dict.fromkeys(map(pin_key, user_ids), True), timeout=settings.REPLICA_STICKY_SECONDS)
+
+
+def is_pinned(user):
+    return bool(user and user.pk and cache.get(pin_key(user.pk)))
+
+
+def replica_lag(alias):
+    """Seconds the replica is behind its primary (0 if it's caught up or isn't a standby)."""
+    connection = connections[alias]
+    if connection.vendor != 'postgresql':
+        return 0.0
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT CASE WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() "
+            "THEN 0 ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+        )
+        lag, = cursor.fetchone()
+    return float(lag or 0)
+
+
+def is_healthy(alias):
+    now = time.monotonic()
+    checked = _health.get(alias)
+    if checked and now - checked[0] < settings.REPLICA_HEALTH_INTERVAL:
+        return checked[1]
+    try:
+        lag = replica_lag(alias)
+    except DatabaseError:
+        logger.warning("Replica %s is unreachable, reading from the primary", alias, exc_info=True)
+        connections[alias].close()
+        lag = -1
+    metrics.REPLICA_LAG.set(lag, alias=alias)
+    healthy = 0 <= lag <= settings.REPLICA_MAX_LAG_SECONDS
+    _health[alias] = (now, healthy)
+    return healthy
+
+
+def read_alias(user=None):
+    """The database a read-only request by `user` should use."""
+    if not settings.DATABASE_REPLICAS or is_pinned(user):
+        return DEFAULT_DB_ALIAS
+    healthy = [alias for alias in settings.DATABASE_REPLICAS if is_healthy(alias)]
+    return random.choice(healthy) if healthy else DEFAULT_DB_ALIAS
+
+
+def current_read_alias():
+    """The alias reads are routed to right now (for work that outlives the view, e.g. streaming)."""
+    return _read_alias.get() or DEFAULT_DB_ALIAS
+
+
+def route_reads(user=None):
+    """Sends this context's reads to `read_alias(user)`. Returns a token for `stop_routing`."""
+    return route_to(read_alias(user))
+
+
+def route_to(alias):
+    metrics.REPLICA_READS.inc(alias=alias)
+    return _read_alias.set(alias)
+
+
+def stop_routing(token):
+    _read_alias.reset(token)
+
+
+@contextmanager
+def replica_reads(user=None):
+    token = route_reads(user)
+    try:
+        yield current_read_alias()
+    finally:
+        stop_routing(token)
+
+
+class ReplicaRouter:
+    """Routes reads to the alias chosen by `replica_reads`, writes always to the primary."""
+
+    def db_for_read(self, model, **hints):
+        alias = _read_alias.get()
+        if alias is None or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            # Reads inside a transaction belong with its writes
+            return DEFAULT_DB_ALIAS
+        return alias
+
+    def db_for_write(self, model, **hints):
+        # Explicit, so objects read from a replica are saved to the primary
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+class ReplicaReadMixin:
+    """
+    DRF view mixin: safe-method requests read from a replica once the user
+    is authenticated (that lookup stays on the primary).
+    """
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if settings.DATABASE_REPLICAS and request.method in SAFE_METHODS:
+            self._read_token = route_reads(request.user)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        token = getattr(self, '_read_token', None)
+        if token is not None:
+            self._read_token = None
+            stop_routing(token)
+        return super().finalize_response(request, response, *args, **kwargs)
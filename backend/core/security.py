@@ -1,41 +1,221 @@
-import base64
+import hashlib
+import multiprocessing
+import threading
+import time
+from collections import OrderedDict
 from django.conf import settings
-from cryptography.fernet import Fernet
+from django.core.exceptions import ImproperlyConfigured
+from cryptography.fernet import Fernet, MultiFernet
+
+
+def _encrypt_chunk(values):
+    return [VaultSecurity.encrypt(v) for v in values]
+
+
+def _decrypt_chunk(values):
+    return [VaultSecurity.decrypt(v, cache=False) for v in values]
+
+
+class DecryptCache:
+    """
+    Bounded, TTL-evicting map of ciphertext digest -> plaintext.
+
+    Keys are SHA-256 digests, so the cache never holds the ciphertext
+    itself, and plaintexts are kept in bytearrays that are overwritten
+    with zeros when they expire or are evicted. (The str handed back to
+    the caller is an ordinary immutable copy; only the cache's own copy
+    can be wiped.)
+    """
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def digest(encrypted_data):
+        return hashlib.sha256(encrypted_data.encode()).digest()
+
+    def get(self, digest):
+        with self.lock:
+            entry = self.entries.get(digest)
+            if entry is None:
+                return None
+            expires, plaintext = entry
+            if expires <= time.monotonic():
+                self._drop(digest)
+                return None
+            self.entries.move_to_end(digest)
+            return plaintext.decode('utf-8')
+
+    def set(self, digest, value):
+        with self.lock:
+            if digest in self.entries:
+                self._drop(digest)
+            self.entries[digest] = (time.monotonic() + self.ttl, bytearray(value.encode('utf-8')))
+            while len(self.entries) > self.maxsize:
+                self._drop(next(iter(self.entries)))
+
+    def clear(self):
+        with self.lock:
+            for digest in list(self.entries):
+                self._drop(digest)
+
+    def _drop(self, digest):
+        _, plaintext = self.entries.pop(digest)
+        plaintext[:] = bytes(len(plaintext))
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class KeyRing:
+    """
+    The encryption keys in use, by key id.
+
+    With ENCRYPTION_KEYS set ("kid:key,kid:key", newest first) values are
+    encrypted with the first key and stored as "<kid>:<fernet token>", so
+    decrypting picks the right key straight away and a rotation job can
+    tell which rows still carry an old one. Fernet tokens are url-safe
+    base64, so the ':' is unambiguous. Values without a key id predate the
+    ring and are decrypted with ENCRYPTION_KEY (or, failing that, by trying
+    every key in the ring).
+    """
+
+    def __init__(self, spec, legacy_key):
+        self.ciphers = {}
+        self.primary = None
+        for entry in filter(None, (e.strip() for e in (spec or '').split(','))):
+            kid, sep, key = entry.partition(':')
+            if not sep or not kid:
+                raise ImproperlyConfigured("ENCRYPTION_KEYS entries must look like 'kid:key'")
+            self.ciphers[kid] = Fernet(key.encode())
+            self.primary = self.primary or kid
+
+        self.legacy = None
+        if legacy_key:
+            # Ensure key is bytes
+            self.legacy = Fernet(legacy_key.encode() if isinstance(legacy_key, str) else legacy_key)
+        if self.primary is None and self.legacy is None:
+            raise ValueError("ENCRYPTION_KEY is missing in .env")
+
+    @property
+    def primary_cipher(self):
+        return self.ciphers[self.primary] if self.primary else self.legacy
+
+    def encrypt(self, data: bytes) -> str:
+        token = self.primary_cipher.encrypt(data).decode('utf-8')
+        return f"{self.primary}:{token}" if self.primary else token
+
+    def decrypt(self, encrypted_data: str) -> bytes:
+        kid, sep, token = encrypted_data.rpartition(':')
+        if not sep:
+            cipher = self.legacy or MultiFernet(list(self.ciphers.values()))
+        elif kid in self.ciphers:
+            cipher = self.ciphers[kid]
+        else:
+            raise ImproperlyConfigured(f"Encryption key {kid!r} is not in ENCRYPTION_KEYS")
+        return cipher.decrypt(token.encode())
+
+    def is_current(self, encrypted_data: str) -> bool:
+        """True if the value is already encrypted with the primary key."""
+        kid, sep, _ = encrypted_data.rpartition(':')
+        return kid == self.primary if sep else self.primary is None
+
 
 class VaultSecurity:
     """
     Handles AES-256 encryption and decryption for sensitive fields.
     assignment_reference: 'Data Security: Ensure the Aadhaar/ID Number field is stored encrypted'
     """
-    
-    _cipher = None
+
+    _keyring = None
+    _cache = None
+
+    # Below this many values a process pool costs more than it saves
+    POOL_THRESHOLD = 2000
+
+    @classmethod
+    def get_keyring(cls):
+        if cls._keyring is None:
+            cls._keyring = KeyRing(settings.ENCRYPTION_KEYS, settings.ENCRYPTION_KEY)
+        return cls._keyring
 
     @classmethod
     def get_cipher(cls):
-        if cls._cipher is None:
-            key = settings.ENCRYPTION_KEY
-            if not key:
-                raise ValueError("ENCRYPTION_KEY is missing in .env")
-            # Ensure key is bytes
-            if isinstance(key, str):
-                key = key.encode()
-            cls._cipher = Fernet(key)
-        return cls._cipher
+        """The Fernet new values are encrypted with."""
+        return cls.get_keyring().primary_cipher
+
+    @classmethod
+    def get_cache(cls):
+        """The decrypt cache, or None unless AADHAAR_CACHE_SIZE is set."""
+        if cls._cache is None and settings.AADHAAR_CACHE_SIZE:
+            cls._cache = DecryptCache(settings.AADHAAR_CACHE_SIZE, settings.AADHAAR_CACHE_TTL)
+        return cls._cache
 
     @staticmethod
     def encrypt(raw_data: str) -> str:
-        """Encrypts a string and returns a url-safe base64 encoded string."""
+        """
+        Encrypts a string with the primary key and returns the url-safe
+        base64 token (prefixed with its key id when ENCRYPTION_KEYS is set).
+        """
         if not raw_data:
             return ""
-        cipher = VaultSecurity.get_cipher()
-        encrypted_bytes = cipher.encrypt(raw_data.encode())
-        return encrypted_bytes.decode('utf-8')
+        return VaultSecurity.get_keyring().encrypt(raw_data.encode())
 
     @staticmethod
-    def decrypt(encrypted_data: str) -> str:
-        """Decrypts a base64 encoded encrypted string."""
+    def decrypt(encrypted_data: str, cache=True) -> str:
+        """
+        Decrypts a base64 encoded encrypted string. Served from the decrypt
+        cache when it's enabled, so repeat profile reads skip the HMAC
+        check and AES.
+        """
         if not encrypted_data:
             return ""
-        cipher = VaultSecurity.get_cipher()
-        decrypted_bytes = cipher.decrypt(encrypted_data.encode())
-        return decrypted_bytes.decode('utf-8')
\ No newline at end of file
+        store = VaultSecurity.get_cache() if cache else None
+        if store is not None:
+            digest = store.digest(encrypted_data)
+            value = store.get(digest)
+            if value is not None:
+                return value
+        decrypted_bytes = VaultSecurity.get_keyring().decrypt(encrypted_data)
+        value = decrypted_bytes.decode('utf-8')
+        if store is not None:
+            store.set(digest, value)
+        return value
+
+    @staticmethod
+    def encrypt_many(values, workers=None):
+        """Encrypts a list of strings, across `workers` processes for big lists."""
+        return VaultSecurity._map(_encrypt_chunk, values, workers)
+
+    @staticmethod
+    def decrypt_many(values, workers=None):
+        """
+        Decrypts a list of ciphertexts, across `workers` processes for big
+        lists (exports, re-encryption jobs). Bypasses the decrypt cache:
+        bulk jobs would only flush it.
+        """
+        return VaultSecurity._map(_decrypt_chunk, values, workers)
+
+    @staticmethod
+    def _map(func, values, workers):
+        values = list(values)
+        workers = workers or multiprocessing.cpu_count()
+        if workers < 2 or len(values) < VaultSecurity.POOL_THRESHOLD:
+            return func(values)
+        # Load the keys before forking so every worker inherits them
+        VaultSecurity.get_keyring()
+        size = -(-len(values) // (workers * 4))
+        chunks = [values[i:i + size] for i in range(0, len(values), size)]
+        with multiprocessing.get_context('fork').Pool(workers) as pool:
+            return [value for chunk in pool.map(func, chunks) for value in chunk]
+
+    @staticmethod
+    def rotate(encrypted_data: str) -> str:
+        """Re-encrypts a value under the primary key (no-op if it already is)."""
+        keyring = VaultSecurity.get_keyring()
+        if not encrypted_data or keyring.is_current(encrypted_data):
+            return encrypted_data
+        return keyring.encrypt(keyring.decrypt(encrypted_data))
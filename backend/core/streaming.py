@@ -0,0 +1,34 @@
+"""
+Streamed response bodies that stay streamed under ASGI.
+
+Under ASGI, Django serves a StreamingHttpResponse over a sync iterator by
+collecting it with sync_to_async(list) before the first byte goes out
+(StreamingHttpResponse.__aiter__), so a statement or a progress stream
+would arrive all at once. `streaming_body` gives ASGI requests an async
+iterator instead, which advances the sync one a chunk at a time in the
+request's sync thread: the thread the view ran in, whose database
+connection any open cursor or transaction belongs to.
+"""
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+
+_DONE = object()
+
+
+async def iterate_in_sync_thread(iterable):
+    """Async iterator over a sync one, taking each chunk with a thread-sensitive next()."""
+    iterator = iter(iterable)
+    step = sync_to_async(next, thread_sensitive=True)
+    try:
+        while (chunk := await step(iterator, _DONE)) is not _DONE:
+            yield chunk
+    finally:
+        if hasattr(iterator, 'close'):
+            await sync_to_async(iterator.close, thread_sensitive=True)()
+
+
+def streaming_body(request, iterable):
+    """`iterable` as a StreamingHttpResponse body for the server (WSGI or ASGI) `request` came through."""
+    if isinstance(getattr(request, '_request', request), ASGIRequest):
+        return iterate_in_sync_thread(iterable)
+    return iterable
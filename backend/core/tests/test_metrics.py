@@ -0,0 +1,42 @@
+from django.test import RequestFactory
+
+from core import views
+from core.metrics import registry
+
+
+def test_transfer_is_instrumented(wallets, post_transfer, settings):
+    settings.REQUEST_METRICS = True
+    settings.SERVER_TIMING = True
+
+    client, _, _ = wallets
+    response = post_transfer(client, "10.00")
+    assert response.status_code == 200
+    assert response['Server-Timing'].startswith('db;dur=')
+
+    text = registry.render()
+    labels = 'method="POST",endpoint="api/wallet/transfer/"'
+    assert f'vaultpay_requests_total{{{labels},status="200"}}' in text
+    assert f'vaultpay_request_duration_seconds_count{{{labels}}}' in text
+    assert f'vaultpay_db_lock_seconds_total{{{labels}}}' in text
+    assert f'vaultpay_slowest_query_seconds{{{labels},sql="' in text
+
+
+def test_middleware_unused_when_disabled(wallets, post_transfer):
+    client, _, _ = wallets
+    response = post_transfer(client, "10.00")
+    assert response.status_code == 200
+    assert 'Server-Timing' not in response
+
+
+def test_metrics_need_a_token_outside_debug(settings):
+    scrape = RequestFactory().get('/metrics')
+    settings.DEBUG = False
+    settings.METRICS_TOKEN = None
+    assert views.metrics(scrape).status_code == 403
+    settings.DEBUG = True
+    assert views.metrics(scrape).status_code == 200
+
+    settings.METRICS_TOKEN = 's3cret'
+    assert views.metrics(scrape).status_code == 401
+    scrape = RequestFactory().get('/metrics', headers={'Authorization': 'Bearer s3cret'})
+    assert views.metrics(scrape).status_code == 200
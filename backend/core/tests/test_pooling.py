@@ -0,0 +1,37 @@
+import pytest
+
+from config import settings as config
+
+
+@pytest.fixture
+def postgres():
+    return {'ENGINE': 'django.db.backends.postgresql', 'NAME': 'vaultpay', 'CONN_MAX_AGE': 600, 'OPTIONS': {}}
+
+
+def test_psycopg_pool_replaces_persistent_connections(monkeypatch, postgres):
+    monkeypatch.setattr(config, 'DATABASE_POOL', 'psycopg')
+    monkeypatch.setattr(config, 'DATABASE_PREPARE_THRESHOLD', None)
+    database = config.pooled(postgres)
+    assert database['CONN_MAX_AGE'] == 0
+    assert database['OPTIONS']['pool']['max_size'] == 20
+    # psycopg's own default applies: repeated queries get prepared
+    assert 'prepare_threshold' not in database['OPTIONS']
+
+
+def test_pgbouncer_disables_session_features(monkeypatch, postgres):
+    monkeypatch.setattr(config, 'DATABASE_POOL', 'pgbouncer')
+    monkeypatch.setattr(config, 'DATABASE_PREPARE_THRESHOLD', None)
+    database = config.pooled(dict(postgres, OPTIONS={}))
+    assert database['DISABLE_SERVER_SIDE_CURSORS'] is True
+    assert database['OPTIONS']['prepare_threshold'] is None
+    assert 'pool' not in database['OPTIONS']
+
+    # PgBouncer >= 1.21 can track prepared statements itself
+    monkeypatch.setattr(config, 'DATABASE_PREPARE_THRESHOLD', '5')
+    assert config.pooled(dict(postgres, OPTIONS={}))['OPTIONS']['prepare_threshold'] == 5
+
+
+def test_sqlite_is_left_alone(monkeypatch):
+    monkeypatch.setattr(config, 'DATABASE_POOL', 'psycopg')
+    database = {'ENGINE': 'django.db.backends.sqlite3', 'NAME': 'db.sqlite3', 'CONN_MAX_AGE': 600}
+    assert config.pooled(dict(database)) == database
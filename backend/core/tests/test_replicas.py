@@ -0,0 +1,72 @@
+import os
+import subprocess
+import sys
+import uuid
+from decimal import Decimal
+import pytest
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+
+from core import replicas
+from wallet.services import transfer_funds
+
+User = get_user_model()
+
+
+@pytest.fixture
+def replica(settings, monkeypatch):
+    settings.DATABASE_REPLICAS = ['replica1']
+    settings.REPLICA_MAX_LAG_SECONDS = 5
+    lag = {'seconds': 0.5}
+    monkeypatch.setattr(replicas, 'replica_lag', lambda alias: lag['seconds'])
+    monkeypatch.setattr(replicas, '_health', {})
+    cache.clear()
+    return lag
+
+
+def test_reads_stick_to_primary_after_a_transfer(db, replica):
+    alice = User.objects.create_user(email='alice@test.com', password='password123', wallet_balance=100)
+    bob = User.objects.create_user(email='bob@test.com', password='password123')
+    carol = User.objects.create_user(email='carol@test.com', password='password123')
+    assert replicas.read_alias(alice) == 'replica1'
+
+    transfer_funds(alice, bob.email, Decimal('10.00'), uuid.uuid4())
+    # Both parties see the transfer straight away; bystanders still use the replica
+    assert replicas.read_alias(alice) == 'default'
+    assert replicas.read_alias(bob) == 'default'
+    assert replicas.read_alias(carol) == 'replica1'
+
+
+def test_lagging_replica_falls_back_to_primary(replica, monkeypatch):
+    replica['seconds'] = 30
+    assert replicas.read_alias() == 'default'
+
+    # The verdict is cached until the next health check is due
+    replica['seconds'] = 0
+    assert replicas.read_alias() == 'default'
+    monkeypatch.setattr(replicas, '_health', {})
+    assert replicas.read_alias() == 'replica1'
+
+
+def test_router_sends_only_routed_reads_to_the_replica(replica):
+    router = replicas.ReplicaRouter()
+    assert router.db_for_read(User) == 'default'
+    with replicas.replica_reads() as alias:
+        assert alias == 'replica1'
+        assert router.db_for_read(User) == 'replica1'
+        assert router.db_for_write(User) == 'default'
+    assert router.db_for_read(User) == 'default'
+
+
+@pytest.mark.parametrize('redis_url, error', [('', 'needs a shared cache'), ('redis://localhost:6379/0', None)])
+def test_replicas_require_a_shared_cache(redis_url, error):
+    env = {**os.environ, 'DATABASE_REPLICA_URLS': 'postgres://replica/vaultpay', 'REDIS_URL': redis_url}
+    result = subprocess.run(
+        [sys.executable, '-c', 'import config.settings'],
+        cwd=settings.BASE_DIR, env=env, capture_output=True, text=True,
+    )
+    if error:
+        assert 'ImproperlyConfigured' in result.stderr and error in result.stderr
+    else:
+        assert result.returncode == 0, result.stderr
@@ -0,0 +1,56 @@
+import pytest
+from io import StringIO
+from cryptography.fernet import Fernet
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+
+from core.models import Checkpoint
+from core.security import DecryptCache, VaultSecurity
+
+User = get_user_model()
+
+
+def test_decrypt_cache_zeroes_evicted_plaintext(settings, monkeypatch):
+    settings.AADHAAR_CACHE_SIZE = 1
+    monkeypatch.setattr(VaultSecurity, '_cache', None)
+    first, second = VaultSecurity.encrypt_many(['1111-2222-3333', '4444-5555-6666'])
+
+    assert VaultSecurity.decrypt(first) == '1111-2222-3333'
+    cache = VaultSecurity.get_cache()
+    _, plaintext = cache.entries[DecryptCache.digest(first)]
+    assert VaultSecurity.decrypt(first) == '1111-2222-3333'
+
+    # Evicting the entry wipes the cached copy
+    assert VaultSecurity.decrypt(second) == '4444-5555-6666'
+    assert len(cache) == 1
+    assert plaintext == bytearray(len('1111-2222-3333'))
+
+
+def test_batch_round_trip():
+    values = [f"{i:04d}-0000-0000" for i in range(50)]
+    assert VaultSecurity.decrypt_many(VaultSecurity.encrypt_many(values)) == values
+
+
+@pytest.mark.django_db(transaction=True)
+def test_rotate_keys_reencrypts_and_resumes(settings, monkeypatch):
+    old_key, new_key = settings.ENCRYPTION_KEY, Fernet.generate_key().decode()
+    monkeypatch.setattr(VaultSecurity, '_keyring', None)
+    users = [User.objects.create_user(email=f'u{i}@test.com', password='x') for i in range(5)]
+    for user in users:
+        user.set_aadhaar(f'1234-5678-000{user.pk % 10}')
+        user.save()
+
+    settings.ENCRYPTION_KEYS = f'k2:{new_key},k1:{old_key}'
+    monkeypatch.setattr(VaultSecurity, '_keyring', None)
+    call_command('rotate_aadhaar_keys', batch_size=2, workers=1, stdout=StringIO())
+
+    for user in users:
+        user.refresh_from_db()
+        assert user.aadhaar_encrypted.startswith('k2:')
+        assert user.get_aadhaar() == f'1234-5678-000{user.pk % 10}'
+    assert Checkpoint.objects.get(name='rotate_aadhaar_keys:k2').position == users[-1].pk
+
+    # Once the old key is retired, only the new one is needed
+    settings.ENCRYPTION_KEYS, settings.ENCRYPTION_KEY = f'k2:{new_key}', None
+    monkeypatch.setattr(VaultSecurity, '_keyring', None)
+    assert users[0].get_aadhaar() == f'1234-5678-000{users[0].pk % 10}'
@@ -0,0 +1,129 @@
+import json
+import time
+import uuid
+import pytest
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import AsyncRequestFactory
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from core import metrics, throttling
+from wallet import async_views
+
+User = get_user_model()
+
+
+@pytest.fixture(autouse=True)
+def fresh_buckets():
+    throttling.local_buckets().clear()
+    yield
+    throttling.local_buckets().clear()
+
+
+def count(metric, *key):
+    return metric.values.get(key, 0)
+
+
+def test_transfers_are_throttled_per_user(wallets, post_transfer, settings):
+    settings.THROTTLE_TRANSFER_RATE = 0.01
+    settings.THROTTLE_TRANSFER_BURST = 2
+    client, _, _ = wallets
+    throttled = count(metrics.THROTTLED, 'transfer', 'local')
+
+    assert [post_transfer(client, "1.00").status_code for _ in range(3)] == [200, 200, 429]
+    response = post_transfer(client, "1.00")
+    assert int(response['Retry-After']) > 0
+    assert count(metrics.THROTTLED, 'transfer', 'local') == throttled + 2
+    # Someone else's bucket is full
+    other = APIClient()
+    other.force_authenticate(user=User.objects.create_user(email='other@test.com', password='password123'))
+    assert post_transfer(other, "1.00").status_code == 200
+
+
+def test_shared_window_caps_all_processes(wallets, post_transfer, settings, monkeypatch):
+    settings.THROTTLE_TRANSFER_RATE = 1
+    settings.THROTTLE_TRANSFER_BURST = 5
+    settings.THROTTLE_SHARED_WINDOW = 3600
+    client, sender, _ = wallets
+    monkeypatch.setattr(throttling, 'is_shared_cache', lambda: True)
+    # Other workers already used this window's allowance (burst + rate * window)
+    cache.set(f'throttle:transfer:{sender.pk}:{int(time.time() // 3600)}', 5 + 3600)
+    throttled = count(metrics.THROTTLED, 'transfer', 'shared')
+
+    response = post_transfer(client, "1.00")
+    assert response.status_code == 429
+    assert count(metrics.THROTTLED, 'transfer', 'shared') == throttled + 1
+
+
+def test_login_is_throttled_per_ip(db, settings):
+    settings.THROTTLE_LOGIN_RATE = 0.01
+    settings.THROTTLE_LOGIN_BURST = 3
+    User.objects.create_user(email='alice@test.com', password='password123')
+    client = APIClient()
+
+    statuses = [
+        client.post(reverse('token_obtain_pair'), {'email': 'alice@test.com', 'password': 'wrong'}).status_code
+        for _ in range(4)
+    ]
+    assert statuses == [401, 401, 401, 429]
+    # Another client address has its own bucket
+    response = client.post(
+        reverse('token_obtain_pair'), {'email': 'alice@test.com', 'password': 'password123'}, REMOTE_ADDR='10.0.0.2'
+    )
+    assert response.status_code == 200
+
+
+def test_transfers_are_shed_when_saturated(wallets, post_transfer, settings, monkeypatch):
+    settings.ADMISSION_MAX_INFLIGHT = 1
+    client, _, _ = wallets
+    shed = count(metrics.SHED, 'inflight')
+
+    throttling.transfers.admit()
+    try:
+        response = post_transfer(client, "1.00")
+    finally:
+        throttling.transfers.release()
+    assert response.status_code == 429
+    assert response['Retry-After'] == '1'
+    assert count(metrics.SHED, 'inflight') == shed + 1
+    # The shed request gave nothing back it didn't take
+    assert throttling.transfers.inflight == 0
+    assert post_transfer(client, "1.00").status_code == 200
+
+    monkeypatch.setattr(throttling, 'pool_usage', lambda: 0.95)
+    assert post_transfer(client, "1.00").status_code == 429
+    assert count(metrics.SHED, 'pool') >= 1
+
+
+def test_async_transfer_is_throttled_and_shed(sender, settings):
+    settings.THROTTLE_TRANSFER_RATE = 0.01
+    settings.THROTTLE_TRANSFER_BURST = 1
+    factory = AsyncRequestFactory()
+    view = async_views.TransferFundsView.as_view()
+
+    def post():
+        request = factory.post('/', json.dumps({
+            "receiver_email": "receiver@test.com",
+            "amount": "1.00",
+            "idempotency_key": str(uuid.uuid4()),
+        }), content_type='application/json', headers={'Authorization': f'Bearer {AccessToken.for_user(sender)}'})
+        return async_to_sync(view)(request)
+
+    assert post().status_code == 200
+    assert throttling.transfers.inflight == 0
+    response = post()
+    assert response.status_code == 429
+    assert int(response['Retry-After']) > 0
+
+    settings.THROTTLE_TRANSFER_RATE = 0
+    settings.ADMISSION_MAX_INFLIGHT = 1
+    throttling.transfers.admit()
+    try:
+        response = post()
+    finally:
+        throttling.transfers.release()
+    assert response.status_code == 429
+    assert response['Retry-After'] == '1'
@@ -0,0 +1,312 @@
+"""
+Rate limiting and admission control for the expensive endpoints.
+
+* Token buckets (TokenBucketThrottle, a DRF throttle): transfers per user
+  and login per client IP, since every login attempt is a PBKDF2 run.
+  Each process keeps its own buckets, so turning a client away costs no
+  I/O. With a shared cache (REDIS_URL), a request its local bucket lets
+  through is also counted in a fixed window in the cache, so N workers
+  can't pass N times the rate between them.
+* Admission control (`transfers`, through AdmissionControlMixin or
+  AsyncAPIView.admission_control): a transfer is shed before it touches
+  the database once this process has ADMISSION_MAX_INFLIGHT transfers
+  running, or ADMISSION_MAX_POOL_USAGE of its connection pool checked out.
+
+Either way the client gets a 429 with Retry-After, and core.metrics
+counts what was turned away.
+"""
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+from rest_framework.exceptions import Throttled
+from rest_framework.throttling import BaseThrottle
+
+from . import metrics
+
+# Caches that live inside the process: the local buckets already cover them
+LOCAL_CACHES = ('django.core.cache.backends.locmem.LocMemCache', 'django.core.cache.backends.dummy.DummyCache')
+
+
+class TokenBuckets:
+    """Thread-safe token buckets by key for one process, least recently used dropped past `max_keys`."""
+
+    def __init__(self, max_keys):
+        self.max_keys = max_keys
+        self.buckets = OrderedDict()
+        self.lock = threading.Lock()
+
+    def take(self, key, rate, burst):
+        """Takes a token from `key`'s bucket. Returns 0, or the seconds until one is there."""
+        now = time.monotonic()
+        with self.lock:
+            tokens, stamp = self.buckets.pop(key, (burst, now))
+            tokens = min(burst, tokens + (now - stamp) * rate)
+            wait = 0.0 if tokens >= 1 else (1 - tokens) / rate
+            self.buckets[key] = (tokens if wait else tokens - 1, now)
+            while len(self.buckets) > self.max_keys:
+                self.buckets.popitem(last=False)
+        return wait
+
+    def clear(self):
+        with self.lock:
+            self.buckets.clear()
+
+
+@lru_cache(maxsize=None)
+def local_buckets():
+    return TokenBuckets(settings.THROTTLE_LOCAL_KEYS)
+
+
+def is_shared_cache():
+    return settings.CACHES['default']['BACKEND'] not in LOCAL_CACHES
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    DRF throttle over the token buckets. Subclasses set `scope` and say
+    whose bucket a request draws from (`bucket_ident`);
+    THROTTLE_<SCOPE>_RATE (tokens per second, 0 = off) and
+    THROTTLE_<SCOPE>_BURST size it.
+
+    The shared window admits at most what one bucket could pass over
+    THROTTLE_SHARED_WINDOW seconds: burst + rate * window.
+    """
+    scope = None
+
+    def __init__(self):
+        self.rate = getattr(settings, f'THROTTLE_{self.scope.upper()}_RATE')
+        self.burst = getattr(settings, f'THROTTLE_{self.scope.upper()}_BURST')
+        self.key = self.retry_after = None
+
+    def bucket_ident(self, request):
+        raise NotImplementedError
+
+    def allow_request(self, request, view):
+        if not self.take_local(request):
+            return False
+        if not self.rate or not is_shared_cache():
+            return True
+        window_key = self.window_key()
+        cache.add(window_key, 0, timeout=settings.THROTTLE_SHARED_WINDOW * 2)
+        try:
+            count = cache.incr(window_key)
+        except ValueError:
+            # Expired between the two calls
+            count = 1
+        return self.within_window(count)
+
+    async def aallow_request(self, request, view):
+        if not self.take_local(request):
+            return False
+        if not self.rate or not is_shared_cache():
+            return True
+        window_key = self.window_key()
+        await cache.aadd(window_key, 0, timeout=settings.THROTTLE_SHARED_WINDOW * 2)
+        try:
+            count = await cache.aincr(window_key)
+        except ValueError:
+            count = 1
+        return self.within_window(count)
+
+    def take_local(self, request):
+        """Takes a token from the request's local bucket; False (and retry_after set) if it's empty."""
+        if not self.rate:
+            return True
+        self.key = f'{self.scope}:{self.bucket_ident(request)}'
+        wait = local_buckets().take(self.key, self.rate, self.burst)
+        if wait:
+            self.retry_after = wait
+            metrics.THROTTLED.inc(scope=self.scope, tier='local')
+        return not wait
+
+    def window_key(self):
+        return f'throttle:{self.key}:{int(time.time() // settings.THROTTLE_SHARED_WINDOW)}'
+
+    def within_window(self, count):
+        window = settings.THROTTLE_SHARED_WINDOW
+        if count <= self.burst + self.rate * window:
+            return True
+        self.retry_after = window - time.time() % window
+        metrics.THROTTLED.inc(scope=self.scope, tier='shared')
+        return False
+
+    def wait(self):
+        return self.retry_after
+
+
+class TransferRateThrottle(TokenBucketThrottle):
+    """Transfers, per authenticated user."""
+    scope = 'transfer'
+
+    def bucket_ident(self, request):
+        return request.user.pk
+
+
+class LoginRateThrottle(TokenBucketThrottle):
+    """Login attempts, per client IP (honours REST_FRAMEWORK['NUM_PROXIES'])."""
+    scope = 'login'
+
+    def bucket_ident(self, request):
+        return self.get_ident(request)
+
+
+class Overloaded(Throttled):
+    default_detail = 'The service is busy.'
+    default_code = 'overloaded'
+
+
+def pool_usage(alias=DEFAULT_DB_ALIAS):
+    """Share of the psycopg pool checked out (1 while requests queue for it; 0 without DATABASE_POOL=psycopg)."""
+    connection = connections[alias]
+    if settings.DATABASE_POOL != 'psycopg' or connection.vendor != 'postgresql':
+        return 0.0
+    pool = connection.pool
+    stats = pool.get_stats()
+    if stats.get('requests_waiting'):
+        return 1.0
+    return (stats.get('pool_size', 0) - stats.get('pool_available', 0)) / pool.max_size
+
+
+class InflightLimiter:
+    """Counts the transfers running in this process and refuses new ones past the thresholds."""
+
+    def __init__(self):
+        self.inflight = 0
+        self.lock = threading.Lock()
+
+    def admit(self):
+        """Claims a slot (give it back with `release`), or raises Overloaded."""
+        limit = settings.ADMISSION_MAX_INFLIGHT
+        with self.lock:
+            if limit and self.inflight >= limit:
+                reason = 'inflight'
+            elif pool_usage() >= settings.ADMISSION_MAX_POOL_USAGE:
+                reason = 'pool'
+            else:
+                reason = None
+                self.inflight += 1
+                metrics.INFLIGHT_TRANSFERS.set(self.inflight)
+        if reason:
+            metrics.SHED.inc(reason=reason)
+            raise Overloaded(wait=settings.ADMISSION_RETRY_AFTER)
+
+    def release(self):
+        with self.lock:
+            self.inflight -= 1
+            metrics.INFLIGHT_TRANSFERS.set(self.inflight)
+
+
+transfers = InflightLimiter()
+
+
+class HeldSlot:
+    """An admission slot handed over to a streamed response body, given back once."""
+
+    def __init__(self, limiter):
+        self.limiter = limiter
+        self.held = True
+
+    def release(self):
+        if self.held:
+            self.held = False
+            self.limiter.release()
+
+    def __del__(self):
+        # Last resort: under ASGI a response whose client went away mid-send
+        # is never closed
+        self.release()
+
+
+class AdmittedStream(HeldSlot):
+    """
+    A streamed response body that holds an admission slot: `limiter` is
+    released once the body is exhausted or closed (the server closes it
+    when the client goes away), whichever comes first.
+    """
+
+    def __init__(self, iterable, limiter):
+        super().__init__(limiter)
+        self.iterator = iter(iterable)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            return next(self.iterator)
+        except StopIteration:
+            self.close()
+            raise
+
+    def close(self):
+        if not self.held:
+            return
+        try:
+            if hasattr(self.iterator, 'close'):
+                self.iterator.close()
+        finally:
+            self.release()
+
+
+class AsyncAdmittedStream(HeldSlot):
+    """AdmittedStream over an async body (core.streaming under ASGI)."""
+
+    def __init__(self, iterable, limiter):
+        super().__init__(limiter)
+        self.iterator = aiter(iterable)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return await anext(self.iterator)
+        except BaseException:
+            # Exhausted, failed, or cancelled because the client went away
+            await self.aclose()
+            raise
+
+    async def aclose(self):
+        if not self.held:
+            return
+        try:
+            if hasattr(self.iterator, 'aclose'):
+                await self.iterator.aclose()
+        finally:
+            self.release()
+
+    def close(self):
+        # Django closes the response once the last chunk is out: the body
+        # has finished by then, only the slot may be left
+        self.release()
+
+
+class AdmissionControlMixin:
+    """
+    DRF view mixin: the request holds one of `transfers`' slots from
+    after authentication and throttling until its response is finalized,
+    or for a body passed through `hold_admission`, until it is streamed.
+    """
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        transfers.admit()
+        self._admitted = True
+
+    def hold_admission(self, iterable):
+        """Hands the request's slot over to a streamed response body, sync or async."""
+        if not getattr(self, '_admitted', False):
+            return iterable
+        self._admitted = False
+        stream = AsyncAdmittedStream if hasattr(iterable, '__aiter__') else AdmittedStream
+        return stream(iterable, transfers)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        if getattr(self, '_admitted', False):
+            self._admitted = False
+            transfers.release()
+        return super().finalize_response(request, response, *args, **kwargs)
@@ -1,3 +1,20 @@
-from django.shortcuts import render
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.crypto import constant_time_compare
 
-# Create your views here.
+from .metrics import registry
+
+
+def metrics(request):
+    """
+    GET /metrics: core.metrics in the Prometheus text format, behind
+    `Authorization: Bearer <METRICS_TOKEN>`. Without a token it is only
+    served with DEBUG on: endpoint names and slow SQL aren't public.
+    """
+    token = settings.METRICS_TOKEN
+    if not token:
+        if not settings.DEBUG:
+            return HttpResponse(status=403)
+    elif not constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return HttpResponse(status=401)
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
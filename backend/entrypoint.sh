@@ -28,5 +28,13 @@ else
     echo "Database already has $USER_COUNT users. Skipping seed."
 fi
 
+if [ "$WALLET_TRANSFER_MODE" = "queued" ]; then
+    echo "Starting the transfer queue workers..."
+    python manage.py process_transfers &
+fi
+
 echo "Starting Gunicorn..."
+if [ "$ASYNC_VIEWS" = "True" ]; then
+    exec gunicorn config.asgi:application -k uvicorn_worker.UvicornWorker --bind 0.0.0.0:8000
+fi
 exec gunicorn config.wsgi:application --bind 0.0.0.0:8000
\ No newline at end of file
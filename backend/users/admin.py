@@ -1,26 +1,44 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
+from core.changelist import LargeTableAdminMixin
+from wallet.models import Wallet
 from .models import User
 
-class CustomUserAdmin(UserAdmin):
+
+class WalletInline(admin.StackedInline):
+    model = Wallet
+    can_delete = False
+    # Bumped on every write to the row
+    readonly_fields = ('version',)
+
+
+class CustomUserAdmin(LargeTableAdminMixin, UserAdmin):
     # Display these columns in the list view
     list_display = ('email', 'first_name', 'last_name', 'wallet_balance', 'is_staff')
+    # The balance column lives on the wallet row
+    list_select_related = ('wallet',)
     
     # Add filters on the right side
     list_filter = ('is_staff', 'is_superuser', 'is_active', 'groups')
     
-    # Allow searching by email or name
+    # Allow searching by email or name (trigram-indexed on Postgres, see
+    # migration 0003)
     search_fields = ('email', 'first_name', 'last_name', 'phone_number')
     
     # Organize the detail view field layout
     fieldsets = (
         (None, {'fields': ('email', 'password')}),
         ('Personal Info', {'fields': ('first_name', 'last_name', 'phone_number')}),
-        ('Financials', {'fields': ('wallet_balance', 'aadhaar_encrypted')}),
+        ('Financials', {'fields': ('shard_count', 'aadhaar_encrypted')}),
         ('Permissions', {'fields': ('is_active', 'is_staff', 'is_superuser', 'groups', 'user_permissions')}),
         ('Important dates', {'fields': ('last_login', 'date_joined')}),
     )
     
+    # Changed through `manage.py shard_wallet`, which also creates the shard rows
+    readonly_fields = ('shard_count',)
+
+    inlines = (WalletInline,)
+
     ordering = ('email',)
 
 admin.site.register(User, CustomUserAdmin)
\ No newline at end of file
@@ -0,0 +1,27 @@
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+
+from core.async_views import AsyncAPIView
+from .models import User
+from .serializers import UserProfileSerializer
+
+# Native async twins of users.views, routed in place of them when
+# settings.ASYNC_VIEWS is on (see users/urls.py).
+
+
+class UserProfileView(AsyncAPIView):
+    """
+    GET /api/users/profile/ (async).
+    """
+    read_replica = True
+
+    async def get(self, request):
+        # request.user only carries the cached auth fields; load the full row
+        user = await User.objects.select_related('wallet').aget(pk=request.user.pk)
+        serializer = UserProfileSerializer(user, context={'request': request})
+        if user.shard_count:
+            # total_balance sums a hot wallet's shards with the sync ORM
+            data = await sync_to_async(lambda: serializer.data)()
+        else:
+            data = serializer.data
+        return JsonResponse(data)
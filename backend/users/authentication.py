@@ -0,0 +1,118 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+# What request.user carries from the cache. The rest (balance, Aadhaar,
+# profile fields) is deferred: views that need it load the row themselves.
+CACHED_FIELDS = ('id', 'email', 'is_active', 'is_staff', 'is_superuser', 'shard_count')
+
+
+def user_cache_key(user_id):
+    return f'jwt-user:{user_id}'
+
+
+def forget_user(user_id):
+    """Drops the cached auth copy of a user (users.signals does this on every save)."""
+    cache.delete(user_cache_key(user_id))
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that resolves the token's user from a short-lived
+    cache (AUTH_USER_CACHE_TTL) instead of loading the whole row on every
+    request. request.user is a User with only CACHED_FIELDS loaded; a
+    cached entry is dropped whenever a save of the user commits, so a
+    password or is_active change takes effect on the next request.
+
+    With settings.AUTH_USER_CACHE off (no shared cache) it is plain
+    JWTAuthentication.
+    """
+
+    def get_user(self, validated_token):
+        if not settings.AUTH_USER_CACHE:
+            return super().get_user(validated_token)
+        user_id = self.token_user_id(validated_token)
+        key = user_cache_key(user_id)
+        values = cache.get(key)
+        if values is None:
+            user = (
+                self.user_model.objects.filter(**{api_settings.USER_ID_FIELD: user_id})
+                .only(*CACHED_FIELDS, 'password').first()
+            )
+            if user is None:
+                raise AuthenticationFailed(_("User not found"), code="user_not_found")
+            values = self.cache_values(user)
+            cache.set(key, values, settings.AUTH_USER_CACHE_TTL)
+        return self.check_user(values, validated_token)
+
+    def token_user_id(self, validated_token):
+        try:
+            return validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as e:
+            raise InvalidToken(_("Token contained no recognizable user identification")) from e
+
+    @staticmethod
+    def cache_values(user):
+        values = {field: getattr(user, field) for field in CACHED_FIELDS}
+        if api_settings.CHECK_REVOKE_TOKEN:
+            # A digest of the hash, never the hash itself
+            values['revoke'] = get_md5_hash_password(user.password)
+        return values
+
+    def check_user(self, values, validated_token):
+        if api_settings.CHECK_USER_IS_ACTIVE and not values['is_active']:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != values['revoke']:
+                raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+
+        return self.user_model.from_db(DEFAULT_DB_ALIAS, CACHED_FIELDS, [values[f] for f in CACHED_FIELDS])
+
+
+class AsyncJWTAuthentication(CachedJWTAuthentication):
+    """
+    JWTAuthentication for the native async views (core.async_views).
+    Header parsing and token validation are pure CPU and reused as is; only
+    the user lookup is swapped for the async cache and ORM.
+    """
+
+    async def aauthenticate(self, request):
+        header = self.get_header(request)
+        if header is None:
+            return None
+
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+
+        validated_token = self.get_validated_token(raw_token)
+
+        return await self.aget_user(validated_token), validated_token
+
+    async def aget_user(self, validated_token):
+        user_id = self.token_user_id(validated_token)
+        if not settings.AUTH_USER_CACHE:
+            user = await self.user_model.objects.filter(**{api_settings.USER_ID_FIELD: user_id}).afirst()
+            if user is None:
+                raise AuthenticationFailed(_("User not found"), code="user_not_found")
+            # Same checks as JWTAuthentication.get_user; the full row is returned
+            self.check_user(self.cache_values(user), validated_token)
+            return user
+        key = user_cache_key(user_id)
+        values = await cache.aget(key)
+        if values is None:
+            user = await (
+                self.user_model.objects.filter(**{api_settings.USER_ID_FIELD: user_id})
+                .only(*CACHED_FIELDS, 'password').afirst()
+            )
+            if user is None:
+                raise AuthenticationFailed(_("User not found"), code="user_not_found")
+            values = self.cache_values(user)
+            await cache.aset(key, values, settings.AUTH_USER_CACHE_TTL)
+        return self.check_user(values, validated_token)
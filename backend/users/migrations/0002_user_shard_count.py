@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='shard_count',
+            field=models.PositiveSmallIntegerField(default=0, help_text='Number of balance shards receiving credits (0 = unsharded)'),
+        ),
+    ]
@@ -0,0 +1,42 @@
+from django.db import migrations
+
+# The admin searches these with icontains, i.e. UPPER(col::text) LIKE '%TERM%'
+SEARCH_COLUMNS = ('email', 'first_name', 'last_name', 'phone_number')
+
+
+def create_indexes(apps, schema_editor):
+    """
+    Trigram GIN indexes for the admin's substring searches. Postgres only,
+    and skipped where the server lacks the pg_trgm contrib module (the
+    searches still work, unindexed).
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+        if cursor.fetchone() is None:
+            return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for column in SEARCH_COLUMNS:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS users_user_{column}_trgm_idx '
+            f'ON users_user USING gin ((UPPER({column}::text)) gin_trgm_ops)'
+        )
+
+
+def drop_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for column in SEARCH_COLUMNS:
+        schema_editor.execute(f'DROP INDEX IF EXISTS users_user_{column}_trgm_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_user_shard_count'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
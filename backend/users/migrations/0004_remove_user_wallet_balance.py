@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:23
+
+from django.db import migrations
+
+
+def restore_balances(apps, schema_editor):
+    """Reverse only: copies the wallet rows back into the re-added column."""
+    schema_editor.execute(
+        'UPDATE users_user SET wallet_balance = '
+        '(SELECT balance FROM wallet_wallet WHERE wallet_wallet.user_id = users_user.id) '
+        'WHERE id IN (SELECT user_id FROM wallet_wallet)'
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_search_trigram_indexes'),
+        # The balances are copied out first
+        ('wallet', '0012_wallet'),
+    ]
+
+    operations = [
+        migrations.RunPython(migrations.RunPython.noop, restore_balances),
+        migrations.RemoveField(
+            model_name='user',
+            name='wallet_balance',
+        ),
+    ]
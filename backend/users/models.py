@@ -1,3 +1,4 @@
+from django.core.exceptions import ObjectDoesNotExist
 from django.db import models
 from django.contrib.auth.models import AbstractUser
 from core.models import TimeStampedModel
@@ -8,13 +9,12 @@ class User(AbstractUser, TimeStampedModel):
     username = None  # We use email as login
     email = models.EmailField('email address', unique=True)
     
-    # Financial Field (Assignment 2 Requirement)
-    # Using DecimalField is critical for financial precision (no floating point errors)
-    wallet_balance = models.DecimalField(
-        max_digits=12, 
-        decimal_places=2, 
-        default=1000.00, # Giving free money for testing
-        help_text="Current wallet balance in INR"
+    # Hot wallets (e.g. busy merchants) take credits on `shard_count`
+    # wallet.BalanceShard rows instead of this row, so concurrent payers
+    # don't queue on one row lock. 0 means an ordinary wallet.
+    shard_count = models.PositiveSmallIntegerField(
+        default=0,
+        help_text="Number of balance shards receiving credits (0 = unsharded)"
     )
 
     # Security Field (Assignment 1 Requirement)
@@ -33,6 +33,37 @@ class User(AbstractUser, TimeStampedModel):
     def __str__(self):
         return self.email
 
+    @property
+    def wallet_balance(self):
+        """
+        Balance on the user's wallet.Wallet row, which transfers update
+        without touching this (much wider) row. Before the user is saved,
+        the opening balance their wallet will be created with.
+        """
+        try:
+            return self.wallet.balance
+        except ObjectDoesNotExist:
+            return getattr(self, '_opening_balance', None)
+
+    @wallet_balance.setter
+    def wallet_balance(self, value):
+        # Saved through the Wallet (or, for a new user, when it's created)
+        try:
+            self.wallet.balance = value
+        except ObjectDoesNotExist:
+            self._opening_balance = value
+
+    @property
+    def total_balance(self):
+        """
+        Spendable balance: the wallet row plus any credits still sitting on
+        balance shards that haven't been consolidated yet.
+        """
+        if not self.shard_count:
+            return self.wallet_balance
+        pending = self.balance_shards.aggregate(total=models.Sum('balance'))['total']
+        return self.wallet_balance + (pending or 0)
+
     def set_aadhaar(self, raw_aadhaar):
         """
         Helper to encrypt Aadhaar before saving.
@@ -29,6 +29,8 @@ class UserProfileSerializer(serializers.ModelSerializer):
     Decrypted Aadhaar is included explicitly.
     """
     aadhaar_number = serializers.SerializerMethodField()
+    # Includes credits still parked on a hot wallet's balance shards
+    wallet_balance = serializers.DecimalField(max_digits=12, decimal_places=2, source='total_balance', read_only=True)
     
     class Meta:
         model = User
@@ -0,0 +1,17 @@
+from functools import partial
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .authentication import forget_user
+from .models import User
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def forget_cached_user(sender, instance, **kwargs):
+    # Password, is_active and the rest take effect on the next request.
+    # Dropped once the save commits: a request between the delete and the
+    # commit would cache the old row again. The pk is taken now: a delete
+    # clears it on the instance.
+    transaction.on_commit(partial(forget_user, instance.pk))
@@ -0,0 +1,82 @@
+import pytest
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+User = get_user_model()
+
+
+@pytest.fixture(autouse=True)
+def user_cache(settings):
+    # On only with a shared cache outside the tests. Rolled back users
+    # never commit their invalidation, and ids get reused.
+    settings.AUTH_USER_CACHE = True
+    cache.clear()
+    yield
+    cache.clear()
+
+
+def bearer(user):
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(user)}')
+    return client
+
+
+def user_queries(captured):
+    # History joins users for the emails; the auth lookup selects from it
+    return [q['sql'] for q in captured.captured_queries if 'FROM "users_user"' in q['sql']]
+
+
+def test_history_skips_the_user_lookup_once_cached(db):
+    user = User.objects.create_user(email='alice@test.com', password='password123')
+    client = bearer(user)
+    assert client.get(reverse('history')).status_code == 200
+
+    with CaptureQueriesContext(connection) as captured:
+        assert client.get(reverse('history')).status_code == 200
+    assert user_queries(captured) == []
+
+
+def test_saving_the_user_drops_the_cached_copy(db, django_capture_on_commit_callbacks):
+    user = User.objects.create_user(email='alice@test.com', password='password123')
+    client = bearer(user)
+    assert client.get(reverse('history')).status_code == 200
+
+    with django_capture_on_commit_callbacks(execute=True):
+        with transaction.atomic():
+            user.is_active = False
+            user.save()
+            # Not dropped until the save commits
+            assert client.get(reverse('history')).status_code == 200
+    assert client.get(reverse('history')).status_code == 401
+
+
+def test_without_a_shared_cache_every_request_loads_the_user(db, settings):
+    settings.AUTH_USER_CACHE = False
+    user = User.objects.create_user(email='alice@test.com', password='password123')
+    client = bearer(user)
+    assert client.get(reverse('history')).status_code == 200
+
+    with CaptureQueriesContext(connection) as captured:
+        assert client.get(reverse('history')).status_code == 200
+    assert len(user_queries(captured)) == 1
+    # A save on another process's cache can't go stale here
+    User.objects.filter(pk=user.pk).update(is_active=False)
+    assert client.get(reverse('history')).status_code == 401
+
+
+def test_profile_still_returns_the_full_row(db):
+    user = User.objects.create_user(email='alice@test.com', password='password123', wallet_balance=42)
+    user.set_aadhaar('1234-5678-9012')
+    user.save()
+    client = bearer(user)
+    client.get(reverse('history'))
+
+    body = client.get(reverse('profile')).json()
+    assert body['email'] == 'alice@test.com'
+    assert body['wallet_balance'] == '42.00'
+    assert body['aadhaar_number'] == '1234-5678-9012'
@@ -1,16 +1,17 @@
+from django.conf import settings
 from django.urls import path
-from rest_framework_simplejwt.views import (
-    TokenObtainPairView,
-    TokenRefreshView,
-)
-from .views import RegisterView, UserProfileView
+from rest_framework_simplejwt.views import TokenRefreshView
+from . import async_views, views
+
+# Under ASGI the profile endpoint can be served by its native async twin
+api = async_views if settings.ASYNC_VIEWS else views
 
 urlpatterns = [
     # Auth Endpoints (Assignment 1)
-    path('register/', RegisterView.as_view(), name='register'),
-    path('login/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
+    path('register/', views.RegisterView.as_view(), name='register'),
+    path('login/', views.LoginView.as_view(), name='token_obtain_pair'),
     path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     
     # Profile Endpoint (Assignment 1 - Decryption)
-    path('profile/', UserProfileView.as_view(), name='profile'),
+    path('profile/', api.UserProfileView.as_view(), name='profile'),
 ]
\ No newline at end of file
@@ -1,6 +1,9 @@
 from rest_framework import generics, permissions
 from rest_framework.views import APIView
 from rest_framework.response import Response
+from rest_framework_simplejwt.views import TokenObtainPairView
+from core.throttling import LoginRateThrottle
+from core.replicas import ReplicaReadMixin
 from .serializers import UserRegistrationSerializer, UserProfileSerializer
 from .models import User
 
@@ -9,7 +12,15 @@ class RegisterView(generics.CreateAPIView):
     permission_classes = (permissions.AllowAny,)
     serializer_class = UserRegistrationSerializer
 
-class UserProfileView(generics.RetrieveAPIView):
+class LoginView(TokenObtainPairView):
+    """
+    POST /api/users/login/
+    Every attempt hashes the password (PBKDF2), so attempts are throttled
+    per client IP.
+    """
+    throttle_classes = (LoginRateThrottle,)
+
+class UserProfileView(ReplicaReadMixin, generics.RetrieveAPIView):
     """
     GET /api/users/profile/
     Returns the logged-in user's details with Decrypted Aadhaar.
@@ -18,5 +29,5 @@ class UserProfileView(generics.RetrieveAPIView):
     permission_classes = (permissions.IsAuthenticated,)
 
     def get_object(self):
-        # Return the currently logged-in user
-        return self.request.user
\ No newline at end of file
+        # request.user only carries the cached auth fields; load the full row (and its wallet)
+        return User.objects.select_related('wallet').get(pk=self.request.user.pk)
\ No newline at end of file
@@ -1,21 +1,102 @@
+import uuid
 from django.contrib import admin
-from .models import Transaction, IdempotencyLog
+from django.contrib.auth import get_user_model
+from django.db.models import Q
+from core.changelist import LargeTableAdminMixin
+from .models import (
+    Transaction, IdempotencyLog, BalanceShard, BalanceCheckpoint, DailySummary, ArchivedBlock, LedgerEntry,
+)
+
+User = get_user_model()
 
 @admin.register(Transaction)
-class TransactionAdmin(admin.ModelAdmin):
+class TransactionAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     list_display = ('reference_id', 'sender', 'receiver', 'amount', 'status', 'created_at')
     list_filter = ('status', 'created_at')
+    # Both sides are rendered by email: one join instead of a query per row
+    list_select_related = ('sender', 'receiver')
+    date_hierarchy = 'created_at'
+    ordering = ('-created_at', '-id')
     search_fields = ('reference_id', 'sender__email', 'receiver__email')
+    search_help_text = 'A reference id (exact) or part of the sender\'s or receiver\'s email.'
     
     # Make fields read-only to ensure Audit Log integrity (Security Best Practice)
     readonly_fields = ('sender', 'receiver', 'amount', 'reference_id', 'created_at')
 
+    def get_search_results(self, request, queryset, search_term):
+        """
+        A reference id is looked up through its unique index, anything else
+        is matched against user emails (trigram-indexed on Postgres) in a
+        subquery and then against the sender/receiver indexes, instead of
+        icontains across both joins.
+        """
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+        try:
+            return queryset.filter(reference_id=uuid.UUID(term)), False
+        except ValueError:
+            pass
+        users = User.objects.filter(email__icontains=term).values('pk')
+        return queryset.filter(Q(sender__in=users) | Q(receiver__in=users)), False
+
     def has_delete_permission(self, request, obj=None):
         # Disable deleting transactions (Immutable Ledger)
         return False
 
+@admin.register(LedgerEntry)
+class LedgerEntryAdmin(LargeTableAdminMixin, admin.ModelAdmin):
+    list_display = ('id', 'user', 'transaction_id', 'amount', 'balance_after', 'created_at')
+    list_select_related = ('user',)
+    ordering = ('-id',)
+    raw_id_fields = ('user',)
+    readonly_fields = ('user', 'transaction', 'amount', 'balance_after', 'created_at')
+
+    # Append-only: entries are written by transfers and never edited
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
 @admin.register(IdempotencyLog)
 class IdempotencyLogAdmin(admin.ModelAdmin):
-    list_display = ('key', 'user', 'response_code', 'created_at')
+    list_display = ('key', 'user', 'response_code', 'created_at', 'expires_at')
     search_fields = ('key', 'user__email')
-    readonly_fields = ('key', 'user', 'response_body', 'response_code')
\ No newline at end of file
+    readonly_fields = ('key', 'user', 'response_body', 'response_code', 'expires_at')
+
+@admin.register(BalanceShard)
+class BalanceShardAdmin(admin.ModelAdmin):
+    list_display = ('user', 'index', 'balance')
+    search_fields = ('user__email',)
+    # Shards are managed by `shard_wallet` / `consolidate_shards`
+    readonly_fields = ('user', 'index', 'balance')
+
+@admin.register(BalanceCheckpoint)
+class BalanceCheckpointAdmin(admin.ModelAdmin):
+    list_display = ('user', 'balance', 'last_transaction_id', 'taken_at')
+    search_fields = ('user__email',)
+    # Written by `reconcile_balances`
+    readonly_fields = ('user', 'balance', 'last_transaction_id', 'taken_at')
+
+@admin.register(DailySummary)
+class DailySummaryAdmin(admin.ModelAdmin):
+    list_display = ('user', 'day', 'sent_total', 'sent_count', 'received_total', 'received_count')
+    search_fields = ('user__email',)
+    # Written by `update_daily_summaries`
+    readonly_fields = ('user', 'day', 'sent_total', 'sent_count', 'received_total', 'received_count')
+
+@admin.register(ArchivedBlock)
+class ArchivedBlockAdmin(admin.ModelAdmin):
+    list_display = ('month', 'first_id', 'last_id', 'row_count', 'created_at')
+    list_filter = ('month',)
+    # Written by `archive_transactions`; the compressed rows aren't editable
+    exclude = ('data',)
+    readonly_fields = ('month', 'first_id', 'last_id', 'row_count', 'created_at')
+
+    def has_delete_permission(self, request, obj=None):
+        # Archived rows are still part of the ledger
+        return False
@@ -0,0 +1,99 @@
+"""
+Archival of cold ledger months.
+
+`archive_transactions` copies a month of Transaction rows into
+ArchivedBlocks (zlib-compressed CSV, a few thousand rows each) plus one
+ArchivedReference per row, then removes the month from the live table: by
+dropping its partition on Postgres (no bulk DELETE, nothing to vacuum) or
+with a DELETE elsewhere. find_archived() turns a reference_id back into an
+unsaved Transaction, so lookups by reference work whichever tier the row
+is in.
+
+Only months that the daily summaries and balance reconciliation have both
+moved past can be archived, because both read the ledger after their
+checkpoints.
+"""
+import csv
+import io
+import uuid
+import zlib
+from datetime import datetime
+from decimal import Decimal
+from itertools import islice
+from django.db import transaction
+from django.db.models import Min
+
+from core.models import Checkpoint
+from .models import ArchivedBlock, ArchivedReference, BalanceCheckpoint, Transaction
+from .partitions import add_months, drop_partition
+from .summaries import FEED
+
+FIELDS = ('id', 'reference_id', 'sender_id', 'receiver_id', 'amount', 'status', 'created_at', 'updated_at')
+
+
+def archive_horizon():
+    """Highest transaction id that may be archived."""
+    horizon = Checkpoint.objects.filter(name=FEED).values_list('position', flat=True).first() or 0
+    reconciled = BalanceCheckpoint.objects.aggregate(upto=Min('last_transaction_id'))['upto']
+    return horizon if reconciled is None else min(horizon, reconciled)
+
+
+def month_rows(month):
+    return Transaction.objects.filter(created_at__gte=month, created_at__lt=add_months(month, 1))
+
+
+def archive_month(month, block_rows=2000):
+    """
+    Moves the (UTC) month starting at `month` out of the live table.
+    Returns the number of rows archived.
+    """
+    rows = month_rows(month).order_by('id').values_list(*FIELDS).iterator(chunk_size=block_rows)
+    archived = 0
+    with transaction.atomic():
+        while block := list(islice(rows, block_rows)):
+            write_block(month, block)
+            archived += len(block)
+        if not drop_partition(month):
+            month_rows(month).delete()
+    return archived
+
+
+def write_block(month, rows):
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    block = ArchivedBlock.objects.create(
+        month=month.date(), first_id=rows[0][0], last_id=rows[-1][0], row_count=len(rows),
+        data=zlib.compress(buffer.getvalue().encode(), 6),
+    )
+    ArchivedReference.objects.bulk_create(
+        [ArchivedReference(reference_id=row[1], block=block) for row in rows], batch_size=5000
+    )
+    return block
+
+
+def read_block(block):
+    """The block's rows as unsaved Transaction instances."""
+    return map(to_transaction, raw_rows(block))
+
+
+def raw_rows(block):
+    return csv.reader(io.StringIO(zlib.decompress(bytes(block.data)).decode()))
+
+
+def to_transaction(row):
+    tx_id, reference_id, sender_id, receiver_id, amount, status, created_at, updated_at = row
+    return Transaction(
+        id=int(tx_id), reference_id=uuid.UUID(reference_id),
+        sender_id=int(sender_id), receiver_id=int(receiver_id),
+        amount=Decimal(amount), status=status,
+        created_at=datetime.fromisoformat(created_at), updated_at=datetime.fromisoformat(updated_at),
+    )
+
+
+def find_archived(reference_id):
+    """The archived transaction with this reference_id, or None."""
+    reference = ArchivedReference.objects.select_related('block').filter(reference_id=reference_id).first()
+    if reference is None:
+        return None
+    wanted = str(reference.reference_id)
+    return to_transaction(next(row for row in raw_rows(reference.block) if row[1] == wanted))
@@ -0,0 +1,63 @@
+import logging
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+
+from core.async_views import AsyncAPIView
+from core.throttling import TransferRateThrottle
+from .models import Transaction
+from .pagination import KeysetPagination
+from .serializers import TransferSerializer, TransactionHistorySerializer
+from .services import transfer_funds
+
+logger = logging.getLogger(__name__)
+
+# Native async twins of wallet.views, routed in place of them when
+# settings.ASYNC_VIEWS is on (see wallet/urls.py).
+
+
+class TransferFundsView(AsyncAPIView):
+    """
+    POST /api/wallet/transfer/ (async).
+    transaction.atomic() can't span awaits, so the transfer itself runs in
+    a worker thread; everything around it stays on the event loop.
+    """
+    throttle_classes = (TransferRateThrottle,)
+    admission_control = True
+
+    async def post(self, request):
+        serializer = TransferSerializer(data=self.parse_json(request), context={'request': request})
+        if not serializer.is_valid():
+            return JsonResponse(serializer.errors, status=400)
+
+        try:
+            body, status = await sync_to_async(transfer_funds)(
+                request.user,
+                receiver_email=serializer.validated_data['receiver_email'],
+                amount=serializer.validated_data['amount'],
+                idempotency_key=serializer.validated_data['idempotency_key'],
+            )
+        except Exception as e:
+            logger.exception("Transfer Error")
+            return JsonResponse({"error": str(e)}, status=500)
+
+        return JsonResponse(body, status=status)
+
+
+class TransactionHistoryView(AsyncAPIView):
+    """
+    GET /api/wallet/history/ (async), same keyset pages as the sync view.
+    """
+    read_replica = True
+
+    async def get(self, request):
+        user = request.user
+        branches = (
+            Transaction.objects.history().filter(sender=user),
+            Transaction.objects.history().filter(receiver=user),
+        )
+        paginator = KeysetPagination()
+        rows = await paginator.apaginate_queryset(branches, request)
+        return JsonResponse({
+            'next': paginator.get_next_link(),
+            'results': TransactionHistorySerializer(rows, many=True).data,
+        })
@@ -0,0 +1,223 @@
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from django.conf import settings
+from django.core.cache import caches
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import IdempotencyLog
+
+# Answer for a retry that arrives while the original request is still running
+IN_PROGRESS = (
+    {"error": "A request with this idempotency key is still being processed. Retry shortly."},
+    409
+)
+
+
+class ClaimLost(Exception):
+    """
+    Raised by `complete()` when our in-progress claim is no longer ours
+    (another request took over an abandoned claim and finished first).
+    The caller's atomic block must roll back and replay `outcome()`.
+    """
+
+
+def get_idempotency_store():
+    """The configured store (settings.WALLET_IDEMPOTENCY_STORE), one per process."""
+    return _load_store(settings.WALLET_IDEMPOTENCY_STORE)
+
+
+@lru_cache(maxsize=None)
+def _load_store(path):
+    return import_string(path)()
+
+
+class DatabaseIdempotencyStore:
+    """
+    Idempotency keys backed by `IdempotencyLog` alone.
+
+    A key's life cycle is: `begin()` inserts the row with no response code
+    (the in-progress marker) and commits it straight away, so a concurrent
+    retry with the same key hits the unique constraint and waits for the
+    outcome instead of running the transfer a second time. The caller then
+    does the work and records the response with `complete()` inside its
+    own atomic block, or gives the key back with `release()` if nothing
+    was done (validation errors, insufficient funds) so it can be reused.
+    Rows expire after WALLET_IDEMPOTENCY_TTL and are deleted by the
+    `prune_idempotency` command.
+    """
+    poll_interval = 0.05
+
+    def begin(self, user_id, key):
+        """
+        Returns a `(body, status)` pair to replay, or None once the caller
+        holds the claim on the key and should go ahead.
+        """
+        deadline = time.monotonic() + settings.WALLET_IDEMPOTENCY_WAIT
+        while True:
+            if self.claim(user_id, key):
+                return None
+
+            log = self.fetch(user_id, key)
+            if log is None:
+                # Released between our insert and our read: try again
+                continue
+            if log.response_code is not None:
+                return self.replay(user_id, key, log)
+            if self.is_abandoned(log) and self.take_over(log):
+                return None
+            if time.monotonic() >= deadline:
+                return IN_PROGRESS
+            time.sleep(self.poll_interval)
+
+    def outcome(self, user_id, key):
+        """
+        Waits for whoever holds the key to finish and returns their
+        response (or IN_PROGRESS if they don't within the wait window).
+        """
+        deadline = time.monotonic() + settings.WALLET_IDEMPOTENCY_WAIT
+        while True:
+            log = self.fetch(user_id, key)
+            if log is not None and log.response_code is not None:
+                return self.replay(user_id, key, log)
+            if time.monotonic() >= deadline:
+                return IN_PROGRESS
+            time.sleep(self.poll_interval)
+
+    def complete(self, user_id, key, body, status):
+        """
+        Records the response for a claimed key. Call inside the atomic
+        block that did the work, so the response and the money commit or
+        roll back together.
+        """
+        expires_at = timezone.now() + settings.WALLET_IDEMPOTENCY_TTL
+        updated = IdempotencyLog.objects.filter(
+            user_id=user_id, key=key, response_code__isnull=True
+        ).update(
+            response_body=body, response_code=status,
+            expires_at=expires_at, updated_at=timezone.now()
+        )
+        if not updated:
+            raise ClaimLost()
+
+    def release(self, user_id, key):
+        IdempotencyLog.objects.filter(user_id=user_id, key=key, response_code__isnull=True).delete()
+
+    def claim(self, user_id, key):
+        try:
+            # Its own (sub)transaction: the marker has to be visible to
+            # other requests before we start moving money.
+            with transaction.atomic():
+                IdempotencyLog.objects.create(
+                    user_id=user_id, key=key,
+                    expires_at=timezone.now() + settings.WALLET_IDEMPOTENCY_TTL
+                )
+        except IntegrityError:
+            return False
+        return True
+
+    def fetch(self, user_id, key):
+        return IdempotencyLog.objects.filter(user_id=user_id, key=key).only(
+            'response_body', 'response_code', 'expires_at', 'updated_at'
+        ).first()
+
+    def is_abandoned(self, log):
+        # The worker holding it died without releasing it
+        return log.updated_at < timezone.now() - settings.WALLET_IDEMPOTENCY_LEASE
+
+    def take_over(self, log):
+        # Compare-and-set on updated_at, so only one retry gets the claim
+        return IdempotencyLog.objects.filter(
+            pk=log.pk, response_code__isnull=True, updated_at=log.updated_at
+        ).update(updated_at=timezone.now()) == 1
+
+    def replay(self, user_id, key, log):
+        return log.response_body, log.response_code
+
+
+class CachedIdempotencyStore(DatabaseIdempotencyStore):
+    """
+    The database store with two read-through caches in front of it for
+    replays: a per-process LRU and the shared Django cache (Redis when
+    REDIS_URL is set). Only finished responses are cached; they never
+    change, so entries simply expire with the row.
+    """
+    cache_alias = 'default'
+
+    def __init__(self):
+        self.local = LRUCache(settings.WALLET_IDEMPOTENCY_LOCAL_CACHE_SIZE)
+
+    @property
+    def shared(self):
+        return caches[self.cache_alias]
+
+    def cache_key(self, user_id, key):
+        return f"idempotency:{user_id}:{key}"
+
+    def begin(self, user_id, key):
+        cache_key = self.cache_key(user_id, key)
+        replay = self.local.get(cache_key)
+        if replay is None:
+            replay = self.shared.get(cache_key)
+            if replay is not None:
+                self.local.set(cache_key, replay, settings.WALLET_IDEMPOTENCY_TTL.total_seconds())
+        if replay is not None:
+            return tuple(replay)
+        return super().begin(user_id, key)
+
+    def complete(self, user_id, key, body, status):
+        super().complete(user_id, key, body, status)
+        ttl = settings.WALLET_IDEMPOTENCY_TTL.total_seconds()
+        transaction.on_commit(lambda: self.remember(user_id, key, (body, status), ttl))
+
+    def replay(self, user_id, key, log):
+        replay = super().replay(user_id, key, log)
+        ttl = (log.expires_at - timezone.now()).total_seconds()
+        if ttl > 0:
+            self.remember(user_id, key, replay, ttl)
+        return replay
+
+    def remember(self, user_id, key, replay, ttl):
+        cache_key = self.cache_key(user_id, key)
+        self.local.set(cache_key, replay, ttl)
+        self.shared.set(cache_key, replay, timeout=ttl)
+
+
+class LRUCache:
+    """
+    Thread-safe, size-bounded LRU whose entries also expire. A size of 0
+    disables it.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires <= time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        if not self.maxsize:
+            return
+        with self.lock:
+            self.entries[key] = (time.monotonic() + ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
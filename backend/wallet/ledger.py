@@ -0,0 +1,110 @@
+"""
+The double-entry ledger (LedgerEntry).
+
+Each settled transfer appends a debit entry for the sender and a credit
+entry for the receiver, in the same transaction as the balance updates.
+The entries carry each side's running balance, taken from the balance
+UPDATE's RETURNING value (or the in-memory balances of a batch), so
+recording them costs one multi-row INSERT and no extra reads. Balances
+are still guarded on the wallet row: a debit has to see every earlier one.
+
+Entries are never changed. "What was the balance at T" is the last
+entry by T, found with one step down the (user, created_at, id) index.
+
+Transfers settled before the ledger existed get their entries from
+`backfill` (the backfill_ledger command): a user's balance before their
+first entry is the wallet balance less everything entered since, and the
+running balances walk back from there through the older transactions.
+"""
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Exists, F, OuterRef, Sum
+
+from .models import LedgerEntry, Transaction, Wallet
+
+
+def transfer_entries(tx_id, sender_id, receiver_id, amount, at, sender_balance, receiver_balance):
+    """The debit and credit entries for one transfer (unsaved)."""
+    return [
+        LedgerEntry(user_id=sender_id, transaction_id=tx_id, amount=-amount, balance_after=sender_balance, created_at=at),
+        LedgerEntry(user_id=receiver_id, transaction_id=tx_id, amount=amount, balance_after=receiver_balance, created_at=at),
+    ]
+
+
+def record(entries):
+    LedgerEntry.objects.bulk_create(entries, batch_size=1000)
+
+
+def current_balance(user):
+    """The user's spendable balance now, whatever fields `user` has loaded."""
+    current = type(user).objects.only('id', 'shard_count', 'wallet__balance').select_related('wallet').get(pk=user.pk)
+    return current.total_balance
+
+
+def balance_at(user, moment):
+    """
+    The user's balance at `moment`: the running balance of their last
+    entry by then. Hot wallets (no running balance) work back from the
+    current balance through the entries since, which is the same index
+    range. None before the user's first entry: transfers settled before
+    the ledger existed have no entries to work back through.
+    """
+    entries = LedgerEntry.objects.filter(user=user)
+    last = entries.filter(created_at__lte=moment).order_by('-created_at', '-id').values('balance_after').first()
+    if last is None:
+        return None
+    if last['balance_after'] is not None:
+        return last['balance_after']
+    since = entries.filter(created_at__gt=moment).aggregate(total=Sum('amount'))['total']
+    return current_balance(user) - (since or 0)
+
+
+def unrecorded_sides(user_ids):
+    """
+    `(user_id, transaction_id, signed amount, created_at)` for each side,
+    among `user_ids`, of a SUCCESS transaction with no entry: newest
+    first per user.
+    """
+    sides = []
+    for side, sign in (('sender_id', -1), ('receiver_id', 1)):
+        entered = LedgerEntry.objects.filter(transaction_id=OuterRef('pk'), user_id=OuterRef(side))
+        sides.append(
+            Transaction.objects.filter(status='SUCCESS', **{f'{side}__in': user_ids})
+            .exclude(Exists(entered))
+            .annotate(side_user=F(side), signed=F('amount') * sign)
+            .values_list('side_user', 'id', 'signed', 'created_at')
+        )
+    return sides[0].union(sides[1], all=True).order_by('side_user', '-created_at', '-id')
+
+
+def backfill(user_ids, batch_size=1000):
+    """
+    Writes the missing entries of these users' settled transactions, in one
+    transaction with their wallet rows locked (in id order, like transfers)
+    so no entry lands in between. Hot wallets get no running balance, as
+    live. Returns the number of entries written.
+    """
+    with transaction.atomic():
+        balances = dict(
+            Wallet.objects.select_for_update().filter(user_id__in=user_ids).order_by('user_id')
+            .values_list('user_id', 'balance')
+        )
+        hot = set(get_user_model().objects.filter(pk__in=user_ids, shard_count__gt=0).values_list('pk', flat=True))
+        entered = (
+            LedgerEntry.objects.filter(user_id__in=user_ids).values('user_id')
+            .annotate(total=Sum('amount')).values_list('user_id', 'total')
+        )
+        for user_id, total in entered:
+            balances[user_id] -= total
+
+        # Read up front: the inserts change what the query matches
+        entries = []
+        for user_id, tx_id, amount, created_at in list(unrecorded_sides(user_ids)):
+            balance_after = None if user_id in hot else balances[user_id]
+            entries.append(LedgerEntry(
+                user_id=user_id, transaction_id=tx_id, amount=amount, balance_after=balance_after, created_at=created_at
+            ))
+            if balance_after is not None:
+                balances[user_id] -= amount
+        LedgerEntry.objects.bulk_create(entries, batch_size=batch_size)
+    return len(entries)
@@ -0,0 +1,48 @@
+from datetime import datetime, timezone
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max, Min
+from wallet.archive import archive_horizon, archive_month, month_rows
+from wallet.models import Transaction
+from wallet.partitions import add_months, month_start
+
+
+class Command(BaseCommand):
+    help = (
+        'Moves ledger months older than --keep-months into compressed ArchivedBlocks and drops them '
+        'from the live table (their partitions on Postgres). Transactions stay findable by reference_id.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--keep-months', type=int, default=12, help='Recent months to keep live, besides the current one.')
+        parser.add_argument('--block-size', type=int, default=2000, help='Transactions per compressed block.')
+        parser.add_argument('--dry-run', action='store_true', help='List the months that would be archived.')
+
+    def handle(self, *args, **options):
+        cutoff = add_months(month_start(datetime.now(timezone.utc)), -options['keep_months'])
+        oldest = Transaction.objects.filter(created_at__lt=cutoff).aggregate(oldest=Min('created_at'))['oldest']
+        if oldest is None:
+            self.stdout.write(self.style.SUCCESS('Nothing to archive.'))
+            return
+
+        horizon = archive_horizon()
+        month, total = month_start(oldest), 0
+        while month < cutoff:
+            last_id = month_rows(month).aggregate(last=Max('id'))['last']
+            if last_id is None:
+                month = add_months(month, 1)
+                continue
+            if last_id > horizon:
+                raise CommandError(
+                    f"{month:%Y-%m} is past transaction #{horizon}, the oldest point reached by "
+                    "update_daily_summaries and reconcile_balances. Run those first."
+                )
+            if options['dry_run']:
+                self.stdout.write(f"Would archive {month:%Y-%m} (up to #{last_id})")
+            else:
+                archived = archive_month(month, block_rows=options['block_size'])
+                total += archived
+                self.stdout.write(f"Archived {month:%Y-%m}: {archived} transaction(s)")
+            month = add_months(month, 1)
+
+        if not options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(f"Archived {total} transaction(s)."))
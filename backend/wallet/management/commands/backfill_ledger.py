@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from django.contrib.auth import get_user_model
+from wallet.ledger import backfill
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        'Writes LedgerEntry rows, with running balances, for SUCCESS transactions settled before the '
+        'ledger existed. One short transaction per batch of users; safe to re-run.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Users per transaction.')
+
+    def handle(self, *args, **options):
+        size = options['batch_size']
+        users = User.objects.order_by('pk').values_list('pk', flat=True)
+        last, total = 0, 0
+        while True:
+            batch = list(users.filter(pk__gt=last)[:size])
+            if not batch:
+                break
+            written = backfill(batch)
+            total += written
+            last = batch[-1]
+            if written:
+                self.stdout.write(f"users {batch[0]}-{last}: {written} entries")
+        self.stdout.write(self.style.SUCCESS(f"Backfilled {total} ledger entries."))
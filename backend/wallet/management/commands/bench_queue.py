@@ -0,0 +1,86 @@
+import json
+import random
+import time
+from decimal import Decimal
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.utils import timezone
+from core.benchmarking import bench_users
+from wallet.management.commands.bench_transfers import git_commit, money_supply
+from wallet.models import Transaction
+from wallet.transfer_queue import drain, oldest_pending
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmarks queued-mode settlement (wallet.transfer_queue): queues N PENDING transfers '
+        'between bench wallets, drains them at each batch size and reports transfers/s. '
+        'Batch size 1 is one commit per transfer, as in sync mode. Fails if money was created '
+        'or destroyed.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--transfers', type=int, default=5000, help='Transfers queued per batch size.')
+        parser.add_argument('--users', type=int, default=50, help='Size of the bench wallet pool.')
+        parser.add_argument('--batch-sizes', default='1,10,50,200,1000', help='Comma-separated batch sizes.')
+        parser.add_argument('--workers', type=int, default=2, help='Worker threads draining the queue.')
+        parser.add_argument(
+            '--json', metavar='PATH',
+            help='Append the results as one JSON line to PATH ("-" for stdout) to track runs over commits.'
+        )
+
+    def handle(self, *args, **options):
+        if oldest_pending() is not None:
+            raise CommandError('The queue already holds PENDING transfers; settle them first (process_transfers --once).')
+        users = bench_users(options['users'])
+        supply_before = money_supply()
+
+        rows = []
+        for batch_size in (int(size) for size in options['batch_sizes'].split(',')):
+            self.enqueue(users, options['transfers'])
+            # Worker threads open their own connections
+            connections.close_all()
+            started = time.perf_counter()
+            drain(options['workers'], batch_size)
+            seconds = time.perf_counter() - started
+            rows.append({
+                'batch_size': batch_size,
+                'seconds': round(seconds, 3),
+                'throughput': round(options['transfers'] / seconds, 1),
+                'commits': -(-options['transfers'] // batch_size),
+            })
+        supply_after = money_supply()
+
+        self.stdout.write(f"{'batch':>6} {'commits':>8} {'seconds':>8} {'transfers/s':>12}")
+        for row in rows:
+            self.stdout.write(
+                f"{row['batch_size']:>6} {row['commits']:>8} {row['seconds']:>8.2f} {row['throughput']:>12.0f}"
+            )
+
+        if options['json']:
+            line = json.dumps({
+                'commit': git_commit(),
+                'timestamp': timezone.now().isoformat(),
+                'vendor': connection.vendor,
+                'options': {key: options[key] for key in ('transfers', 'users', 'workers')},
+                'runs': rows,
+                'money_conserved': supply_before == supply_after,
+            })
+            if options['json'] == '-':
+                self.stdout.write(line)
+            else:
+                with open(options['json'], 'a') as f:
+                    f.write(line + '\n')
+
+        if supply_before != supply_after:
+            raise CommandError(f"Money supply changed: {supply_before} before, {supply_after} after")
+        self.stdout.write(self.style.SUCCESS("money supply: unchanged"))
+
+    def enqueue(self, users, count):
+        rng = random.Random(count)
+        pairs = (rng.sample(users, 2) for _ in range(count))
+        Transaction.objects.bulk_create(
+            [Transaction(sender=sender, receiver=receiver, amount=Decimal('1.00'), status='PENDING')
+             for sender, receiver in pairs],
+            batch_size=1000
+        )
@@ -0,0 +1,306 @@
+import json
+import multiprocessing
+import random
+import statistics
+import subprocess
+import time
+import uuid
+from decimal import Decimal
+from io import StringIO
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth import get_user_model
+from django.db import connection, connections, reset_queries
+from django.db.models import Sum
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+from core.benchmarking import bench_users, percentile
+from core import metrics
+from core.metrics import takes_row_locks
+from wallet.models import BalanceShard, Wallet
+from wallet.views import TransferFundsView, TransactionHistoryView
+
+User = get_user_model()
+
+# Client-side retries for a transfer the server gave up on (409 once its
+# own retries ran out, or a raced idempotency key) or that SQLite refused
+# with "database is locked". Deadlocks and serialization failures are
+# retried server-side and counted in core.metrics, not seen here.
+MAX_RETRIES = 3
+
+
+def is_retryable(response):
+    if response.status_code == 409:
+        return True
+    return response.status_code == 500 and 'database is locked' in str(response.data.get('error', ''))
+
+
+def counter_snapshot(metric):
+    with metric.lock:
+        return dict(metric.values)
+
+
+def counter_delta(metric, before):
+    """What a (mode, reason) counter gained since `before`, as {mode: {reason: n}}."""
+    delta = {}
+    for (mode, reason), value in counter_snapshot(metric).items():
+        gained = value - before.get((mode, reason), 0)
+        if gained:
+            delta.setdefault(mode, {})[reason] = gained
+    return delta
+
+
+def merge_counts(counts):
+    merged = {}
+    for by_mode in counts:
+        for mode, by_reason in by_mode.items():
+            for reason, n in by_reason.items():
+                merged.setdefault(mode, {})
+                merged[mode][reason] = merged[mode].get(reason, 0) + n
+    return merged
+
+
+def format_counts(by_mode):
+    return ', '.join(
+        f"{mode} {reason} {n}" for mode, by_reason in sorted(by_mode.items()) for reason, n in sorted(by_reason.items())
+    ) or 'none'
+
+
+def lock_ms(queries):
+    # Time spent in statements that take row locks: an upper bound on how
+    # long this transfer waited for other transfers' locks.
+    return sum(float(q['time']) * 1000 for q in queries if takes_row_locks(q['sql']))
+
+
+def run_transfers(jobs):
+    view = TransferFundsView.as_view()
+    factory = APIRequestFactory()
+    latencies, query_counts, lock_times = [], [], []
+    errors = retries = 0
+    # Forked from the parent, so these start at its values: report the gain
+    retries_before = counter_snapshot(metrics.TRANSFER_RETRIES)
+    aborts_before = counter_snapshot(metrics.TRANSFER_ABORTS)
+    try:
+        for sender, receiver in jobs:
+            payload = {
+                'receiver_email': receiver.email,
+                'amount': '1.00',
+                'idempotency_key': str(uuid.uuid4()),
+            }
+            started = time.perf_counter()
+            for attempt in range(MAX_RETRIES + 1):
+                request = factory.post('/api/wallet/transfer/', payload, format='json')
+                force_authenticate(request, user=sender)
+
+                reset_queries()
+                with CaptureQueriesContext(connection) as queries:
+                    response = view(request)
+                query_counts.append(len(queries))
+                lock_times.append(lock_ms(queries.captured_queries))
+
+                if attempt < MAX_RETRIES and is_retryable(response):
+                    retries += 1
+                    continue
+                break
+            latencies.append((time.perf_counter() - started) * 1000)
+            # 202: queued (WALLET_TRANSFER_MODE=queued)
+            if response.status_code not in (200, 202):
+                errors += 1
+    finally:
+        connection.close()
+    return {
+        'kind': 'transfer', 'latencies': latencies, 'queries': query_counts, 'lock_ms': lock_times,
+        'errors': errors, 'retries': retries,
+        'server_retries': counter_delta(metrics.TRANSFER_RETRIES, retries_before),
+        'server_aborts': counter_delta(metrics.TRANSFER_ABORTS, aborts_before),
+    }
+
+
+def run_history(job):
+    users, requests = job
+    view = TransactionHistoryView.as_view()
+    factory = APIRequestFactory()
+    latencies, errors = [], 0
+    rng = random.Random()
+    try:
+        for _ in range(requests):
+            request = factory.get('/api/wallet/history/')
+            force_authenticate(request, user=rng.choice(users))
+            started = time.perf_counter()
+            response = view(request)
+            response.render()
+            latencies.append((time.perf_counter() - started) * 1000)
+            if response.status_code != 200:
+                errors += 1
+    finally:
+        connection.close()
+    return {'kind': 'history', 'latencies': latencies, 'errors': errors}
+
+
+def run_task(task):
+    kind, job = task
+    return run_transfers(job) if kind == 'transfer' else run_history(job)
+
+
+def money_supply():
+    """Every rupee in the system: wallet rows plus balance shards."""
+    wallets = Wallet.objects.aggregate(total=Sum('balance'))['total'] or Decimal('0')
+    shards = BalanceShard.objects.aggregate(total=Sum('balance'))['total'] or Decimal('0')
+    return wallets + shards
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmarks POST /api/wallet/transfer/ (optionally alongside GET /api/wallet/history/ '
+        'readers): throughput, latency percentiles, queries and lock time per transfer, '
+        'server-side retries/aborts by mode and reason. Fails if the total money supply changed.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--transfers', type=int, default=500, help='Number of transfers to run.')
+        parser.add_argument('--users', type=int, default=20, help='Size of the bench wallet pool.')
+        parser.add_argument(
+            '--concurrency', type=int, default=1,
+            help='Client processes (forked, so the GIL is not the bottleneck), one DB connection each.'
+        )
+        parser.add_argument(
+            '--fan-in', action='store_true',
+            help='Every transfer pays the same wallet (bench-0), each thread from its own sender.'
+        )
+        parser.add_argument(
+            '--shards', type=int,
+            help='Reconfigure bench-0 with this many balance shards before running (0 = unsharded).'
+        )
+        parser.add_argument(
+            '--mode', choices=('sync', 'optimistic', 'queued'),
+            help='Override settings.WALLET_TRANSFER_MODE for the run.'
+        )
+        parser.add_argument('--readers', type=int, default=0, help='History reader processes running alongside.')
+        parser.add_argument('--history-requests', type=int, default=500, help='History requests across all readers.')
+        parser.add_argument(
+            '--json', metavar='PATH',
+            help='Append the results as one JSON line to PATH ("-" for stdout) to track runs over commits.'
+        )
+
+    def handle(self, *args, **options):
+        concurrency, readers = options['concurrency'], options['readers']
+        # Before the fork, so every client process sees them. The bench
+        # wallets send far more than any one user would: no per-user limit.
+        settings.THROTTLE_TRANSFER_RATE = 0
+        if options['mode']:
+            settings.WALLET_TRANSFER_MODE = options['mode']
+        users = bench_users(max(options['users'], concurrency + 1))
+        if options['shards'] is not None:
+            call_command('shard_wallet', users[0].email, shards=options['shards'], stdout=StringIO())
+
+        jobs = [[] for _ in range(concurrency)]
+        for i in range(options['transfers']):
+            worker = i % concurrency
+            if options['fan_in']:
+                # Disjoint senders per worker, so the only shared row is the receiver's
+                sender, receiver = users[1 + worker], users[0]
+            else:
+                sender, receiver = users[i % len(users)], users[(i + 1) % len(users)]
+            jobs[worker].append((sender, receiver))
+
+        tasks = [('transfer', job) for job in jobs]
+        for i in range(readers):
+            share = options['history_requests'] // readers + (i < options['history_requests'] % readers)
+            tasks.append(('history', (users, share)))
+
+        supply_before = money_supply()
+        # Children must open their own connections rather than share ours
+        connections.close_all()
+        with multiprocessing.get_context('fork').Pool(len(tasks)) as pool:
+            started = time.perf_counter()
+            results = pool.map(run_task, tasks)
+            wall_seconds = time.perf_counter() - started
+        supply_after = money_supply()
+
+        transfers = [r for r in results if r['kind'] == 'transfer']
+        history = [r for r in results if r['kind'] == 'history']
+        report = {
+            'commit': git_commit(),
+            'timestamp': timezone.now().isoformat(),
+            'vendor': connection.vendor,
+            'options': {
+                key: options[key] for key in
+                ('transfers', 'users', 'concurrency', 'fan_in', 'shards', 'readers', 'history_requests')
+            },
+            'mode': settings.WALLET_TRANSFER_MODE,
+            'wall_seconds': round(wall_seconds, 3),
+            'transfer': self.summarize(transfers, wall_seconds),
+            'history': self.summarize(history, wall_seconds) if history else None,
+            'money_conserved': supply_before == supply_after,
+        }
+        self.print_report(report)
+
+        if options['json']:
+            line = json.dumps(report)
+            if options['json'] == '-':
+                self.stdout.write(line)
+            else:
+                with open(options['json'], 'a') as f:
+                    f.write(line + '\n')
+
+        if supply_before != supply_after:
+            raise CommandError(f"Money supply changed: {supply_before} before, {supply_after} after")
+
+    def summarize(self, results, wall_seconds):
+        latencies = sorted(ms for r in results for ms in r['latencies'])
+        summary = {
+            'requests': len(latencies),
+            'errors': sum(r['errors'] for r in results),
+            'throughput': round(len(latencies) / wall_seconds, 1),
+            'p50_ms': round(percentile(latencies, 50), 2),
+            'p95_ms': round(percentile(latencies, 95), 2),
+            'p99_ms': round(percentile(latencies, 99), 2),
+        }
+        if results and results[0]['kind'] == 'transfer':
+            query_counts = [n for r in results for n in r['queries']]
+            lock_times = [ms for r in results for ms in r['lock_ms']]
+            summary.update(
+                queries_per_attempt=round(statistics.mean(query_counts), 2) if query_counts else 0,
+                lock_ms_mean=round(statistics.mean(lock_times), 2) if lock_times else 0,
+                lock_ms_total=round(sum(lock_times), 1),
+                retries=sum(r['retries'] for r in results),
+                server_retries=merge_counts(r['server_retries'] for r in results),
+                server_aborts=merge_counts(r['server_aborts'] for r in results),
+            )
+        return summary
+
+    def print_report(self, report):
+        t = report['transfer']
+        options = report['options']
+        self.stdout.write(f"transfers:          {t['requests']} ({t['errors']} errors)")
+        self.stdout.write(f"concurrency:        {options['concurrency']}{' (fan-in)' if options['fan_in'] else ''}")
+        self.stdout.write(f"mode:               {report['mode']}")
+        self.stdout.write(f"queries/transfer:   {t['queries_per_attempt']:.2f}")
+        self.stdout.write(
+            f"latency p50/95/99:  {t['p50_ms']:.2f} / {t['p95_ms']:.2f} / {t['p99_ms']:.2f} ms"
+        )
+        self.stdout.write(f"lock time:          {t['lock_ms_mean']:.2f} ms/attempt")
+        self.stdout.write(f"server retries:     {format_counts(t['server_retries'])}")
+        self.stdout.write(f"server aborts:      {format_counts(t['server_aborts'])}")
+        self.stdout.write(f"client retries:     {t['retries']}")
+        self.stdout.write(f"throughput:         {t['throughput']:.0f} transfers/s")
+        h = report['history']
+        if h:
+            self.stdout.write(
+                f"history:            {h['requests']} reqs ({h['errors']} errors) by {options['readers']} readers, "
+                f"{h['throughput']:.0f} req/s, p50/95/99 {h['p50_ms']:.2f} / {h['p95_ms']:.2f} / {h['p99_ms']:.2f} ms"
+            )
+        if report['money_conserved']:
+            self.stdout.write(self.style.SUCCESS("money supply:       unchanged"))
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from wallet.services import sweep_shards
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Sweeps hot-wallet balance shards into their Wallet rows. Run periodically (e.g. cron).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--email', help='Only consolidate this wallet.')
+
+    def handle(self, *args, **options):
+        hot_wallets = User.objects.filter(shard_count__gt=0)
+        if options['email']:
+            hot_wallets = hot_wallets.filter(email=options['email'])
+
+        total = 0
+        for user_id, email in hot_wallets.values_list('id', 'email').order_by('id'):
+            # One short transaction per wallet so incoming credits only ever
+            # wait on a single sweep.
+            with transaction.atomic():
+                swept = sweep_shards(user_id)
+            total += swept
+            self.stdout.write(f"{email}: swept {swept}")
+
+        self.stdout.write(self.style.SUCCESS(f"Consolidated {total} across hot wallets."))
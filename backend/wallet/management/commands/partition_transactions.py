@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand, CommandError
+from wallet.partitions import ensure_partitions, is_partitioned
+
+
+class Command(BaseCommand):
+    help = (
+        'Creates the monthly wallet_transaction partitions for the coming months and moves rows '
+        'that fell into the DEFAULT partition into their own. Postgres only; run monthly (e.g. cron).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ahead', type=int, default=3, help='Months to create beyond the current one.')
+
+    def handle(self, *args, **options):
+        if not is_partitioned():
+            raise CommandError('wallet_transaction is not partitioned (Postgres only, see migration 0008).')
+        created = ensure_partitions(ahead=options['ahead'])
+        for name in created:
+            self.stdout.write(f"Created {name}")
+        self.stdout.write(self.style.SUCCESS(f"{len(created)} partition(s) created."))
@@ -0,0 +1,40 @@
+import signal
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from wallet.transfer_queue import drain, start_workers
+
+
+class Command(BaseCommand):
+    help = (
+        'Settles transfers queued by POST /api/wallet/transfer/ in queued mode '
+        '(WALLET_TRANSFER_MODE=queued), many per commit. Runs until stopped, or with --once '
+        'until the queue is empty.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=settings.WALLET_QUEUE_WORKERS, help='Worker threads.')
+        parser.add_argument(
+            '--batch-size', type=int, default=settings.WALLET_QUEUE_BATCH_SIZE,
+            help='Transfers settled per transaction.'
+        )
+        parser.add_argument(
+            '--poll', type=float, default=settings.WALLET_QUEUE_POLL,
+            help='Seconds an idle worker waits before looking again.'
+        )
+        parser.add_argument('--once', action='store_true', help='Settle what is queued now, then exit.')
+
+    def handle(self, *args, **options):
+        if options['once']:
+            drain(options['workers'], options['batch_size'])
+            return
+
+        threads, stop = start_workers(options['workers'], options['batch_size'], options['poll'])
+        signal.signal(signal.SIGTERM, lambda *_: stop.set())
+        self.stdout.write(f"Settling queued transfers with {len(threads)} worker(s)...")
+        try:
+            while not stop.wait(1):
+                pass
+        except KeyboardInterrupt:
+            stop.set()
+        for thread in threads:
+            thread.join()
@@ -0,0 +1,30 @@
+import time
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from wallet.models import IdempotencyLog
+
+
+class Command(BaseCommand):
+    help = 'Deletes expired idempotency keys in bounded batches. Run periodically (e.g. cron).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows deleted per statement.')
+        parser.add_argument('--sleep', type=float, default=0, help='Seconds to pause between batches.')
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now()
+        expired = IdempotencyLog.objects.filter(expires_at__lt=cutoff)
+
+        total = 0
+        while True:
+            # Delete by primary key, a batch at a time, so each statement is
+            # short and never holds locks on the whole expired range.
+            pks = list(expired.values_list('pk', flat=True)[:options['batch_size']])
+            if not pks:
+                break
+            deleted, _ = IdempotencyLog.objects.filter(pk__in=pks).delete()
+            total += deleted
+            if options['sleep']:
+                time.sleep(options['sleep'])
+
+        self.stdout.write(self.style.SUCCESS(f"Pruned {total} expired idempotency key(s)."))
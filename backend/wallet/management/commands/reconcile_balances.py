@@ -0,0 +1,75 @@
+import multiprocessing
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth import get_user_model
+from django.db import connection, connections
+from django.db.models import Max, Min
+from wallet.reconciliation import reconcile_range, watermark
+
+User = get_user_model()
+
+
+def run_range(job):
+    first_id, last_id, upto, repair = job
+    try:
+        return reconcile_range(first_id, last_id, upto, repair=repair)
+    finally:
+        connection.close()
+
+
+class Command(BaseCommand):
+    help = (
+        'Checks every wallet balance against its BalanceCheckpoint plus the ledger written since, '
+        'reports drift and moves the checkpoints forward. Incremental: each run only reads new '
+        'transactions. Run periodically (e.g. cron).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=multiprocessing.cpu_count(), help='Processes, one user id range each.')
+        parser.add_argument('--range-size', type=int, default=10000, help='User ids per range.')
+        parser.add_argument(
+            '--lag', type=int, default=int(settings.WALLET_LEDGER_LAG.total_seconds()),
+            help='Seconds a transaction must be old to count as settled.'
+        )
+        parser.add_argument('--repair', action='store_true', help='Adjust drifted balances to match the ledger.')
+        parser.add_argument('--show', type=int, default=20, help='Drifted wallets to list (largest first).')
+
+    def handle(self, *args, **options):
+        bounds = User.objects.aggregate(first=Min('pk'), last=Max('pk'))
+        if bounds['first'] is None:
+            raise CommandError('No users to reconcile.')
+        upto = watermark(timedelta(seconds=options['lag']))
+
+        size = options['range_size']
+        jobs = [
+            (start, min(start + size - 1, bounds['last']), upto, options['repair'])
+            for start in range(bounds['first'], bounds['last'] + 1, size)
+        ]
+
+        started = time.perf_counter()
+        checked, drifts = 0, []
+        if options['workers'] > 1 and len(jobs) > 1:
+            # Children must open their own connections rather than share ours
+            connections.close_all()
+            with multiprocessing.get_context('fork').Pool(options['workers']) as pool:
+                results = list(pool.imap_unordered(run_range, jobs))
+        else:
+            results = [reconcile_range(*job[:3], repair=job[3]) for job in jobs]
+        for users, found in results:
+            checked += users
+            drifts.extend(found)
+        elapsed = time.perf_counter() - started
+
+        drifts.sort(key=lambda d: abs(d.amount), reverse=True)
+        for drift in drifts[:options['show']]:
+            self.stdout.write(
+                f"user {drift.user_id}: balance {drift.actual}, ledger says {drift.expected} (drift {drift.amount:+})"
+            )
+        net = sum((d.amount for d in drifts), 0)
+        summary = (
+            f"Reconciled {checked} wallets up to transaction {upto} in {elapsed:.1f}s: "
+            f"{len(drifts)} drifted (net {net:+}){', repaired' if drifts and options['repair'] else ''}."
+        )
+        self.stdout.write(self.style.WARNING(summary) if drifts else self.style.SUCCESS(summary))
@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from users.authentication import forget_user
+from wallet.models import BalanceShard
+from wallet.services import sweep_shards
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Turns a wallet into a hot wallet with N balance shards (0 turns sharding off).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('email')
+        parser.add_argument('--shards', type=int, required=True, help='Number of shards (0 to unshard).')
+
+    def handle(self, *args, **options):
+        shards = options['shards']
+        if shards < 0:
+            raise CommandError('--shards must be >= 0')
+
+        with transaction.atomic():
+            try:
+                user = User.objects.get(email=options['email'])
+            except User.DoesNotExist:
+                raise CommandError(f"No user with email {options['email']}")
+
+            # Fold the old shards back in before resizing so no credit is
+            # stranded on a shard that's about to disappear. The sweep locks
+            # the shards before the user row, same as transfers do.
+            swept = sweep_shards(user.pk)
+            BalanceShard.objects.filter(user=user, index__gte=shards).delete()
+            BalanceShard.objects.bulk_create(
+                [BalanceShard(user=user, index=i) for i in range(shards)],
+                ignore_conflicts=True
+            )
+            User.objects.filter(pk=user.pk).update(shard_count=shards)
+        # Transfers read the sender's shard_count from the auth cache
+        forget_user(user.pk)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{user.email}: {shards} shard(s), swept {swept} into the wallet balance."
+        ))
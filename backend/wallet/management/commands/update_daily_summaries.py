@@ -0,0 +1,35 @@
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from wallet.reconciliation import watermark
+from wallet.summaries import apply_changes
+
+
+class Command(BaseCommand):
+    help = (
+        'Folds new ledger rows into the per-user DailySummary totals behind /api/wallet/summary/. '
+        'Resumes from its checkpoint; run periodically (e.g. cron) or keep it running with --follow.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000, help='Ledger rows folded per transaction.')
+        parser.add_argument(
+            '--lag', type=int, default=int(settings.WALLET_LEDGER_LAG.total_seconds()),
+            help='Seconds a transaction must be old to count as settled.'
+        )
+        parser.add_argument('--follow', action='store_true', help='Keep polling for new transactions.')
+        parser.add_argument('--interval', type=float, default=10, help='Seconds between polls with --follow.')
+
+    def handle(self, *args, **options):
+        lag = timedelta(seconds=options['lag'])
+        while True:
+            upto = watermark(lag)
+            total = 0
+            while consumed := apply_changes(upto, batch_size=options['batch_size']):
+                total += consumed
+            if total or not options['follow']:
+                self.stdout.write(self.style.SUCCESS(f"Folded {total} transaction(s) into daily summaries (up to #{upto})."))
+            if not options['follow']:
+                break
+            time.sleep(options['interval'])
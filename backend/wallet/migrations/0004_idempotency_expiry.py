@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 12:21
+
+import wallet.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wallet', '0003_balanceshard'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='idempotencylog',
+            name='expires_at',
+            field=models.DateTimeField(db_index=True, default=wallet.models.idempotency_expiry),
+        ),
+        migrations.AlterField(
+            model_name='idempotencylog',
+            name='response_body',
+            field=models.JSONField(null=True),
+        ),
+        migrations.AlterField(
+            model_name='idempotencylog',
+            name='response_code',
+            field=models.IntegerField(null=True),
+        ),
+    ]
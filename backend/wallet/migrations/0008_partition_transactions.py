@@ -0,0 +1,83 @@
+from datetime import datetime, timezone
+
+from django.db import migrations
+
+from wallet.partitions import DEFAULT, TABLE, add_months, create_partition, is_partitioned, month_start
+
+OLD = f'{TABLE}_unpartitioned'
+
+
+def partition_transactions(apps, schema_editor):
+    """
+    Rebuilds wallet_transaction as a table range-partitioned by month on
+    created_at (see wallet.partitions). Postgres only; the table is
+    locked while its rows are copied across.
+    """
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql' or is_partitioned(connection):
+        return
+
+    with connection.cursor() as cursor:
+        cursor.execute(f'LOCK TABLE {TABLE} IN ACCESS EXCLUSIVE MODE')
+        cursor.execute(f'ALTER TABLE {TABLE} RENAME TO {OLD}')
+
+        # Keep the definitions of the foreign keys and plain indexes, then
+        # free their names for the new table
+        cursor.execute(
+            "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+            "WHERE conrelid = %s::regclass AND contype = 'f'", [OLD]
+        )
+        foreign_keys = cursor.fetchall()
+        cursor.execute(
+            "SELECT i.relname, pg_get_indexdef(i.oid) FROM pg_index x JOIN pg_class i ON i.oid = x.indexrelid "
+            "WHERE x.indrelid = %s::regclass AND NOT x.indisprimary AND NOT x.indisunique", [OLD]
+        )
+        indexes = cursor.fetchall()
+        for name, _ in foreign_keys:
+            cursor.execute(f'ALTER TABLE {OLD} DROP CONSTRAINT {name}')
+        for name, _ in indexes:
+            cursor.execute(f'DROP INDEX {name}')
+        cursor.execute(f'ALTER TABLE {OLD} DROP CONSTRAINT {TABLE}_pkey')
+        cursor.execute(f'ALTER TABLE {OLD} DROP CONSTRAINT {TABLE}_reference_id_key')
+
+        cursor.execute(f'CREATE TABLE {TABLE} (LIKE {OLD} INCLUDING DEFAULTS) PARTITION BY RANGE (created_at)')
+        cursor.execute(f'CREATE TABLE {DEFAULT} PARTITION OF {TABLE} DEFAULT')
+        cursor.execute(f'SELECT min(created_at), max(id) FROM {OLD}')
+        oldest, last_id = cursor.fetchone()
+        now = datetime.now(timezone.utc)
+        month, last_month = month_start(oldest or now), add_months(month_start(now), 3)
+        while month <= last_month:
+            create_partition(cursor, month)
+            month = add_months(month, 1)
+
+        cursor.execute(f'INSERT INTO {TABLE} SELECT * FROM {OLD}')
+        cursor.execute(f'DROP TABLE {OLD}')
+
+        # Indexes and constraints go on after the copy, one build per partition
+        cursor.execute(f'ALTER TABLE {TABLE} ADD CONSTRAINT {TABLE}_pkey PRIMARY KEY (id, created_at)')
+        cursor.execute(
+            f'ALTER TABLE {TABLE} ADD CONSTRAINT {TABLE}_reference_id_key UNIQUE (reference_id, created_at)'
+        )
+        for name, definition in indexes:
+            cursor.execute(definition.replace(f' ON public.{OLD} ', f' ON {TABLE} ').replace(f' ON {OLD} ', f' ON {TABLE} '))
+        for name, definition in foreign_keys:
+            cursor.execute(f'ALTER TABLE {TABLE} ADD CONSTRAINT {name} {definition}')
+
+        # The identity sequence went with the old table
+        cursor.execute(f'CREATE SEQUENCE {TABLE}_id_seq OWNED BY {TABLE}.id')
+        cursor.execute(f"ALTER TABLE {TABLE} ALTER COLUMN id SET DEFAULT nextval('{TABLE}_id_seq')")
+        if last_id:
+            cursor.execute(f"SELECT setval('{TABLE}_id_seq', %s)", [last_id])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wallet', '0007_transaction_archive'),
+    ]
+
+    operations = [
+        # Going back leaves the partitioned table in place: it serves the
+        # earlier schema just as well
+        migrations.RunPython(partition_transactions, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:16
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+def make_append_only(apps, schema_editor):
+    """Postgres only: UPDATE and DELETE on wallet_ledgerentry raise."""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        "CREATE FUNCTION wallet_ledgerentry_append_only() RETURNS trigger LANGUAGE plpgsql AS $$ "
+        "BEGIN RAISE EXCEPTION 'wallet_ledgerentry is append-only'; END $$"
+    )
+    schema_editor.execute(
+        'CREATE TRIGGER wallet_ledgerentry_append_only BEFORE UPDATE OR DELETE ON wallet_ledgerentry '
+        'FOR EACH ROW EXECUTE FUNCTION wallet_ledgerentry_append_only()'
+    )
+
+
+def drop_append_only(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP TRIGGER IF EXISTS wallet_ledgerentry_append_only ON wallet_ledgerentry')
+    schema_editor.execute('DROP FUNCTION IF EXISTS wallet_ledgerentry_append_only()')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wallet', '0010_transaction_pending_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LedgerEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('balance_after', models.DecimalField(decimal_places=2, max_digits=14, null=True)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('transaction', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='ledger_entries', to='wallet.transaction')),
+                ('user', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.PROTECT, related_name='ledger_entries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'ledger entries',
+                'indexes': [models.Index(fields=['user', 'created_at', 'id'], include=('amount', 'balance_after'), name='wallet_ledger_user_time_idx')],
+            },
+        ),
+        migrations.RunPython(make_append_only, drop_append_only),
+    ]
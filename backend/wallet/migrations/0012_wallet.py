@@ -0,0 +1,52 @@
+# Generated by Django 5.2.18 on 2026-10-18 13:23
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models, transaction
+
+BACKFILL_CHUNK = 50000
+
+
+def backfill_wallets(apps, schema_editor):
+    """
+    Copies users_user.wallet_balance into a wallet row per user, one id
+    range per transaction, so no single statement locks or rewrites the
+    whole user table. Safe to re-run: users with a wallet are skipped.
+    """
+    connection = schema_editor.connection
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT MIN(id), MAX(id) FROM users_user')
+        first, last = cursor.fetchone()
+    if first is None:
+        return
+    for start in range(first - 1, last, BACKFILL_CHUNK):
+        with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+            cursor.execute(
+                'INSERT INTO wallet_wallet (user_id, balance, version) '
+                'SELECT id, wallet_balance, 0 FROM users_user WHERE id > %s AND id <= %s '
+                'ON CONFLICT DO NOTHING',
+                [start, start + BACKFILL_CHUNK]
+            )
+
+
+class Migration(migrations.Migration):
+    # Each backfill chunk commits on its own
+    atomic = False
+
+    dependencies = [
+        ('users', '0003_search_trigram_indexes'),
+        ('wallet', '0011_ledgerentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Wallet',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='wallet', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('balance', models.DecimalField(decimal_places=2, default=Decimal('1000.00'), help_text='Current wallet balance in INR', max_digits=12)),
+                ('version', models.PositiveBigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(backfill_wallets, migrations.RunPython.noop),
+    ]
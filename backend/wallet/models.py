@@ -1,7 +1,23 @@
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
 from core.models import TimeStampedModel
 import uuid
+from decimal import Decimal
+
+class TransactionQuerySet(models.QuerySet):
+    def history(self):
+        """
+        Just the columns the history/statement views render, with the
+        counterparties' emails joined in rather than fetched per row.
+        """
+        return self.only(
+            'id', 'reference_id', 'amount', 'status', 'created_at'
+        ).annotate(
+            sender_email=models.F('sender__email'),
+            receiver_email=models.F('receiver__email'),
+        )
+
 
 class Transaction(TimeStampedModel):
     STATUS_CHOICES = (
@@ -25,18 +41,188 @@ class Transaction(TimeStampedModel):
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='PENDING')
     reference_id = models.UUIDField(default=uuid.uuid4, editable=False, unique=True)
 
+    objects = TransactionQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Keyset history: each side of the sender/receiver UNION walks its own index
+            models.Index(fields=['sender', '-created_at', '-id'], name='wallet_tx_sender_created_idx'),
+            models.Index(fields=['receiver', '-created_at', '-id'], name='wallet_tx_receiver_created_idx'),
+            # Admin changelist ordering and date hierarchy
+            models.Index(fields=['-created_at', '-id'], name='wallet_tx_created_idx'),
+            # The transfer queue (wallet.transfer_queue): only PENDING rows
+            models.Index(fields=['id'], condition=models.Q(status='PENDING'), name='wallet_tx_pending_idx'),
+        ]
+
     def __str__(self):
         return f"{self.sender} -> {self.receiver} : {self.amount}"
 
+class LedgerEntry(models.Model):
+    """
+    One side of a settled transfer: every SUCCESS Transaction has a debit
+    entry for the sender and a credit entry for the receiver. Insert-only
+    (a trigger rejects UPDATE/DELETE on Postgres). `balance_after` is the
+    user's balance once the entry applied, left empty for hot wallets
+    whose shards move outside the transfer. See wallet.ledger.
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.PROTECT,
+        related_name='ledger_entries',
+        db_index=False,  # Leads wallet_ledger_user_time_idx
+    )
+    # No FK constraint: wallet_transaction is partitioned (and archived
+    # months are dropped), the entries stay
+    transaction = models.ForeignKey(
+        Transaction,
+        on_delete=models.DO_NOTHING,
+        related_name='ledger_entries',
+        db_constraint=False,
+    )
+    amount = models.DecimalField(max_digits=12, decimal_places=2)  # Negative for debits
+    balance_after = models.DecimalField(max_digits=14, decimal_places=2, null=True)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        verbose_name_plural = 'ledger entries'
+        indexes = [
+            # Balance-at-time and per-user statements: one range scan, no heap visits on Postgres
+            models.Index(
+                fields=['user', 'created_at', 'id'], include=['amount', 'balance_after'],
+                name='wallet_ledger_user_time_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} {self.amount:+} -> {self.balance_after}"
+
+class Wallet(models.Model):
+    """
+    A user's balance, on a narrow row of its own: transfers update (and
+    lock) this instead of the wide users_user row with the password hash,
+    Aadhaar ciphertext and profile. Created with the user (wallet.signals).
+    Every write bumps `version`.
+    """
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='wallet'
+    )
+    # Using DecimalField is critical for financial precision (no floating point errors)
+    balance = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        default=Decimal('1000.00'),  # Giving free money for testing
+        help_text="Current wallet balance in INR"
+    )
+    version = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.user_id} : {self.balance}"
+
+class BalanceShard(models.Model):
+    """
+    One of `User.shard_count` credit buckets for a hot wallet.
+
+    Incoming transfers add to a shard instead of the user's Wallet, so
+    they only contend with each other 1/N of the time and never lock the
+    user row. Debits and `consolidate_shards` sweep shards back into the
+    wallet balance.
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.PROTECT,
+        related_name='balance_shards'
+    )
+    index = models.PositiveSmallIntegerField()
+    balance = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        unique_together = ('user', 'index')
+
+    def __str__(self):
+        return f"{self.user} #{self.index} : {self.balance}"
+
+class BalanceCheckpoint(models.Model):
+    """
+    A user's balance as implied by the ledger up to `last_transaction_id`.
+    `reconcile_balances` checks the live balance against this plus the
+    SUCCESS transactions since, then moves the checkpoint forward, so each
+    run only reads the ledger written since the previous one.
+    """
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='balance_checkpoint'
+    )
+    balance = models.DecimalField(max_digits=12, decimal_places=2)
+    last_transaction_id = models.BigIntegerField()
+    taken_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.user_id} @ tx {self.last_transaction_id} : {self.balance}"
+
+class DailySummary(models.Model):
+    """
+    Per user, per (local) day totals of SUCCESS transfers, kept up to date
+    from the ledger by `update_daily_summaries` so dashboards can total any
+    date range in O(days). See wallet.summaries.
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='daily_summaries'
+    )
+    day = models.DateField()
+    sent_total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    sent_count = models.PositiveIntegerField(default=0)
+    received_total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    received_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('user', 'day')
+
+    def __str__(self):
+        return f"{self.user_id} {self.day}: -{self.sent_total} +{self.received_total}"
+
+class ArchivedBlock(models.Model):
+    """
+    Up to a few thousand Transaction rows of one archived month, stored as
+    zlib-compressed CSV. Written by `archive_transactions`, which then drops
+    the month from the live table. See wallet.archive.
+    """
+    month = models.DateField(db_index=True)  # First day of the (UTC) month
+    first_id = models.BigIntegerField()
+    last_id = models.BigIntegerField()
+    row_count = models.PositiveIntegerField()
+    data = models.BinaryField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.month:%Y-%m} #{self.first_id}-{self.last_id} ({self.row_count} rows)"
+
+class ArchivedReference(models.Model):
+    """Which block an archived transaction went to, so reference_id lookups keep working."""
+    reference_id = models.UUIDField(primary_key=True)
+    block = models.ForeignKey(ArchivedBlock, on_delete=models.CASCADE, related_name='references')
+
+def idempotency_expiry():
+    return timezone.now() + settings.WALLET_IDEMPOTENCY_TTL
+
+
 class IdempotencyLog(TimeStampedModel):
     """
     Stores processed idempotency keys to prevent double-spending.
+    A row with no response_code is an in-progress claim (see
+    wallet.idempotency); rows are pruned once they expire.
     """
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     key = models.UUIDField(db_index=True) # The unique key from frontend
-    response_body = models.JSONField() # Store the exact response we sent
-    response_code = models.IntegerField()
+    response_body = models.JSONField(null=True) # Store the exact response we sent
+    response_code = models.IntegerField(null=True) # NULL while the request is in flight
+    expires_at = models.DateTimeField(default=idempotency_expiry, db_index=True)
 
     class Meta:
         unique_together = ('user', 'key')
-
@@ -0,0 +1,112 @@
+"""
+Monthly range partitions of wallet_transaction on created_at (Postgres only).
+
+Migration 0008 turns the table into a partitioned one. Partitions are
+named wallet_transaction_pYYYY_MM and cover calendar months in UTC. A
+DEFAULT partition catches rows for months that have no partition yet, and
+`partition_transactions` (run it monthly) creates the months ahead and
+moves any such stragglers into their own partition.
+
+Because the partition key must be part of every unique constraint, the
+primary key is (id, created_at) and reference_id is unique per
+created_at. Ids still come from one sequence and reference_ids are
+random UUIDs, so in practice both stay unique.
+
+On other databases the table is left as it is and every function here is
+a no-op.
+"""
+from datetime import datetime, timezone as dt_timezone
+from django.db import connection, transaction
+
+TABLE = 'wallet_transaction'
+DEFAULT = f'{TABLE}_default'
+
+
+def is_partitioned(using=None):
+    using = using or connection
+    if using.vendor != 'postgresql':
+        return False
+    with using.cursor() as cursor:
+        cursor.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", [TABLE])
+        row = cursor.fetchone()
+    return row is not None and row[0] == 'p'
+
+
+def month_start(moment):
+    """First instant (UTC) of the month `moment` falls in."""
+    moment = moment.astimezone(dt_timezone.utc)
+    return datetime(moment.year, moment.month, 1, tzinfo=dt_timezone.utc)
+
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return month.replace(year=index // 12, month=index % 12 + 1)
+
+
+def partition_name(month):
+    return f'{TABLE}_p{month:%Y_%m}'
+
+
+def partitions(using=None):
+    """Names of the monthly partitions (the DEFAULT one excluded)."""
+    using = using or connection
+    with using.cursor() as cursor:
+        cursor.execute(
+            "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = to_regclass(%s) AND c.relname <> %s",
+            [TABLE, DEFAULT]
+        )
+        return {name for name, in cursor.fetchall()}
+
+
+def create_partition(cursor, month):
+    """
+    Creates and attaches the partition for `month`. Rows that already
+    landed in DEFAULT for that month are moved into it first: a partition
+    can't be attached while DEFAULT holds rows in its range.
+    """
+    name = partition_name(month)
+    lower, upper = month, add_months(month, 1)
+    cursor.execute(f'CREATE TABLE {name} (LIKE {TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)')
+    cursor.execute(
+        f'WITH moved AS (DELETE FROM {DEFAULT} WHERE created_at >= %s AND created_at < %s RETURNING *) '
+        f'INSERT INTO {name} SELECT * FROM moved',
+        [lower, upper]
+    )
+    cursor.execute(f'ALTER TABLE {TABLE} ATTACH PARTITION {name} FOR VALUES FROM (%s) TO (%s)', [lower, upper])
+    return name
+
+
+def ensure_partitions(ahead=3, now=None, using=None):
+    """
+    Creates the partitions for this month and the next `ahead`, plus any
+    month that has rows sitting in DEFAULT. Returns the names created.
+    """
+    using = using or connection
+    if not is_partitioned(using):
+        return []
+    current = month_start(now or datetime.now(dt_timezone.utc))
+    wanted = {add_months(current, i) for i in range(ahead + 1)}
+    with using.cursor() as cursor:
+        cursor.execute(f"SELECT DISTINCT date_trunc('month', created_at, 'UTC') FROM {DEFAULT}")
+        wanted.update(month_start(month) for month, in cursor.fetchall())
+
+    existing = partitions(using)
+    created = []
+    for month in sorted(wanted):
+        if partition_name(month) in existing:
+            continue
+        with transaction.atomic(using=using.alias), using.cursor() as cursor:
+            created.append(create_partition(cursor, month))
+    return created
+
+
+def drop_partition(month, using=None):
+    """Drops the month's partition, rows and all. False if it has none."""
+    using = using or connection
+    name = partition_name(month)
+    if not is_partitioned(using) or name not in partitions(using):
+        return False
+    with using.cursor() as cursor:
+        cursor.execute(f'DROP TABLE {name}')
+    return True
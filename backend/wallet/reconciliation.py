@@ -0,0 +1,153 @@
+"""
+Incremental reconciliation of wallet balances against the Transaction ledger.
+
+Balances can't be rebuilt from the ledger alone (sign-up credit, seeded
+balances and admin edits never went through it), so each user gets a
+BalanceCheckpoint: the balance the ledger implies as of a transaction id.
+The first run takes the live balance as that baseline. Every later run
+checks
+
+    live balance == checkpoint.balance + SUCCESS ledger rows after it
+
+and reports any difference as drift. It then moves the checkpoint up to
+the new watermark, so the next run only reads the rows written since.
+
+The watermark is the newest transaction older than `lag`. Ids come from
+a sequence but commit out of order, so a row that is still in flight may
+have a lower id than one that already committed. Rows past the lag are
+assumed settled. Each user range is read in one REPEATABLE READ snapshot
+(SQLite transactions already are), so balances and ledger rows come from
+the same committed state.
+"""
+from dataclasses import dataclass
+from decimal import Decimal
+from django.db import connection, transaction
+from django.db.models import F, Q, Sum
+from django.utils import timezone
+
+from .models import BalanceCheckpoint, BalanceShard, Transaction, Wallet
+from .transfer_queue import oldest_pending
+
+
+ZERO = Decimal('0.00')
+
+
+@dataclass
+class Drift:
+    user_id: int
+    actual: Decimal
+    expected: Decimal
+
+    @property
+    def amount(self):
+        return self.actual - self.expected
+
+
+def watermark(lag):
+    """
+    Id of the newest transaction older than `lag`: every row at or below
+    it is assumed committed. Walks the primary key backwards from the
+    newest row, so it only reads the last `lag`'s worth of rows.
+
+    It also stays below the oldest queued (PENDING) transfer, which may
+    yet become SUCCESS: the jobs that follow the ledger up to here never
+    look at a row twice.
+    """
+    cutoff = timezone.now() - lag
+    newest_settled = Transaction.objects.filter(created_at__lt=cutoff).order_by('-id').values_list('id', flat=True)
+    upto = newest_settled.first() or 0
+    pending = oldest_pending()
+    return upto if pending is None else min(upto, pending - 1)
+
+
+def reconcile_range(first_id, last_id, upto, repair=False, chunk_size=5000):
+    """
+    Reconciles users `first_id..last_id` and moves their checkpoints to
+    transaction id `upto`. Returns `(users_checked, [Drift, ...])`.
+    """
+    outermost = connection.get_autocommit()
+    with transaction.atomic():
+        if outermost and connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('SET TRANSACTION ISOLATION LEVEL REPEATABLE READ')
+
+        wallets = Wallet.objects.filter(user_id__gte=first_id, user_id__lte=last_id)
+        actual = dict(wallets.values_list('user_id', 'balance'))
+        if not actual:
+            return 0, []
+        shards = (
+            BalanceShard.objects.filter(user_id__gte=first_id, user_id__lte=last_id)
+            .values('user_id').annotate(total=Sum('balance')).values_list('user_id', 'total')
+        )
+        for user_id, total in shards:
+            actual[user_id] += total
+
+        checkpoints = {
+            cp.user_id: cp for cp in BalanceCheckpoint.objects.filter(pk__gte=first_id, pk__lte=last_id)
+        }
+        # Checkpointed users need the rows after their own checkpoint;
+        # new users only the rows after the watermark.
+        since = {
+            user_id: checkpoints[user_id].last_transaction_id if user_id in checkpoints else upto
+            for user_id in actual
+        }
+        since_cp = dict.fromkeys(actual, ZERO)
+        after_upto = dict.fromkeys(actual, ZERO)
+
+        ledger = (
+            Transaction.objects.filter(status='SUCCESS', id__gt=min(since.values()))
+            .filter(
+                Q(sender_id__gte=first_id, sender_id__lte=last_id)
+                | Q(receiver_id__gte=first_id, receiver_id__lte=last_id)
+            )
+            .values_list('id', 'sender_id', 'receiver_id', 'amount')
+        )
+        for tx_id, sender_id, receiver_id, amount in ledger.iterator(chunk_size=chunk_size):
+            for user_id, signed in ((sender_id, -amount), (receiver_id, amount)):
+                if user_id not in actual:
+                    continue
+                if tx_id > since[user_id]:
+                    since_cp[user_id] += signed
+                if tx_id > upto:
+                    after_upto[user_id] += signed
+
+        now = timezone.now()
+        drifts, new_checkpoints = [], []
+        for user_id, balance in actual.items():
+            checkpoint = checkpoints.get(user_id)
+            if checkpoint is None:
+                # First sight: trust the live balance as the baseline
+                new_checkpoints.append(BalanceCheckpoint(
+                    user_id=user_id, balance=balance - after_upto[user_id],
+                    last_transaction_id=upto, taken_at=now
+                ))
+                continue
+
+            expected = checkpoint.balance + since_cp[user_id]
+            if balance != expected:
+                drifts.append(Drift(user_id, balance, expected))
+            if upto > checkpoint.last_transaction_id:
+                # The ledger's figure, not the live one: unrepaired drift
+                # keeps showing up on later runs
+                new_checkpoints.append(BalanceCheckpoint(
+                    user_id=user_id, balance=expected - after_upto[user_id],
+                    last_transaction_id=upto, taken_at=now
+                ))
+
+        BalanceCheckpoint.objects.bulk_create(
+            new_checkpoints, batch_size=1000, update_conflicts=True,
+            unique_fields=['user'], update_fields=['balance', 'last_transaction_id', 'taken_at']
+        )
+
+    if repair:
+        for drift in drifts:
+            repair_drift(drift)
+    return len(actual), drifts
+
+
+def repair_drift(drift):
+    """
+    Moves the wallet balance back in line with the ledger. A relative
+    update, so transfers that landed since the snapshot are kept.
+    """
+    Wallet.objects.filter(user_id=drift.user_id).update(balance=F('balance') - drift.amount, version=F('version') + 1)
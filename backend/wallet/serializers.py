@@ -1,9 +1,9 @@
+from datetime import timedelta
 from rest_framework import serializers
-from django.contrib.auth import get_user_model
+from django.conf import settings
+from django.utils import timezone
 from .models import Transaction
 
-User = get_user_model()
-
 class TransferSerializer(serializers.Serializer):
     receiver_email = serializers.EmailField()
     amount = serializers.DecimalField(max_digits=12, decimal_places=2)
@@ -14,20 +14,66 @@ class TransferSerializer(serializers.Serializer):
             raise serializers.ValidationError("Amount must be positive.")
         return value
 
-    def validate_receiver_email(self, value):
-        if not User.objects.filter(email=value).exists():
-            raise serializers.ValidationError("Receiver does not exist.")
-        return value
-
     def validate(self, data):
         if data['receiver_email'] == self.context['request'].user.email:
             raise serializers.ValidationError("You cannot send money to yourself.")
         return data
 
+class BatchLineSerializer(serializers.Serializer):
+    receiver_email = serializers.EmailField()
+    amount = serializers.DecimalField(max_digits=12, decimal_places=2)
+
+    def validate_amount(self, value):
+        if value <= 0:
+            raise serializers.ValidationError("Amount must be positive.")
+        return value
+
+class BatchTransferSerializer(serializers.Serializer):
+    idempotency_key = serializers.UUIDField(required=True)
+    lines = BatchLineSerializer(many=True, allow_empty=False, max_length=settings.WALLET_BATCH_MAX_LINES)
+
 class TransactionHistorySerializer(serializers.ModelSerializer):
-    sender_email = serializers.EmailField(source='sender.email')
-    receiver_email = serializers.EmailField(source='receiver.email')
+    # Read from the annotations added by Transaction.objects.history(),
+    # not through the FKs (which would cost a query per row).
+    sender_email = serializers.EmailField(read_only=True)
+    receiver_email = serializers.EmailField(read_only=True)
 
     class Meta:
         model = Transaction
-        fields = ('reference_id', 'sender_email', 'receiver_email', 'amount', 'status', 'created_at')
\ No newline at end of file
+        fields = ('reference_id', 'sender_email', 'receiver_email', 'amount', 'status', 'created_at')
+
+class SummaryQuerySerializer(serializers.Serializer):
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
+    group = serializers.ChoiceField(choices=('day', 'month'), default='day')
+
+    def validate(self, data):
+        end = data.setdefault('end', timezone.localdate())
+        start = data.setdefault('start', end - timedelta(days=29))
+        if start > end:
+            raise serializers.ValidationError("start must not be after end.")
+        if (end - start).days >= settings.WALLET_SUMMARY_MAX_DAYS:
+            raise serializers.ValidationError(f"Ranges are limited to {settings.WALLET_SUMMARY_MAX_DAYS} days.")
+        return data
+
+class SummaryPeriodSerializer(serializers.Serializer):
+    period = serializers.DateField()
+    sent_total = serializers.DecimalField(max_digits=14, decimal_places=2)
+    sent_count = serializers.IntegerField()
+    received_total = serializers.DecimalField(max_digits=14, decimal_places=2)
+    received_count = serializers.IntegerField()
+
+class BalanceQuerySerializer(serializers.Serializer):
+    at = serializers.DateTimeField(required=False)
+
+class StatementQuerySerializer(serializers.Serializer):
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
+    # Not `format`: DRF reserves that for renderer selection
+    output = serializers.ChoiceField(choices=('csv', 'ndjson'), default='csv')
+    after = serializers.UUIDField(required=False, help_text="reference_id of the last row received")
+
+    def validate(self, data):
+        if data.get('start') and data.get('end') and data['start'] > data['end']:
+            raise serializers.ValidationError("start must not be after end.")
+        return data
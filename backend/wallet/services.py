@@ -0,0 +1,507 @@
+import random
+import time
+from decimal import Decimal
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import DatabaseError, connection, transaction
+from django.db.models import CharField, F, Func, Sum, Value
+
+from core import metrics
+from core.replicas import pin_to_primary
+from .idempotency import ClaimLost, get_idempotency_store
+from .ledger import record, transfer_entries
+from .models import BalanceShard, Transaction, Wallet
+
+User = get_user_model()
+
+# Backends that understand `UPDATE ... RETURNING`
+RETURNING_VENDORS = ('postgresql', 'sqlite')
+
+# Postgres errors that mean "run it again", by SQLSTATE
+TRANSIENT_ERRORS = {'40001': 'serialization', '40P01': 'deadlock', '55P03': 'lock_timeout'}
+
+INSUFFICIENT_FUNDS = {"error": "Insufficient funds"}, 400
+# Every retry lost to concurrent payments; nothing was moved
+CONFLICTED = {"error": "The transfer kept conflicting with other payments. Retry shortly."}, 409
+
+
+class InsufficientFunds(Exception):
+    pass
+
+
+class TransferConflict(Exception):
+    """The sender's wallet changed between the read and the version-checked debit."""
+
+
+class TransferAborted(Exception):
+    """`with_retries` ran out of retries."""
+
+
+def transfer_funds(sender, receiver_email, amount, idempotency_key):
+    """
+    Moves `amount` from `sender` to the owner of `receiver_email`.
+
+    Returns a `(response_body, status_code)` pair. Every step is a single
+    statement: the idempotency claim, one receiver lookup, a conditional
+    debit, a credit, the audit insert and recording the response. Balances
+    are changed with in-place `F()` updates rather than read-modify-write
+    `save()` calls, so the row lock taken by each UPDATE is all the
+    locking we need. settings.WALLET_TRANSFER_MODE picks how the money
+    moves: here ('sync'), version-checked ('optimistic') or later
+    ('queued').
+    """
+    store = get_idempotency_store()
+    replay = store.begin(sender.pk, idempotency_key)
+    if replay is not None:
+        return replay
+
+    # Hot senders settle in the request with locks: the queue workers
+    # never take shard locks, and a shard sweep can't be version-checked
+    mode = 'sync' if sender.shard_count else settings.WALLET_TRANSFER_MODE
+    settle = {'queued': enqueue_transfer, 'optimistic': settle_optimistic}.get(mode, settle_transfer)
+    try:
+        body, status = settle(sender, receiver_email, amount, idempotency_key, store)
+    except ClaimLost:
+        return store.outcome(sender.pk, idempotency_key)
+    except BaseException:
+        store.release(sender.pk, idempotency_key)
+        raise
+    if status >= 400:
+        # Nothing happened, so the key may be used again
+        store.release(sender.pk, idempotency_key)
+    return body, status
+
+
+def enqueue_transfer(sender, receiver_email, amount, idempotency_key, store):
+    """
+    Queued mode: records the transfer as PENDING and answers 202 straight
+    away. wallet.transfer_queue moves the money later and flips the status
+    (GET /api/wallet/transfer/<reference_id>/ reports it). A retry with the
+    same key replays the 202 and its transaction_id.
+    """
+    receiver = User.objects.filter(email=receiver_email).only('id').first()
+    if receiver is None:
+        return {"receiver_email": ["Receiver does not exist."]}, 400
+
+    with transaction.atomic():
+        tx = Transaction.objects.create(
+            sender_id=sender.pk,
+            receiver_id=receiver.pk,
+            amount=amount,
+            status='PENDING'
+        )
+        response_data = {
+            "message": "Transfer queued",
+            "transaction_id": str(tx.reference_id),
+            "status": "PENDING"
+        }
+        store.complete(sender.pk, idempotency_key, response_data, 202)
+
+    pin_to_primary(sender.pk)
+    return response_data, 202
+
+
+def settle_transfer(sender, receiver_email, amount, idempotency_key, store):
+    """
+    Sync mode: the guarded UPDATEs wait for any row lock in their way.
+    Deadlocks and serialization failures are retried (`with_retries`).
+    """
+    receiver = User.objects.filter(email=receiver_email).only('id', 'shard_count').first()
+    if receiver is None:
+        return {"receiver_email": ["Receiver does not exist."]}, 400
+
+    try:
+        response_data = with_retries('sync', lambda: commit_transfer(
+            sender, receiver, amount, idempotency_key, store, move_funds
+        ))
+    except InsufficientFunds:
+        return INSUFFICIENT_FUNDS
+    except TransferAborted:
+        return CONFLICTED
+
+    pin_to_primary(sender.pk, receiver.pk)
+    return response_data, 200
+
+
+def settle_optimistic(sender, receiver_email, amount, idempotency_key, store):
+    """
+    Optimistic mode: the sender's wallet is read without a lock and
+    debited with `UPDATE ... WHERE balance >= amount AND version = v`
+    (`move_funds_optimistic`). A conflict rolls back and is retried after
+    a jittered backoff, so uncontended transfers never queue on a lock.
+    If every retry loses (a hot spot), the transfer falls back to sync
+    mode and waits its turn rather than failing.
+    """
+    receiver = User.objects.filter(email=receiver_email).only('id', 'shard_count').first()
+    if receiver is None:
+        return {"receiver_email": ["Receiver does not exist."]}, 400
+
+    def attempt(move):
+        return commit_transfer(sender, receiver, amount, idempotency_key, store, move)
+
+    try:
+        try:
+            response_data = with_retries('optimistic', lambda: attempt(move_funds_optimistic))
+        except TransferAborted:
+            response_data = with_retries('sync', lambda: attempt(move_funds))
+    except InsufficientFunds:
+        return INSUFFICIENT_FUNDS
+    except TransferAborted:
+        return CONFLICTED
+
+    pin_to_primary(sender.pk, receiver.pk)
+    return response_data, 200
+
+
+def commit_transfer(sender, receiver, amount, idempotency_key, store, move):
+    """
+    One attempt at a transfer, in its own atomic block: moves the money
+    with `move` (move_funds or move_funds_optimistic), writes the audit
+    row and ledger entries and records the response.
+    """
+    with transaction.atomic():
+        new_balance, receiver_balance = move(sender, receiver, amount)
+
+        tx = Transaction.objects.create(
+            sender_id=sender.pk,
+            receiver_id=receiver.pk,
+            amount=amount,
+            status='SUCCESS'
+        )
+        record(transfer_entries(
+            tx.pk, sender.pk, receiver.pk, amount, tx.created_at,
+            sender_balance=None if sender.shard_count else new_balance,
+            receiver_balance=receiver_balance,
+        ))
+
+        # JSONField needs primitives: UUID -> str, Decimal -> float
+        response_data = {
+            "message": "Transfer Successful",
+            "transaction_id": str(tx.reference_id),
+            "new_balance": float(new_balance)
+        }
+        store.complete(sender.pk, idempotency_key, response_data, 200)
+    return response_data
+
+
+def with_retries(mode, attempt):
+    """
+    Runs `attempt` (one atomic block) again after a version conflict or a
+    transient database error (deadlock, serialization failure, lock
+    timeout), up to WALLET_TRANSFER_RETRIES times with full-jitter
+    exponential backoff. Raises TransferAborted when they run out.
+    """
+    retries = settings.WALLET_TRANSFER_RETRIES
+    for retry in range(retries + 1):
+        try:
+            return attempt()
+        except TransferConflict:
+            reason = 'version'
+        except DatabaseError as e:
+            reason = transient_reason(e)
+            if reason is None:
+                raise
+        if retry == retries:
+            metrics.TRANSFER_ABORTS.inc(mode=mode, reason=reason)
+            raise TransferAborted()
+        metrics.TRANSFER_RETRIES.inc(mode=mode, reason=reason)
+        time.sleep(random.uniform(0, min(settings.WALLET_RETRY_BACKOFF_MAX, settings.WALLET_RETRY_BACKOFF * 2 ** retry)))
+
+
+def transient_reason(error):
+    """Why `error` is worth retrying ('deadlock', ...), or None if it isn't."""
+    cause = error.__cause__
+    sqlstate = getattr(cause, 'sqlstate', None) or getattr(cause, 'pgcode', None)
+    if sqlstate:
+        return TRANSIENT_ERRORS.get(sqlstate)
+    # SQLite's busy timeout ran out
+    return 'locked' if 'database is locked' in str(error) else None
+
+
+def iter_batch_transfer(sender, lines, idempotency_key, progress_every=500):
+    """
+    Pays many receivers from `sender` under one idempotency key.
+
+    Generator: yields `('progress', {...})` events as it works and finally
+    `('result', (response_body, status_code))`. All receivers are resolved
+    in one query and every wallet involved is locked once, in id order;
+    lines are then settled in memory and written back with one bulk
+    balance update and bulk Transaction inserts. The whole batch is one
+    atomic block, so a consumer that stops iterating early (e.g. a dropped
+    streaming connection) rolls it back rather than leaving it half paid.
+    """
+    store = get_idempotency_store()
+    replay = store.begin(sender.pk, idempotency_key)
+    if replay is not None:
+        yield 'result', replay
+        return
+
+    try:
+        result = yield from settle_batch(sender, lines, idempotency_key, progress_every, store)
+    except ClaimLost:
+        result = store.outcome(sender.pk, idempotency_key)
+    except BaseException:
+        # Includes GeneratorExit from a consumer that stopped listening
+        store.release(sender.pk, idempotency_key)
+        raise
+    yield 'result', result
+
+
+def settle_batch(sender, lines, idempotency_key, progress_every, store):
+    emails = {line['receiver_email'] for line in lines}
+    receivers = {
+        u.email: u for u in User.objects.filter(email__in=emails).only('id', 'email', 'shard_count')
+    }
+
+    if sender.shard_count:
+        # Pull a hot sender's shards in up front, in their own transaction:
+        # inside the batch they'd be locked out of id order.
+        with transaction.atomic():
+            sweep_shards(sender.pk)
+
+    total = len(lines)
+    with transaction.atomic():
+        # Hot receivers are credited on their wallet row here; the row is
+        # locked anyway and total_balance counts row + shards alike.
+        wallet_ids = {sender.pk} | {u.pk for u in receivers.values()}
+        wallets = {
+            w.user_id: w for w in Wallet.objects.select_for_update()
+            .filter(user_id__in=wallet_ids).order_by('user_id')
+        }
+        payer = wallets[sender.pk]
+
+        # Ledger running balances after each successful line (None for hot
+        # wallets, whose shards keep changing outside this transaction)
+        results, to_create, balances = [], [], []
+        for i, line in enumerate(lines):
+            receiver = receivers.get(line['receiver_email'])
+            amount = line['amount']
+            result = {"line": i, "receiver_email": line['receiver_email'], "amount": float(amount)}
+
+            if receiver is None:
+                result.update(status='FAILED', error="Receiver does not exist.")
+            elif receiver.pk == sender.pk:
+                result.update(status='FAILED', error="You cannot send money to yourself.")
+            elif payer.balance < amount:
+                result.update(status='FAILED', error="Insufficient funds")
+            else:
+                payer.balance -= amount
+                wallets[receiver.pk].balance += amount
+                tx = Transaction(sender_id=sender.pk, receiver_id=receiver.pk, amount=amount, status='SUCCESS')
+                to_create.append(tx)
+                balances.append((
+                    None if sender.shard_count else payer.balance,
+                    None if receiver.shard_count else wallets[receiver.pk].balance,
+                ))
+                result.update(status='SUCCESS', transaction_id=str(tx.reference_id))
+            results.append(result)
+
+            if (i + 1) % progress_every == 0:
+                yield 'progress', {"stage": "settling", "processed": i + 1, "total": total}
+
+        write_wallets(wallets.values())
+        for start in range(0, len(to_create), progress_every):
+            chunk = Transaction.objects.bulk_create(to_create[start:start + progress_every])
+            record([
+                entry for tx, (sender_balance, receiver_balance) in zip(chunk, balances[start:])
+                for entry in transfer_entries(
+                    tx.pk, tx.sender_id, tx.receiver_id, tx.amount, tx.created_at, sender_balance, receiver_balance
+                )
+            ])
+            yield 'progress', {
+                "stage": "recording",
+                "processed": min(start + progress_every, len(to_create)),
+                "total": len(to_create)
+            }
+
+        succeeded = len(to_create)
+        response_data = {
+            "message": "Batch processed",
+            "succeeded": succeeded,
+            "failed": total - succeeded,
+            "total_debited": float(sum(tx.amount for tx in to_create)),
+            "new_balance": float(payer.balance),
+            "results": results
+        }
+        store.complete(sender.pk, idempotency_key, response_data, 200)
+
+    pin_to_primary(*wallet_ids)
+    return response_data, 200
+
+
+def move_funds(sender, receiver, amount):
+    """
+    Debits the sender and credits the receiver inside the caller's atomic
+    block. Returns the sender's new (spendable) balance and the receiver's
+    new wallet balance (None for a hot wallet, credited on a shard).
+
+    Rows are touched in ascending user id order so two opposite transfers
+    can't deadlock; if the debit comes second and fails, raising rolls the
+    credit back with the rest of the transaction. A hot wallet's shards sit
+    at the same position as its wallet row in that order: they are always
+    locked right before (sweeps) or instead of (credits) the wallet row.
+    """
+    if sender.pk < receiver.pk:
+        new_balance = debit(sender, amount)
+        receiver_balance = credit(receiver, amount)
+    else:
+        receiver_balance = credit(receiver, amount)
+        new_balance = debit(sender, amount)
+    return new_balance, receiver_balance
+
+
+def move_funds_optimistic(sender, receiver, amount):
+    """
+    move_funds for an unsharded sender, without waiting on locks: its
+    wallet is read unlocked and debited only if `version` hasn't moved
+    since (TransferConflict otherwise). On Postgres any write that would
+    wait longer than WALLET_OPTIMISTIC_LOCK_TIMEOUT_MS for another
+    transaction's row lock fails instead, and the attempt is retried.
+    """
+    wallet, fields = Wallet.objects.filter(pk=sender.pk), ['balance', 'version']
+    if connection.vendor == 'postgresql':
+        # Set in the same round trip as the read
+        wallet = wallet.annotate(lock_timeout=Func(
+            Value('lock_timeout'), Value(f'{settings.WALLET_OPTIMISTIC_LOCK_TIMEOUT_MS}ms'), Value(True),
+            function='set_config', output_field=CharField()
+        ))
+        fields.append('lock_timeout')
+    balance, version, *_ = wallet.values_list(*fields).get()
+    if balance < amount:
+        raise InsufficientFunds()
+
+    def debit_sender():
+        new_balance = update_balance(sender.pk, -amount, guard=amount, version=version)
+        if new_balance is None:
+            raise TransferConflict()
+        return new_balance
+
+    # Same id order as move_funds
+    if sender.pk < receiver.pk:
+        new_balance = debit_sender()
+        receiver_balance = credit(receiver, amount)
+    else:
+        receiver_balance = credit(receiver, amount)
+        new_balance = debit_sender()
+    return new_balance, receiver_balance
+
+
+def credit(user, amount):
+    """Credits `user`, returning the new wallet balance (None if it went to a shard)."""
+    if user.shard_count:
+        credit_shard(user.pk, user.shard_count, amount)
+        return None
+    return credit_balance(user.pk, amount)
+
+
+def credit_shard(user_id, shard_count, amount):
+    """
+    Adds `amount` to one of the user's balance shards, preferring one no
+    other transaction currently holds so concurrent payers spread out.
+    """
+    shards = BalanceShard.objects.filter(user_id=user_id)
+    if connection.features.has_select_for_update_skip_locked:
+        free = shards.select_for_update(skip_locked=True).order_by('?').values('pk')[:1]
+        if shards.filter(pk__in=free).update(balance=F('balance') + amount):
+            return
+    # Every shard is busy (or the backend can't skip locks): just pick one
+    if not shards.filter(index=random.randrange(shard_count)).update(balance=F('balance') + amount):
+        # Shard rows missing (e.g. mid-reconfiguration): never drop the money
+        credit_balance(user_id, amount)
+
+
+def sweep_shards(user_id):
+    """
+    Moves everything on the user's shards into their Wallet. Must run
+    inside an atomic block; returns the amount swept.
+    """
+    shards = list(
+        BalanceShard.objects.select_for_update().filter(user_id=user_id)
+        .order_by('index').values_list('pk', 'balance')
+    )
+    swept = sum((balance for _, balance in shards), Decimal('0'))
+    if swept:
+        BalanceShard.objects.filter(pk__in=[pk for pk, _ in shards]).update(balance=0)
+        credit_balance(user_id, swept)
+    return swept
+
+
+def debit(user, amount):
+    """
+    Debits `user`, sweeping a hot wallet's shards into its balance first
+    if the wallet row alone can't cover the amount.
+    """
+    try:
+        new_balance = debit_balance(user.pk, amount)
+    except InsufficientFunds:
+        if not user.shard_count or not sweep_shards(user.pk):
+            raise
+        new_balance = debit_balance(user.pk, amount)
+
+    if user.shard_count:
+        pending = BalanceShard.objects.filter(user_id=user.pk).aggregate(total=Sum('balance'))['total']
+        new_balance += pending or 0
+    return new_balance
+
+
+def debit_balance(user_id, amount):
+    """
+    `UPDATE ... SET balance = balance - amount WHERE balance >= amount`.
+    Raises InsufficientFunds if the guard matched no row.
+    """
+    new_balance = update_balance(user_id, -amount, guard=amount)
+    if new_balance is None:
+        raise InsufficientFunds()
+    return new_balance
+
+
+def credit_balance(user_id, amount):
+    """`UPDATE ... SET balance = balance + amount`, returning the new balance."""
+    return update_balance(user_id, amount)
+
+
+def update_balance(user_id, delta, guard=None, version=None):
+    """
+    Adds `delta` to the user's Wallet, if its balance is at least `guard`
+    (and its version is still `version`), and returns the new balance
+    (None if a guard matched no row). One `UPDATE ... RETURNING` on
+    backends that have it; only the balance and version columns are
+    written.
+    """
+    if connection.vendor in RETURNING_VENDORS:
+        qn = connection.ops.quote_name
+        balance = qn(Wallet._meta.get_field('balance').column)
+        version_column = qn(Wallet._meta.get_field('version').column)
+        where, params = f"{qn(Wallet._meta.pk.column)} = %s", [delta, user_id]
+        if guard is not None:
+            where += f" AND {balance} >= %s"
+            params.append(guard)
+        if version is not None:
+            where += f" AND {version_column} = %s"
+            params.append(version)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE {qn(Wallet._meta.db_table)} "
+                f"SET {balance} = {balance} + %s, {version_column} = {version_column} + 1 "
+                f"WHERE {where} RETURNING {balance}",
+                params
+            )
+            row = cursor.fetchone()
+        return None if row is None else Wallet._meta.get_field('balance').to_python(row[0])
+
+    wallets = Wallet.objects.filter(pk=user_id)
+    if guard is not None:
+        wallets = wallets.filter(balance__gte=guard)
+    if version is not None:
+        wallets = wallets.filter(version=version)
+    if not wallets.update(balance=F('balance') + delta, version=F('version') + 1):
+        return None
+    return Wallet.objects.filter(pk=user_id).values_list('balance', flat=True).get()
+
+
+def write_wallets(wallets):
+    """Writes back balances settled in memory on locked Wallet rows, bumping their versions."""
+    wallets = list(wallets)
+    for wallet in wallets:
+        wallet.version = F('version') + 1
+    Wallet.objects.bulk_update(wallets, ['balance', 'version'], batch_size=1000)
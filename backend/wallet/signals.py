@@ -0,0 +1,17 @@
+from django.conf import settings
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from .models import Wallet
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def create_wallet(sender, instance, created, raw=False, **kwargs):
+    # Opens with the balance given to the new User (wallet_balance=...), or the sign-up credit
+    if not created or raw:
+        return
+    wallet = Wallet(user=instance)
+    opening = instance.__dict__.pop('_opening_balance', None)
+    if opening is not None:
+        wallet.balance = opening
+    wallet.save(force_insert=True)
@@ -0,0 +1,131 @@
+"""
+Full-statement exports for GET /api/wallet/statement/.
+
+Rows come straight from the database cursor as tuples (no model instances,
+no serializer) and are written out as CSV or NDJSON a chunk at a time, so
+memory stays flat however long the statement is. Rows are in (created_at,
+id) order and every row carries its reference_id, so a client whose
+connection dropped can ask for the rest with `?after=<last reference_id>`.
+Statements cover the live ledger; archived months (wallet.archive) are
+only reachable by reference_id.
+"""
+import csv
+import io
+import json
+from datetime import datetime, time, timedelta
+from django.db import connections
+from django.db.models import Q
+from django.utils import timezone
+
+from .archive import find_archived
+from .models import Transaction
+
+COLUMNS = ('reference_id', 'created_at', 'sender_email', 'receiver_email', 'amount', 'status')
+
+ORDERING = ('created_at', 'id')
+
+
+def statement_rows(user, start=None, end=None, after=None, chunk_size=2000, using=None):
+    """
+    Yields the user's transactions as tuples in COLUMNS order, oldest
+    first, between the local dates `start` and `end` (inclusive, either
+    may be None) and after the transaction `after` (for resuming).
+    """
+    period = Q()
+    tz = timezone.get_current_timezone()
+    if start:
+        period &= Q(created_at__gte=datetime.combine(start, time.min, tzinfo=tz))
+    if end:
+        period &= Q(created_at__lt=datetime.combine(end + timedelta(days=1), time.min, tzinfo=tz))
+    filters = period if after is None else period & seek(after.created_at, after.id)
+
+    rows = statement_query(user, filters, using)
+    if not connections[rows.db].settings_dict.get('DISABLE_SERVER_SIDE_CURSORS'):
+        # A server-side cursor on Postgres; fetchmany() chunks elsewhere
+        for row in rows.iterator(chunk_size=chunk_size):
+            yield row[:-1]
+        return
+
+    # Behind PgBouncer there are no server-side cursors, and a plain one
+    # would fetch the whole statement at once: page through it instead.
+    while True:
+        page = list(rows[:chunk_size])
+        for row in page:
+            yield row[:-1]
+        if len(page) < chunk_size:
+            return
+        rows = statement_query(user, period & seek(page[-1][1], page[-1][-1]), using)
+
+
+def statement_query(user, filters, using):
+    # Same shape as the history pagination: each side walks its own
+    # (user, created_at, id) index and the sides are merged, rather than
+    # one `sender OR receiver` scan that has to be sorted as a whole.
+    branches = [
+        Transaction.objects.filter(side, filters).values_list(
+            *COLUMNS[:2], 'sender__email', 'receiver__email', *COLUMNS[4:], 'id'
+        )
+        for side in (Q(sender=user), Q(receiver=user))
+    ]
+    return branches[0].union(branches[1], all=True).order_by(*ORDERING).using(using)
+
+
+def seek(created_at, tx_id):
+    """Rows after (created_at, tx_id) in ORDERING."""
+    return Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=tx_id)
+
+
+def find_resume_point(user, reference_id):
+    """The user's transaction with this reference_id (live or archived), or None."""
+    tx = (
+        Transaction.objects.filter(Q(sender=user) | Q(receiver=user), reference_id=reference_id)
+        .only('id', 'created_at').first()
+    )
+    if tx is None:
+        tx = find_archived(reference_id)
+        if tx is not None and user.pk not in (tx.sender_id, tx.receiver_id):
+            tx = None
+    return tx
+
+
+def as_csv(rows, rows_per_chunk=500):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(COLUMNS)
+    for count, row in enumerate(rows, 1):
+        writer.writerow(format_row(row))
+        if count % rows_per_chunk == 0:
+            yield drain(buffer)
+    yield drain(buffer)
+
+
+def as_ndjson(rows, rows_per_chunk=500):
+    lines = []
+    for row in rows:
+        lines.append(json.dumps(dict(zip(COLUMNS, format_row(row)))))
+        if len(lines) == rows_per_chunk:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+
+def format_row(row):
+    reference_id, created_at, sender_email, receiver_email, amount, status = row
+    return (
+        str(reference_id), timezone.localtime(created_at).isoformat(),
+        sender_email, receiver_email, str(amount), status,
+    )
+
+
+def drain(buffer):
+    value = buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+    return value
+
+
+FORMATS = {
+    'csv': (as_csv, 'text/csv'),
+    'ndjson': (as_ndjson, 'application/x-ndjson'),
+}
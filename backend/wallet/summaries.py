@@ -0,0 +1,147 @@
+"""
+Per-user daily totals (DailySummary) maintained from the Transaction ledger.
+
+Updating summaries inside every transfer would add two upserts to the hot
+path and put a busy receiver's day row under the same lock contention the
+balance shards exist to avoid. Instead a change-feed worker
+(`update_daily_summaries`) folds new ledger rows into the summaries in id
+order and records how far it got in a core.Checkpoint. Reads add the few
+rows past that checkpoint on the fly, so totals are exact even while the
+worker is behind.
+"""
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from core.models import Checkpoint
+from .models import DailySummary, Transaction
+
+FEED = 'daily_summaries'
+
+ZERO = Decimal('0.00')
+
+
+def apply_changes(upto, batch_size=5000):
+    """
+    Folds up to `batch_size` ledger rows after the feed's checkpoint (and
+    at or below transaction id `upto`) into DailySummary. Returns the
+    number of rows consumed; 0 means the feed has caught up with `upto`.
+    Rows are consumed once, so `upto` must stay below any PENDING row
+    (reconciliation.watermark does).
+    """
+    Checkpoint.objects.get_or_create(name=FEED)
+    with transaction.atomic():
+        # Held until commit: a second worker waits here rather than
+        # counting the same rows twice
+        checkpoint = Checkpoint.objects.select_for_update().get(name=FEED)
+        rows = list(
+            Transaction.objects.filter(id__gt=checkpoint.position, id__lte=upto).order_by('id')
+            .values_list('id', 'sender_id', 'receiver_id', 'amount', 'status', 'created_at')[:batch_size]
+        )
+        if not rows:
+            return 0
+
+        deltas = defaultdict(lambda: [ZERO, 0, ZERO, 0])
+        for _, sender_id, receiver_id, amount, status, created_at in rows:
+            if status != 'SUCCESS':
+                continue
+            day = timezone.localdate(created_at)
+            sent = deltas[(sender_id, day)]
+            sent[0] += amount
+            sent[1] += 1
+            received = deltas[(receiver_id, day)]
+            received[2] += amount
+            received[3] += 1
+        fold(deltas)
+
+        checkpoint.position = rows[-1][0]
+        checkpoint.save(update_fields=['position', 'updated_at'])
+    return len(rows)
+
+
+def fold(deltas):
+    existing = {
+        (s.user_id, s.day): s for s in DailySummary.objects.filter(
+            user_id__in={user_id for user_id, _ in deltas},
+            day__in={day for _, day in deltas},
+        )
+    }
+    to_update, to_create = [], []
+    for (user_id, day), (sent_total, sent_count, received_total, received_count) in deltas.items():
+        summary = existing.get((user_id, day))
+        if summary is None:
+            summary = DailySummary(user_id=user_id, day=day)
+            to_create.append(summary)
+        else:
+            to_update.append(summary)
+        summary.sent_total += sent_total
+        summary.sent_count += sent_count
+        summary.received_total += received_total
+        summary.received_count += received_count
+
+    fields = ['sent_total', 'sent_count', 'received_total', 'received_count']
+    DailySummary.objects.bulk_update(to_update, fields, batch_size=1000)
+    DailySummary.objects.bulk_create(to_create, batch_size=1000)
+
+
+def summarize(user, start, end, group='day'):
+    """
+    Totals for `user` between the local dates `start` and `end` (inclusive),
+    one entry per day or month: the summary rows plus the ledger rows the
+    feed hasn't reached yet.
+    """
+    periods = defaultdict(lambda: [ZERO, 0, ZERO, 0])
+
+    def bucket(day):
+        return periods[day.replace(day=1) if group == 'month' else day]
+
+    summaries = DailySummary.objects.filter(user=user, day__gte=start, day__lte=end).values_list(
+        'day', 'sent_total', 'sent_count', 'received_total', 'received_count'
+    )
+    for day, *totals in summaries:
+        entry = bucket(day)
+        for i, value in enumerate(totals):
+            entry[i] += value
+
+    for sender_id, amount, created_at in tail(user, start, end):
+        entry = bucket(timezone.localdate(created_at))
+        if sender_id == user.pk:
+            entry[0] += amount
+            entry[1] += 1
+        else:
+            entry[2] += amount
+            entry[3] += 1
+
+    return [
+        {
+            'period': period,
+            'sent_total': sent_total, 'sent_count': sent_count,
+            'received_total': received_total, 'received_count': received_count,
+        }
+        for period, (sent_total, sent_count, received_total, received_count) in sorted(periods.items())
+    ]
+
+
+def tail(user, start, end):
+    """SUCCESS ledger rows for `user` in the date range the feed hasn't folded in yet."""
+    position = Checkpoint.objects.filter(name=FEED).values_list('position', flat=True).first() or 0
+    tz = timezone.get_current_timezone()
+    since = datetime.combine(start, time.min, tzinfo=tz)
+    until = datetime.combine(end + timedelta(days=1), time.min, tzinfo=tz)
+
+    if position:
+        # Ids follow creation order up to the settle lag, so nothing past
+        # the checkpoint is older than its row by more than that. This
+        # keeps the scan short however wide the requested range is.
+        reached = Transaction.objects.filter(pk=position).values_list('created_at', flat=True).first()
+        if reached is not None:
+            since = max(since, reached - settings.WALLET_LEDGER_LAG)
+
+    return Transaction.objects.filter(
+        Q(sender=user) | Q(receiver=user),
+        id__gt=position, status='SUCCESS', created_at__gte=since, created_at__lt=until,
+    ).values_list('sender_id', 'amount', 'created_at')
@@ -0,0 +1,53 @@
+from datetime import datetime, timezone
+from decimal import Decimal
+import pytest
+from django.contrib.auth import get_user_model
+from django.test import Client
+
+from wallet.models import Transaction
+
+User = get_user_model()
+
+
+@pytest.fixture
+def admin_client(db):
+    client = Client()
+    client.force_login(User.objects.create_superuser(email='admin@test.com', password='password123'))
+    return client
+
+
+@pytest.fixture
+def ledger(db):
+    users = [User.objects.create_user(email=f'u{i}@test.com', password='password123') for i in range(4)]
+    for i in range(40):
+        tx = Transaction.objects.create(
+            sender=users[i % 4], receiver=users[(i + 1) % 4], amount=Decimal('1.00'), status='SUCCESS'
+        )
+        Transaction.objects.filter(pk=tx.pk).update(created_at=datetime(2025, 3, 1 + i % 3, 12, tzinfo=timezone.utc))
+    return users
+
+
+def test_transaction_changelist_queries_do_not_grow_with_rows(admin_client, ledger, django_assert_max_num_queries):
+    # Senders and receivers come from one join, not a query per row
+    with django_assert_max_num_queries(12):
+        response = admin_client.get('/admin/wallet/transaction/')
+    assert response.status_code == 200
+    assert response.context['cl'].result_count == 40
+
+
+def test_date_hierarchy_lists_only_days_with_rows(admin_client, ledger):
+    response = admin_client.get('/admin/wallet/transaction/', {'created_at__year': 2025, 'created_at__month': 3})
+    content = response.content.decode()
+    for day in (1, 2, 3):
+        assert f'created_at__day={day}&' in content or f'created_at__day={day}"' in content
+    assert 'created_at__day=4' not in content
+
+
+def test_search_by_reference_and_email(admin_client, ledger):
+    tx = Transaction.objects.first()
+    response = admin_client.get('/admin/wallet/transaction/', {'q': str(tx.reference_id)})
+    assert list(response.context['cl'].result_list) == [tx]
+
+    response = admin_client.get('/admin/wallet/transaction/', {'q': 'u3@'})
+    # u3 sends every fourth transfer and receives every fourth
+    assert response.context['cl'].result_count == 20
@@ -30,7 +30,7 @@ def test_atomic_transfer_concurrency():
     data = {
         "receiver_email": "receiver@test.com",
         "amount": "100.00",
-        "idempotency_key": "unique-key-1" # Testing Idempotency
+        "idempotency_key": "3f1c2a9e-6b7d-4e52-9a0f-8c1d2e3f4a5b" # Testing Idempotency (must be a UUID)
     }
     
     # First Request: Should Succeed
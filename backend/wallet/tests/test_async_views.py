@@ -0,0 +1,51 @@
+import json
+import uuid
+from asgiref.sync import async_to_sync
+from django.test import AsyncRequestFactory
+from django.contrib.auth import get_user_model
+from decimal import Decimal
+from rest_framework_simplejwt.tokens import AccessToken
+
+from users.async_views import UserProfileView
+from wallet.async_views import TransferFundsView, TransactionHistoryView
+
+User = get_user_model()
+
+
+def call(view, method, user=None, data=None):
+    factory = AsyncRequestFactory()
+    headers = {'Authorization': f'Bearer {AccessToken.for_user(user)}'} if user else {}
+    if method == 'post':
+        request = factory.post('/', json.dumps(data), content_type='application/json', headers=headers)
+    else:
+        request = factory.get('/', headers=headers)
+    response = async_to_sync(view.as_view())(request)
+    return response.status_code, json.loads(response.content)
+
+
+def test_async_transfer_history_and_profile(db):
+    sender = User.objects.create_user(email='sender@test.com', password='password123', wallet_balance=100)
+    User.objects.create_user(email='receiver@test.com', password='password123', wallet_balance=0)
+
+    status, body = call(TransferFundsView, 'post', sender, {
+        "receiver_email": "receiver@test.com",
+        "amount": "25.00",
+        "idempotency_key": str(uuid.uuid4()),
+    })
+    assert status == 200
+    assert body['new_balance'] == 75.0
+
+    status, body = call(TransactionHistoryView, 'get', sender)
+    assert status == 200
+    assert body['next'] is None
+    assert [row['receiver_email'] for row in body['results']] == ['receiver@test.com']
+
+    status, body = call(UserProfileView, 'get', sender)
+    assert status == 200
+    assert Decimal(body['wallet_balance']) == Decimal('75.00')
+
+
+def test_async_views_require_a_token(db):
+    status, body = call(TransactionHistoryView, 'get')
+    assert status == 401
+    assert 'detail' in body
@@ -0,0 +1,55 @@
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from django.core.management import call_command
+from django.utils import timezone
+
+from wallet.idempotency import IN_PROGRESS
+from wallet.models import IdempotencyLog, Transaction
+from wallet.services import transfer_funds
+
+def test_replay_is_served_from_cache(sender, django_assert_num_queries, django_capture_on_commit_callbacks):
+    key = uuid.uuid4()
+    with django_capture_on_commit_callbacks(execute=True):
+        body, status = transfer_funds(sender, 'receiver@test.com', Decimal('10.00'), key)
+    assert status == 200
+
+    with django_assert_num_queries(0):
+        assert transfer_funds(sender, 'receiver@test.com', Decimal('10.00'), key) == (body, 200)
+    assert Transaction.objects.count() == 1
+
+
+def test_retry_waits_for_in_flight_request(sender, settings):
+    settings.WALLET_IDEMPOTENCY_WAIT = 0
+    key = uuid.uuid4()
+    # Another worker has claimed the key but not finished yet
+    IdempotencyLog.objects.create(user=sender, key=key)
+
+    assert transfer_funds(sender, 'receiver@test.com', Decimal('10.00'), key) == IN_PROGRESS
+    assert not Transaction.objects.exists()
+
+    # ... and a claim left behind by a dead worker is taken over
+    settings.WALLET_IDEMPOTENCY_LEASE = timedelta(0)
+    body, status = transfer_funds(sender, 'receiver@test.com', Decimal('10.00'), key)
+    assert status == 200
+    assert IdempotencyLog.objects.get(key=key).response_code == 200
+
+
+def test_failed_transfer_releases_key(sender):
+    key = uuid.uuid4()
+    assert transfer_funds(sender, 'receiver@test.com', Decimal('500.00'), key)[1] == 400
+    assert not IdempotencyLog.objects.exists()
+    assert transfer_funds(sender, 'receiver@test.com', Decimal('50.00'), key)[1] == 200
+
+
+def test_prune_deletes_only_expired_keys(sender):
+    past = timezone.now() - timedelta(minutes=1)
+    IdempotencyLog.objects.bulk_create([
+        IdempotencyLog(user=sender, key=uuid.uuid4(), response_body={}, response_code=200, expires_at=past)
+        for _ in range(5)
+    ])
+    live = IdempotencyLog.objects.create(user=sender, key=uuid.uuid4(), response_body={}, response_code=200)
+
+    call_command('prune_idempotency', batch_size=2, stdout=StringIO())
+    assert list(IdempotencyLog.objects.all()) == [live]
@@ -0,0 +1,116 @@
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+import pytest
+from django.core.management import call_command
+from django.db import DatabaseError, connection, transaction
+from django.urls import reverse
+from django.utils import timezone
+
+from wallet.ledger import balance_at
+from wallet.models import LedgerEntry, Transaction, Wallet
+from wallet.transfer_queue import settle_pending
+
+
+def running(user):
+    return list(LedgerEntry.objects.filter(user=user).order_by('id').values_list('amount', 'balance_after'))
+
+
+def test_every_settlement_path_appends_both_sides(wallets, settings, post_transfer):
+    client, alice, bob = wallets
+    assert post_transfer(client, '10.00').status_code == 200
+
+    response = client.post(reverse('transfer_batch'), {
+        'idempotency_key': str(uuid.uuid4()),
+        'lines': [{'receiver_email': bob.email, 'amount': '5.00'}] * 2,
+    }, format='json')
+    assert response.data['succeeded'] == 2
+
+    settings.WALLET_TRANSFER_MODE = 'queued'
+    assert post_transfer(client, '20.00').status_code == 202
+    settle_pending(batch_size=10)
+
+    assert running(alice) == [
+        (Decimal('-10.00'), Decimal('90.00')),
+        (Decimal('-5.00'), Decimal('85.00')),
+        (Decimal('-5.00'), Decimal('80.00')),
+        (Decimal('-20.00'), Decimal('60.00')),
+    ]
+    assert [balance for _, balance in running(bob)] == [Decimal('10.00'), Decimal('15.00'), Decimal('20.00'), Decimal('40.00')]
+    # One debit and one credit per settled transaction
+    assert LedgerEntry.objects.count() == 2 * Transaction.objects.filter(status='SUCCESS').count()
+
+
+def test_balance_at_a_moment(wallets, post_transfer):
+    client, alice, bob = wallets
+    before = timezone.now() - timedelta(seconds=1)
+    post_transfer(client, '30.00')
+    middle = timezone.now()
+    post_transfer(client, '20.00')
+
+    assert balance_at(alice, middle) == Decimal('70.00')
+    assert balance_at(bob, middle) == Decimal('30.00')
+    # Nothing to go on before the first entry (it may predate the ledger)
+    assert balance_at(alice, before) is None
+
+    response = client.get(reverse('balance'), {'at': middle.isoformat()})
+    assert response.data['balance'] == '70.00'
+    assert client.get(reverse('balance'), {'at': before.isoformat()}).status_code == 404
+    assert client.get(reverse('balance')).data['balance'] == '50.00'
+
+
+def test_hot_wallet_works_back_from_the_current_balance(wallets, post_transfer):
+    client, alice, bob = wallets
+    call_command('shard_wallet', bob.email, shards=4, stdout=StringIO())
+    post_transfer(client, '30.00')
+    middle = timezone.now()
+    post_transfer(client, '20.00')
+
+    # Credits land on shards: no running balance on Bob's entries
+    assert not LedgerEntry.objects.filter(user=bob, balance_after__isnull=False).exists()
+    assert balance_at(bob, middle) == Decimal('30.00')
+    assert balance_at(bob, timezone.now()) == Decimal('50.00')
+
+
+def test_backfill_walks_back_through_pre_ledger_transfers(wallets, post_transfer):
+    client, alice, bob = wallets
+    # Settled before the ledger existed: rows and balances, no entries
+    first = timezone.now() - timedelta(days=2)
+    for i, (amount, status) in enumerate([('10.00', 'SUCCESS'), ('7.00', 'FAILED'), ('5.00', 'SUCCESS')]):
+        tx = Transaction.objects.create(sender=alice, receiver=bob, amount=Decimal(amount), status=status)
+        Transaction.objects.filter(pk=tx.pk).update(created_at=first + timedelta(hours=i))
+    Wallet.objects.filter(pk=alice.pk).update(balance=Decimal('85.00'))
+    Wallet.objects.filter(pk=bob.pk).update(balance=Decimal('15.00'))
+    post_transfer(client, '30.00')
+    assert balance_at(alice, first) is None
+
+    out = StringIO()
+    call_command('backfill_ledger', batch_size=1, stdout=out)
+    assert 'Backfilled 4 ledger entries.' in out.getvalue()
+    assert balance_at(alice, first - timedelta(seconds=1)) is None
+    assert balance_at(alice, first) == Decimal('90.00')
+    assert balance_at(alice, first + timedelta(hours=2)) == Decimal('85.00')
+    assert balance_at(bob, first + timedelta(hours=2)) == Decimal('15.00')
+    assert balance_at(alice, timezone.now()) == Decimal('55.00')
+
+    # Nothing left to write
+    call_command('backfill_ledger', stdout=out)
+    assert 'Backfilled 0 ledger entries.' in out.getvalue()
+
+
+def test_seeded_history_has_its_entries(db):
+    call_command('seed_data', users=6, transactions=40, seed=3, workers=1, stdout=StringIO())
+
+    assert LedgerEntry.objects.count() == 2 * Transaction.objects.filter(status='SUCCESS').count() > 0
+    for wallet in Wallet.objects.all():
+        last = LedgerEntry.objects.filter(user_id=wallet.pk).order_by('-created_at', '-id').first()
+        assert last is None or last.balance_after == wallet.balance
+
+
+@pytest.mark.skipif(connection.vendor != 'postgresql', reason='The append-only trigger is Postgres only')
+def test_entries_cannot_be_rewritten(wallets, post_transfer):
+    client, alice, _ = wallets
+    post_transfer(client, '10.00')
+    with pytest.raises(DatabaseError), transaction.atomic():
+        LedgerEntry.objects.filter(user=alice).update(amount=0)
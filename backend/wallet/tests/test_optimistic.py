@@ -0,0 +1,109 @@
+from decimal import Decimal
+import pytest
+from django.db import OperationalError
+from django.db.models import F
+
+from core import metrics
+from wallet import services
+from wallet.models import IdempotencyLog, Transaction, Wallet
+
+@pytest.fixture(autouse=True)
+def optimistic(settings):
+    # The shared wallets create the receiver first: its credit runs before
+    # the sender's version-checked debit
+    settings.WALLET_TRANSFER_MODE = 'optimistic'
+    settings.WALLET_RETRY_BACKOFF = 0
+
+
+def count(metric, *key):
+    return metric.values.get(key, 0)
+
+
+def interfering_credit(monkeypatch, sender, times):
+    """Moves the sender's version under the first `times` credits, like a concurrent payment would."""
+    credit = services.credit
+    calls = []
+
+    def credit_and_interfere(user, amount):
+        calls.append(user.pk)
+        if len(calls) <= times:
+            Wallet.objects.filter(pk=sender.pk).update(version=F('version') + 1)
+        return credit(user, amount)
+
+    monkeypatch.setattr(services, 'credit', credit_and_interfere)
+    return calls
+
+
+def test_optimistic_transfer_checks_the_version(wallets, post_transfer):
+    client, sender, receiver = wallets
+
+    assert post_transfer(client, "40.00").status_code == 200
+    assert Wallet.objects.get(pk=sender.pk).version == 1
+    assert post_transfer(client, "60.01").data == {"error": "Insufficient funds"}
+    sender.refresh_from_db()
+    assert sender.wallet_balance == Decimal('60.00')
+
+
+def test_version_conflict_is_retried(wallets, monkeypatch, post_transfer):
+    client, sender, receiver = wallets
+    calls = interfering_credit(monkeypatch, sender, times=1)
+    retries = count(metrics.TRANSFER_RETRIES, 'optimistic', 'version')
+
+    assert post_transfer(client, "40.00").status_code == 200
+    assert len(calls) == 2
+    assert count(metrics.TRANSFER_RETRIES, 'optimistic', 'version') == retries + 1
+    sender.refresh_from_db()
+    receiver.refresh_from_db()
+    assert (sender.wallet_balance, receiver.wallet_balance) == (Decimal('60.00'), Decimal('40.00'))
+    assert Transaction.objects.count() == 1
+
+
+def test_hot_spot_falls_back_to_locking(wallets, monkeypatch, settings, post_transfer):
+    settings.WALLET_TRANSFER_RETRIES = 2
+    client, sender, receiver = wallets
+    calls = interfering_credit(monkeypatch, sender, times=100)
+    aborts = count(metrics.TRANSFER_ABORTS, 'optimistic', 'version')
+
+    assert post_transfer(client, "40.00").status_code == 200
+    # Three optimistic attempts, then one that doesn't check the version
+    assert len(calls) == 4
+    assert count(metrics.TRANSFER_ABORTS, 'optimistic', 'version') == aborts + 1
+    receiver.refresh_from_db()
+    assert receiver.wallet_balance == Decimal('40.00')
+
+
+class Deadlock(Exception):
+    sqlstate = '40P01'
+
+
+def deadlock():
+    error = OperationalError('deadlock detected')
+    error.__cause__ = Deadlock()
+    return error
+
+
+def test_deadlocks_are_retried_not_500(wallets, monkeypatch, settings, post_transfer):
+    settings.WALLET_TRANSFER_MODE = 'sync'
+    client, sender, receiver = wallets
+    move_funds, failures = services.move_funds, [deadlock()]
+
+    def deadlocks_once(*args):
+        if failures:
+            raise failures.pop()
+        return move_funds(*args)
+
+    monkeypatch.setattr(services, 'move_funds', deadlocks_once)
+    retries = count(metrics.TRANSFER_RETRIES, 'sync', 'deadlock')
+    assert post_transfer(client, "40.00").status_code == 200
+    assert count(metrics.TRANSFER_RETRIES, 'sync', 'deadlock') == retries + 1
+
+    # Deadlocking on every attempt: a 409 to retry, nothing moved, key released
+    def always_deadlocks(*args):
+        raise deadlock()
+
+    monkeypatch.setattr(services, 'move_funds', always_deadlocks)
+    response = post_transfer(client, "10.00")
+    assert response.status_code == 409
+    sender.refresh_from_db()
+    assert sender.wallet_balance == Decimal('60.00')
+    assert IdempotencyLog.objects.count() == 1
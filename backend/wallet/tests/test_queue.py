@@ -0,0 +1,82 @@
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+import pytest
+from django.contrib.auth import get_user_model
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from wallet.models import Transaction
+from wallet.reconciliation import watermark
+from wallet.transfer_queue import settle_pending
+
+User = get_user_model()
+
+
+@pytest.fixture
+def queued(settings):
+    settings.WALLET_TRANSFER_MODE = 'queued'
+
+
+def transfer(client, receiver, amount, key=None):
+    return client.post(reverse('transfer'), {
+        'receiver_email': receiver.email,
+        'amount': amount,
+        'idempotency_key': key or str(uuid.uuid4()),
+    }, format='json')
+
+
+def test_queued_transfer_is_settled_by_the_worker(db, queued):
+    sender = User.objects.create_user(email='sender@test.com', password='password123', wallet_balance=100)
+    receiver = User.objects.create_user(email='receiver@test.com', password='password123', wallet_balance=0)
+    client = APIClient()
+    client.force_authenticate(user=sender)
+
+    key = str(uuid.uuid4())
+    response = transfer(client, receiver, '30.00', key)
+    assert response.status_code == 202
+    reference = response.data['transaction_id']
+    assert response.data['status'] == 'PENDING'
+    # A retry gets the same queued transfer back
+    assert transfer(client, receiver, '30.00', key).data['transaction_id'] == reference
+
+    status = reverse('transfer_status', args=[reference])
+    assert client.get(status).data['status'] == 'PENDING'
+    sender.refresh_from_db()
+    assert sender.wallet_balance == Decimal('100.00')
+
+    assert settle_pending(batch_size=10) == 1
+    assert client.get(status).data == {'transaction_id': reference, 'status': 'SUCCESS'}
+    sender.refresh_from_db()
+    receiver.refresh_from_db()
+    assert sender.wallet_balance == Decimal('70.00')
+    assert receiver.wallet_balance == Decimal('30.00')
+
+
+def test_batch_settles_in_queue_order_and_fails_what_cannot_be_covered(db, queued):
+    sender = User.objects.create_user(email='sender@test.com', password='password123', wallet_balance=50)
+    receiver = User.objects.create_user(email='receiver@test.com', password='password123', wallet_balance=0)
+    client = APIClient()
+    client.force_authenticate(user=sender)
+    references = [transfer(client, receiver, amount).data['transaction_id'] for amount in ('30.00', '30.00', '20.00')]
+
+    assert settle_pending(batch_size=10) == 3
+    statuses = dict(Transaction.objects.values_list('reference_id', 'status'))
+    assert [statuses[uuid.UUID(r)] for r in references] == ['SUCCESS', 'FAILED', 'SUCCESS']
+    failed = client.get(reverse('transfer_status', args=[references[1]])).data
+    assert failed['error'] == 'Insufficient funds'
+    sender.refresh_from_db()
+    assert sender.wallet_balance == Decimal('0.00')
+    assert settle_pending(batch_size=10) == 0
+
+
+def test_ledger_followers_stop_before_pending_transfers(db):
+    sender = User.objects.create_user(email='sender@test.com', password='password123')
+    receiver = User.objects.create_user(email='receiver@test.com', password='password123')
+    settled = Transaction.objects.create(sender=sender, receiver=receiver, amount=Decimal('1.00'), status='SUCCESS')
+    pending = Transaction.objects.create(sender=sender, receiver=receiver, amount=Decimal('1.00'), status='PENDING')
+    Transaction.objects.create(sender=sender, receiver=receiver, amount=Decimal('1.00'), status='SUCCESS')
+
+    assert watermark(timedelta(0)) == pending.pk - 1 >= settled.pk
+    settle_pending(batch_size=10)
+    assert watermark(timedelta(0)) > pending.pk
@@ -0,0 +1,103 @@
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+import pytest
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import F, Max
+from django.utils import timezone
+
+from wallet.models import BalanceCheckpoint, Transaction, Wallet
+from wallet.reconciliation import reconcile_range, watermark
+from wallet.services import transfer_funds
+from wallet.transfer_queue import settle_pending
+
+User = get_user_model()
+
+
+def reconcile(users, repair=False):
+    upto = Transaction.objects.aggregate(last=Max('id'))['last'] or 0
+    return reconcile_range(users[0].pk, users[-1].pk, upto, repair=repair)
+
+
+def test_reconcile_is_incremental_and_finds_drift(db):
+    users = [
+        User.objects.create_user(email=f'u{i}@test.com', password='password123', wallet_balance=100)
+        for i in range(3)
+    ]
+    transfer_funds(users[0], users[1].email, Decimal('30.00'), uuid.uuid4())
+
+    # First run takes the live balances as the baseline
+    assert reconcile(users) == (3, [])
+    assert BalanceCheckpoint.objects.get(pk=users[0].pk).balance == Decimal('70.00')
+
+    transfer_funds(users[1], users[2].email, Decimal('50.00'), uuid.uuid4())
+    Wallet.objects.filter(user=users[2]).update(balance=F('balance') + 5)
+
+    checked, drifts = reconcile(users, repair=True)
+    assert checked == 3
+    assert [(d.user_id, d.amount) for d in drifts] == [(users[2].pk, Decimal('5.00'))]
+    users[2].refresh_from_db()
+    assert users[2].wallet_balance == Decimal('150.00')
+    assert reconcile(users) == (3, [])
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.parametrize('workers', [
+    1,
+    # The forked workers open their own connections: they only see committed
+    # rows, and not SQLite's in-memory test database at all
+    pytest.param(2, marks=pytest.mark.skipif(connection.vendor != 'postgresql', reason='Forked workers need Postgres')),
+])
+def test_reconcile_command_splits_users_by_range(workers):
+    users = [
+        User.objects.create_user(email=f'u{i}@test.com', password='password123', wallet_balance=100)
+        for i in range(3)
+    ]
+    transfer_funds(users[0], users[1].email, Decimal('30.00'), uuid.uuid4())
+
+    def reconcile_balances(**options):
+        out = StringIO()
+        call_command('reconcile_balances', workers=workers, range_size=1, lag=0, stdout=out, **options)
+        return out.getvalue()
+
+    assert 'Reconciled 3 wallets' in reconcile_balances()
+    # Every range got its checkpoint, whichever worker took it
+    assert BalanceCheckpoint.objects.count() == 3
+
+    Wallet.objects.filter(user=users[2]).update(balance=F('balance') + 5)
+    Wallet.objects.filter(user=users[0]).update(balance=F('balance') - 2)
+    report = reconcile_balances(show=1)
+    # Largest first, and only as many as asked for
+    assert f'user {users[2].pk}: balance 105.00, ledger says 100.00 (drift +5.00)' in report
+    assert f'user {users[0].pk}:' not in report
+    assert '2 drifted (net +3.00).' in report
+
+    assert '2 drifted (net +3.00), repaired.' in reconcile_balances(repair=True)
+    assert dict(Wallet.objects.values_list('user_id', 'balance')) == {
+        users[0].pk: Decimal('70.00'), users[1].pk: Decimal('130.00'), users[2].pk: Decimal('100.00'),
+    }
+    assert '0 drifted' in reconcile_balances()
+
+
+def test_watermark_stays_below_pending_and_the_lag(wallets, post_transfer, settings):
+    client, sender, receiver = wallets
+    post_transfer(client, '10.00')
+    settings.WALLET_TRANSFER_MODE = 'queued'
+    post_transfer(client, '5.00')
+    settings.WALLET_TRANSFER_MODE = 'sync'
+    post_transfer(client, '1.00')
+    old, pending, new = Transaction.objects.order_by('id')
+    assert pending.status == 'PENDING'
+    Transaction.objects.filter(pk=old.pk).update(created_at=timezone.now() - timedelta(hours=2))
+
+    # The queued row may still settle: nothing from it on is safe to pass
+    assert watermark(timedelta(0)) == pending.pk - 1
+    assert watermark(timedelta(hours=1)) == old.pk
+    assert watermark(timedelta(hours=3)) == 0
+
+    settle_pending(batch_size=10)
+    assert watermark(timedelta(0)) == new.pk
+    assert watermark(timedelta(hours=1)) == old.pk
@@ -0,0 +1,114 @@
+import csv
+import io
+import json
+import uuid
+from decimal import Decimal
+from functools import partial
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.test import AsyncClient
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from wallet import statements, views
+from wallet.models import Transaction
+
+User = get_user_model()
+
+
+def read(response):
+    return b''.join(response.streaming_content).decode()
+
+
+def test_statement_streams_csv_and_resumes_after_a_reference(db):
+    alice = User.objects.create_user(email='alice@test.com', password='password123')
+    bob = User.objects.create_user(email='bob@test.com', password='password123')
+    carol = User.objects.create_user(email='carol@test.com', password='password123')
+    for i in range(5):
+        Transaction.objects.create(sender=alice, receiver=bob, amount=Decimal(i + 1), status='SUCCESS')
+        Transaction.objects.create(sender=bob, receiver=alice, amount=Decimal('0.50'), status='FAILED')
+    Transaction.objects.create(sender=bob, receiver=carol, amount=Decimal('9.00'), status='SUCCESS')
+
+    client = APIClient()
+    client.force_authenticate(user=alice)
+    response = client.get(reverse('statement'))
+    assert response.status_code == 200
+    assert response['Content-Type'] == 'text/csv'
+
+    rows = list(csv.DictReader(io.StringIO(read(response))))
+    expected = list(
+        Transaction.objects.exclude(receiver=carol).order_by('created_at', 'id').values_list('reference_id', flat=True)
+    )
+    assert [row['reference_id'] for row in rows] == [str(ref) for ref in expected]
+    assert rows[0]['amount'] == '1.00' and rows[0]['receiver_email'] == 'bob@test.com'
+
+    # Connection dropped after the fourth row: fetch the rest as NDJSON
+    response = client.get(reverse('statement'), {'after': rows[3]['reference_id'], 'output': 'ndjson'})
+    lines = [json.loads(line) for line in read(response).splitlines()]
+    assert [line['reference_id'] for line in lines] == [row['reference_id'] for row in rows[4:]]
+
+
+def test_statement_rejects_foreign_resume_point(db):
+    alice = User.objects.create_user(email='alice@test.com', password='password123')
+    bob = User.objects.create_user(email='bob@test.com', password='password123')
+    carol = User.objects.create_user(email='carol@test.com', password='password123')
+    tx = Transaction.objects.create(sender=bob, receiver=carol, amount=Decimal('1.00'), status='SUCCESS')
+
+    client = APIClient()
+    client.force_authenticate(user=alice)
+    assert client.get(reverse('statement'), {'after': str(tx.reference_id)}).status_code == 400
+    assert client.get(reverse('statement'), {'after': str(uuid.uuid4())}).status_code == 400
+
+
+def test_statement_pages_without_server_side_cursors(db):
+    # Behind PgBouncer (DATABASE_POOL=pgbouncer) the export walks keyset pages
+    from django.db import connection
+    from wallet.statements import statement_rows
+
+    alice = User.objects.create_user(email='alice@test.com', password='password123')
+    bob = User.objects.create_user(email='bob@test.com', password='password123')
+    for i in range(7):
+        Transaction.objects.create(sender=alice, receiver=bob, amount=Decimal(i + 1), status='SUCCESS')
+        Transaction.objects.create(sender=bob, receiver=alice, amount=Decimal('0.50'), status='SUCCESS')
+
+    streamed = list(statement_rows(alice, chunk_size=3))
+    connection.settings_dict['DISABLE_SERVER_SIDE_CURSORS'] = True
+    try:
+        paged = list(statement_rows(alice, chunk_size=3))
+    finally:
+        del connection.settings_dict['DISABLE_SERVER_SIDE_CURSORS']
+    assert len(paged) == 14
+    assert paged == streamed
+
+
+def test_statement_streams_chunk_by_chunk_under_asgi(db, monkeypatch):
+    alice = User.objects.create_user(email='alice@test.com', password='password123')
+    bob = User.objects.create_user(email='bob@test.com', password='password123')
+    for i in range(6):
+        Transaction.objects.create(sender=alice, receiver=bob, amount=Decimal(i + 1), status='SUCCESS')
+    monkeypatch.setitem(statements.FORMATS, 'ndjson', (partial(statements.as_ndjson, rows_per_chunk=2), 'application/x-ndjson'))
+    pulled = []
+
+    def counted_rows(*args, **kwargs):
+        for row in statements.statement_rows(*args, **kwargs):
+            pulled.append(row)
+            yield row
+
+    monkeypatch.setattr(views, 'statement_rows', counted_rows)
+
+    async def first_chunk_then_rest():
+        response = await AsyncClient().get(
+            reverse('statement'), {'output': 'ndjson'}, headers={'Authorization': f'Bearer {AccessToken.for_user(alice)}'}
+        )
+        assert response.is_async
+        body = aiter(response.streaming_content)
+        first = await anext(body)
+        rows_by_then = len(pulled)
+        return first, rows_by_then, [chunk async for chunk in body]
+
+    first, rows_by_then, rest = async_to_sync(first_chunk_then_rest)()
+    # Two rows read for the first chunk, not the whole statement
+    assert rows_by_then == 2
+    assert len(first.splitlines()) == 2 and len(rest) == 2
+    assert len(pulled) == 6
@@ -0,0 +1,61 @@
+import uuid
+from decimal import Decimal
+from django.contrib.auth import get_user_model
+from django.db.models import Max
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from wallet.models import DailySummary, Transaction
+from wallet.services import transfer_funds
+from wallet.summaries import apply_changes
+
+User = get_user_model()
+
+
+def test_summary_is_exact_before_and_after_the_feed_catches_up(db):
+    alice = User.objects.create_user(email='alice@test.com', password='password123', wallet_balance=100)
+    bob = User.objects.create_user(email='bob@test.com', password='password123', wallet_balance=100)
+    transfer_funds(alice, bob.email, Decimal('10.00'), uuid.uuid4())
+    transfer_funds(bob, alice.email, Decimal('4.00'), uuid.uuid4())
+    Transaction.objects.create(sender=alice, receiver=bob, amount=Decimal('99.00'), status='FAILED')
+
+    client = APIClient()
+    client.force_authenticate(user=alice)
+    today = timezone.localdate().isoformat()
+
+    def totals():
+        response = client.get(reverse('summary'))
+        assert response.status_code == 200
+        return [dict(row) for row in response.data['results']]
+
+    expected = [{
+        'period': today, 'sent_total': '10.00', 'sent_count': 1,
+        'received_total': '4.00', 'received_count': 1,
+    }]
+    # Nothing folded yet: answered from the ledger tail alone
+    assert totals() == expected
+
+    upto = Transaction.objects.aggregate(last=Max('id'))['last']
+    assert apply_changes(upto, batch_size=2) == 2
+    # Half folded, half from the tail
+    assert totals() == expected
+    assert apply_changes(upto, batch_size=2) == 1
+    assert apply_changes(upto) == 0
+    assert totals() == expected
+
+    row = DailySummary.objects.get(user=bob)
+    assert (row.sent_total, row.received_total, row.received_count) == (Decimal('4.00'), Decimal('10.00'), 1)
+
+    transfer_funds(alice, bob.email, Decimal('1.00'), uuid.uuid4())
+    response = client.get(reverse('summary'), {'start': today, 'end': today, 'group': 'month'})
+    assert response.data['results'][0]['sent_total'] == '11.00'
+    assert response.data['results'][0]['period'] == timezone.localdate().replace(day=1).isoformat()
+
+
+def test_summary_rejects_inverted_range(db):
+    user = User.objects.create_user(email='u@test.com', password='password123')
+    client = APIClient()
+    client.force_authenticate(user=user)
+    response = client.get(reverse('summary'), {'start': '2026-02-01', 'end': '2026-01-01'})
+    assert response.status_code == 400
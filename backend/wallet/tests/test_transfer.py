@@ -0,0 +1,203 @@
+import asyncio
+import json
+import uuid
+from functools import partial
+from io import StringIO
+import pytest
+from asgiref.sync import async_to_sync, sync_to_async
+from django.core.management import call_command
+from django.db import connection
+from django.test import AsyncClient
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+from django.contrib.auth import get_user_model
+from decimal import Decimal
+
+from core import throttling
+from wallet import services, views
+from wallet.models import BalanceShard, Transaction, IdempotencyLog, Wallet
+
+User = get_user_model()
+
+
+def test_transfer_moves_funds_and_replays(wallets, post_transfer):
+    client, sender, receiver = wallets
+    key = uuid.uuid4()
+
+    response = post_transfer(client, "40.00", key)
+    assert response.status_code == 200
+    assert response.data['new_balance'] == 60.0
+
+    replay = post_transfer(client, "40.00", key)
+    assert replay.status_code == 200
+    assert replay.data == response.data
+
+    sender.refresh_from_db()
+    receiver.refresh_from_db()
+    assert sender.wallet_balance == Decimal('60.00')
+    assert receiver.wallet_balance == Decimal('40.00')
+    assert Transaction.objects.count() == 1
+    assert IdempotencyLog.objects.count() == 1
+
+
+def test_transfer_writes_wallet_rows_not_users(wallets, post_transfer):
+    client, sender, receiver = wallets
+
+    with CaptureQueriesContext(connection) as queries:
+        assert post_transfer(client, "10.00").status_code == 200
+    writes = [q['sql'] for q in queries.captured_queries if q['sql'].startswith('UPDATE')]
+    assert writes and not any('"users_user"' in sql for sql in writes)
+    assert dict(Wallet.objects.values_list('user_id', 'version')) == {sender.pk: 1, receiver.pk: 1}
+
+    # New sign-ups open a wallet with the default credit
+    newcomer = User.objects.create_user(email='new@test.com', password='password123')
+    assert Wallet.objects.get(user=newcomer).balance == Decimal('1000.00')
+
+
+def test_insufficient_funds_rolls_back_credit(wallets, post_transfer):
+    client, sender, receiver = wallets
+
+    response = post_transfer(client, "100.01")
+    assert response.status_code == 400
+    assert response.data == {"error": "Insufficient funds"}
+
+    sender.refresh_from_db()
+    receiver.refresh_from_db()
+    assert sender.wallet_balance == Decimal('100.00')
+    assert receiver.wallet_balance == Decimal('0.00')
+    assert not Transaction.objects.exists()
+    assert not IdempotencyLog.objects.exists()
+
+
+def test_unknown_receiver(wallets, post_transfer):
+    client, sender, receiver = wallets
+
+    response = post_transfer(client, "1.00", receiver_email='nobody@test.com')
+    assert response.status_code == 400
+    assert 'receiver_email' in response.data
+
+
+def test_hot_wallet_credits_shards_and_sweeps_on_debit(wallets, post_transfer):
+    client, sender, receiver = wallets
+    call_command('shard_wallet', receiver.email, shards=4, stdout=StringIO())
+
+    assert post_transfer(client, "30.00").status_code == 200
+    assert post_transfer(client, "20.00").status_code == 200
+
+    receiver.refresh_from_db()
+    assert receiver.wallet_balance == Decimal('0.00')
+    assert receiver.total_balance == Decimal('50.00')
+    assert BalanceShard.objects.filter(user=receiver).count() == 4
+
+    # Paying out more than the wallet row holds pulls the shards in first
+    hot_client = APIClient()
+    hot_client.force_authenticate(user=receiver)
+    response = post_transfer(hot_client, "45.00", receiver_email=sender.email)
+    assert response.status_code == 200
+    assert response.data['new_balance'] == 5.0
+
+    receiver.refresh_from_db()
+    assert receiver.wallet_balance == Decimal('5.00')
+    assert receiver.total_balance == Decimal('5.00')
+
+
+def test_batch_transfer_settles_per_line(wallets):
+    client, sender, receiver = wallets
+    User.objects.create_user(email='second@test.com', password='password123', wallet_balance=0)
+    key = str(uuid.uuid4())
+    payload = {
+        "idempotency_key": key,
+        "lines": [
+            {"receiver_email": "receiver@test.com", "amount": "30.00"},
+            {"receiver_email": "second@test.com", "amount": "50.00"},
+            {"receiver_email": "nobody@test.com", "amount": "1.00"},
+            {"receiver_email": "receiver@test.com", "amount": "25.00"},  # only 20 left
+            {"receiver_email": "receiver@test.com", "amount": "20.00"},
+        ],
+    }
+
+    response = client.post(reverse('transfer_batch'), payload, format='json')
+    assert response.status_code == 200
+    assert [r['status'] for r in response.data['results']] == ['SUCCESS', 'SUCCESS', 'FAILED', 'FAILED', 'SUCCESS']
+    assert response.data['new_balance'] == 0.0
+
+    receiver.refresh_from_db()
+    assert receiver.wallet_balance == Decimal('50.00')
+    assert User.objects.get(email='second@test.com').wallet_balance == Decimal('50.00')
+    assert Transaction.objects.count() == 3
+
+    # Same key: replayed, not paid twice
+    replay = client.post(reverse('transfer_batch'), payload, format='json')
+    assert replay.data == response.data
+    assert Transaction.objects.count() == 3
+
+
+def test_batch_transfer_streams_progress(wallets):
+    client, sender, receiver = wallets
+    payload = {
+        "idempotency_key": str(uuid.uuid4()),
+        "lines": [{"receiver_email": "receiver@test.com", "amount": "1.00"}] * 3,
+    }
+
+    response = client.post(reverse('transfer_batch') + '?stream=1', payload, format='json')
+    # The batch runs as the body streams, so it keeps its admission slot
+    assert throttling.transfers.inflight == 1
+    events = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+    assert throttling.transfers.inflight == 0
+    assert 'progress' in events[0]
+    assert events[-1]['result']['status'] == 200
+    assert events[-1]['result']['body']['succeeded'] == 3
+
+    # ... or until the client goes away
+    payload['idempotency_key'] = str(uuid.uuid4())
+    response = client.post(reverse('transfer_batch') + '?stream=1', payload, format='json')
+    response.close()
+    assert throttling.transfers.inflight == 0
+
+
+def test_batch_progress_streams_under_asgi(wallets, monkeypatch):
+    _, sender, _ = wallets
+    monkeypatch.setattr(views, 'iter_batch_transfer', partial(services.iter_batch_transfer, progress_every=1))
+    payload = {
+        "idempotency_key": str(uuid.uuid4()),
+        "lines": [{"receiver_email": "receiver@test.com", "amount": "1.00"}] * 3,
+    }
+
+    async def first_event_then_rest():
+        response = await AsyncClient().post(
+            reverse('transfer_batch') + '?stream=1', payload, content_type='application/json',
+            headers={'Authorization': f'Bearer {AccessToken.for_user(sender)}'},
+        )
+        assert response.is_async
+        body = aiter(response.streaming_content)
+        first = json.loads(await anext(body))
+        state = (throttling.transfers.inflight, await sync_to_async(Transaction.objects.count)())
+        return first, state, [json.loads(chunk) async for chunk in body]
+
+    first, (inflight, settled), rest = async_to_sync(first_event_then_rest)()
+    # The first event arrives while the batch is still running, holding its slot
+    assert first == {"progress": {"stage": "settling", "processed": 1, "total": 3}}
+    assert (inflight, settled) == (1, 0)
+    assert rest[-1]['result']['body']['succeeded'] == 3
+    assert throttling.transfers.inflight == 0
+
+
+def test_async_stream_gives_its_slot_back_when_cancelled():
+    async def stalls():
+        yield b'{}\n'
+        await asyncio.Event().wait()
+
+    async def client_goes_away():
+        throttling.transfers.admit()
+        stream = throttling.AsyncAdmittedStream(stalls(), throttling.transfers)
+        await anext(stream)
+        waiting = asyncio.ensure_future(anext(stream))
+        await asyncio.sleep(0)
+        waiting.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiting
+
+    async_to_sync(client_goes_away)()
+    assert throttling.transfers.inflight == 0
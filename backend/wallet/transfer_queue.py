@@ -0,0 +1,138 @@
+"""
+Settlement of queued transfers (settings.WALLET_TRANSFER_MODE = 'queued').
+
+The transfer endpoint only records a PENDING Transaction. Workers
+(`process_transfers`) then settle the queue a batch at a time, in one
+database transaction per batch:
+
+1. claim the oldest PENDING rows with FOR UPDATE SKIP LOCKED, so
+   concurrent workers take disjoint batches;
+2. lock every wallet in the batch once, in id order (the order sync
+   transfers lock in, so the two can't deadlock);
+3. settle the batch in memory in queue order: a transfer the sender can't
+   cover at its turn fails, everything else moves the money;
+4. write the balances back with one bulk update, append the ledger
+   entries in one INSERT and flip the statuses with one UPDATE per outcome.
+
+So a commit (and its fsync) is paid per batch rather than per transfer.
+Hot receivers are credited on their wallet row, which is locked anyway.
+
+Jobs that follow the ledger by id (daily summaries, reconciliation, and
+through them archival) stop short of the oldest PENDING row, since it
+may still turn into SUCCESS.
+"""
+import logging
+import threading
+from django.contrib.auth import get_user_model
+from django.db import DatabaseError, connection, transaction
+from django.utils import timezone
+
+from core.replicas import pin_to_primary
+from .ledger import record, transfer_entries
+from .models import Transaction, Wallet
+from .services import write_wallets
+
+logger = logging.getLogger(__name__)
+
+User = get_user_model()
+
+# The reason a settled transfer can fail: the receiver was checked when
+# it was queued
+FAILURE_REASON = "Insufficient funds"
+
+
+def oldest_pending():
+    """Id of the oldest PENDING transaction, or None (reads the partial index)."""
+    return Transaction.objects.filter(status='PENDING').order_by('id').values_list('id', flat=True).first()
+
+
+def settle_pending(batch_size):
+    """
+    Settles up to `batch_size` queued transfers in one transaction.
+    Returns how many were settled; 0 means the queue is empty (or every
+    pending row is claimed by another worker).
+    """
+    with transaction.atomic():
+        batch = list(
+            Transaction.objects.select_for_update(skip_locked=True).filter(status='PENDING').order_by('id')
+            .values_list('id', 'sender_id', 'receiver_id', 'amount', 'created_at')[:batch_size]
+        )
+        if not batch:
+            return 0
+
+        wallet_ids = {row[1] for row in batch} | {row[2] for row in batch}
+        wallets = {
+            w.user_id: w for w in Wallet.objects.select_for_update().filter(user_id__in=wallet_ids).order_by('user_id')
+        }
+        hot = set(User.objects.filter(pk__in=wallet_ids, shard_count__gt=0).values_list('pk', flat=True))
+
+        now = timezone.now()
+        succeeded, failed, entries = [], [], []
+        for tx_id, sender_id, receiver_id, amount, _ in batch:
+            if wallets[sender_id].balance < amount:
+                failed.append(tx_id)
+                continue
+            wallets[sender_id].balance -= amount
+            wallets[receiver_id].balance += amount
+            succeeded.append(tx_id)
+            entries += transfer_entries(
+                tx_id, sender_id, receiver_id, amount, now,
+                sender_balance=None if sender_id in hot else wallets[sender_id].balance,
+                receiver_balance=None if receiver_id in hot else wallets[receiver_id].balance,
+            )
+
+        if succeeded:
+            write_wallets(wallets.values())
+            record(entries)
+        # created_at bounds the UPDATEs to the partitions the batch is in
+        since = min(row[4] for row in batch)
+        for status, ids in (('SUCCESS', succeeded), ('FAILED', failed)):
+            if ids:
+                Transaction.objects.filter(id__in=ids, created_at__gte=since).update(status=status, updated_at=now)
+
+    pin_to_primary(*wallet_ids)
+    return len(batch)
+
+
+def work(batch_size, poll, stop):
+    """One worker thread: settles batches until `stop` is set."""
+    try:
+        while not stop.is_set():
+            try:
+                settled = settle_pending(batch_size)
+            except DatabaseError:
+                logger.exception("Settling queued transfers failed; retrying")
+                connection.close()
+                settled = 0
+            if not settled:
+                stop.wait(poll)
+    finally:
+        connection.close()
+
+
+def start_workers(count, batch_size, poll):
+    """Starts `count` worker threads. Returns (threads, stop event)."""
+    stop = threading.Event()
+    threads = [
+        threading.Thread(target=work, args=(batch_size, poll, stop), name=f'transfer-queue-{i}', daemon=True)
+        for i in range(count)
+    ]
+    for thread in threads:
+        thread.start()
+    return threads, stop
+
+
+def drain(workers, batch_size):
+    """Settles everything queued so far with `workers` threads, then returns."""
+    def run():
+        try:
+            while settle_pending(batch_size):
+                pass
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=run) for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
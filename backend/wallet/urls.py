@@ -1,7 +1,17 @@
+from django.conf import settings
 from django.urls import path
-from .views import TransferFundsView, TransactionHistoryView
+from . import async_views, views
+
+# Under ASGI the hot endpoints can be served by their native async twins
+api = async_views if settings.ASYNC_VIEWS else views
 
 urlpatterns = [
-    path('transfer/', TransferFundsView.as_view(), name='transfer'),
-    path('history/', TransactionHistoryView.as_view(), name='history'),
+    path('transfer/', api.TransferFundsView.as_view(), name='transfer'),
+    path('transfer/<uuid:reference_id>/', views.TransferStatusView.as_view(), name='transfer_status'),
+    path('transfer/batch/', views.BatchTransferView.as_view(), name='transfer_batch'),
+    path('history/', api.TransactionHistoryView.as_view(), name='history'),
+    path('transactions/<uuid:reference_id>/', views.TransactionDetailView.as_view(), name='transaction_detail'),
+    path('statement/', views.StatementView.as_view(), name='statement'),
+    path('balance/', views.BalanceView.as_view(), name='balance'),
+    path('summary/', views.SummaryView.as_view(), name='summary'),
 ]
\ No newline at end of file
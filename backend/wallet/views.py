@@ -1,103 +1,256 @@
+import json
+import logging
+from django.http import StreamingHttpResponse
+from django.contrib.auth import get_user_model
+from django.db.models import Q
+from django.utils import timezone
 from rest_framework.views import APIView
 from rest_framework.generics import ListAPIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
-from django.db import transaction
-from django.shortcuts import get_object_or_404
-from django.contrib.auth import get_user_model
-from django.db.models import Q
 
-from .models import Transaction, IdempotencyLog
-from .serializers import TransferSerializer, TransactionHistorySerializer
+from core.replicas import ReplicaReadMixin, current_read_alias
+from core.streaming import streaming_body
+from core.throttling import AdmissionControlMixin, TransferRateThrottle
+
+from .models import Transaction
+from .pagination import KeysetPagination
+from .serializers import (
+    TransferSerializer, BatchTransferSerializer, TransactionHistorySerializer,
+    SummaryQuerySerializer, SummaryPeriodSerializer, StatementQuerySerializer, BalanceQuerySerializer,
+)
+from .services import transfer_funds, iter_batch_transfer
+from .archive import find_archived
+from .ledger import balance_at, current_balance
+from .statements import FORMATS, find_resume_point, statement_rows
+from .transfer_queue import FAILURE_REASON
+from .summaries import summarize
+
+logger = logging.getLogger(__name__)
 
 User = get_user_model()
 
-class TransferFundsView(APIView):
+class TransferFundsView(AdmissionControlMixin, APIView):
     """
     Handles atomic money transfers with Idempotency and Row Locking.
+    The heavy lifting lives in wallet.services.transfer_funds. Throttled
+    per user and shed under overload (core.throttling).
     """
     permission_classes = [IsAuthenticated]
+    throttle_classes = [TransferRateThrottle]
 
     def post(self, request):
         serializer = TransferSerializer(data=request.data, context={'request': request})
         if not serializer.is_valid():
             return Response(serializer.errors, status=400)
 
-        sender = request.user
-        receiver_email = serializer.validated_data['receiver_email']
-        amount = serializer.validated_data['amount']
-        idem_key = serializer.validated_data['idempotency_key']
+        try:
+            body, status = transfer_funds(
+                request.user,
+                receiver_email=serializer.validated_data['receiver_email'],
+                amount=serializer.validated_data['amount'],
+                idempotency_key=serializer.validated_data['idempotency_key'],
+            )
+        except Exception as e:
+            logger.exception("Transfer Error")
+            return Response({"error": str(e)}, status=500)
 
-        # --- 1. IDEMPOTENCY CHECK ---
-        if IdempotencyLog.objects.filter(user=sender, key=idem_key).exists():
-            log = IdempotencyLog.objects.get(user=sender, key=idem_key)
-            return Response(log.response_body, status=log.response_code)
+        return Response(body, status=status)
 
-        try:
-            # --- 2. ATOMIC TRANSACTION START ---
-            with transaction.atomic():
-                receiver = User.objects.get(email=receiver_email)
-
-                # --- 3. DEADLOCK PREVENTION ---
-                users_to_lock = sorted([sender.id, receiver.id])
-                locked_users = {
-                    u.id: u for u in User.objects.select_for_update().filter(id__in=users_to_lock)
-                }
-                
-                sender_locked = locked_users[sender.id]
-                receiver_locked = locked_users[receiver.id]
-
-                # --- 4. BUSINESS LOGIC ---
-                if sender_locked.wallet_balance < amount:
-                    return Response({"error": "Insufficient funds"}, status=400)
-
-                sender_locked.wallet_balance -= amount
-                receiver_locked.wallet_balance += amount
-                
-                sender_locked.save()
-                receiver_locked.save()
-
-                tx = Transaction.objects.create(
-                    sender=sender,
-                    receiver=receiver,
-                    amount=amount,
-                    status='SUCCESS'
-                )
-                
-                # --- FIX IS HERE ---
-                # We must convert complex Python objects (UUID, Decimal) to primitives (str, float)
-                # so they can be saved in the JSONField of IdempotencyLog.
-                response_data = {
-                    "message": "Transfer Successful",
-                    "transaction_id": str(tx.reference_id),  # UUID -> String
-                    "new_balance": float(sender_locked.wallet_balance) # Decimal -> Float
-                }
-                
-                # --- 5. SAVE IDEMPOTENCY LOG ---
-                IdempotencyLog.objects.create(
-                    user=sender,
-                    key=idem_key,
-                    response_body=response_data,
-                    response_code=200
-                )
-
-                return Response(response_data, status=200)
 
+class TransferStatusView(APIView):
+    """
+    GET /api/wallet/transfer/<reference_id>/
+    Where a transfer stands: PENDING while it waits in the queue (queued
+    mode), then SUCCESS or FAILED. Read from the primary, since polling a
+    lagging replica would keep answering PENDING.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, reference_id):
+        user = request.user
+        tx = (
+            Transaction.objects.filter(Q(sender=user) | Q(receiver=user), reference_id=reference_id)
+            .only('reference_id', 'status').first()
+        )
+        if tx is None:
+            return Response({"error": "Transaction not found."}, status=404)
+        body = {"transaction_id": str(tx.reference_id), "status": tx.status}
+        if tx.status == 'FAILED':
+            body["error"] = FAILURE_REASON
+        return Response(body)
+
+
+class BatchTransferView(AdmissionControlMixin, APIView):
+    """
+    POST /api/wallet/transfer/batch/
+    Pays many receivers in one request and one DB transaction (payroll,
+    bulk disbursement) and returns a result per line. With `?stream=1`
+    the response is NDJSON: progress events while the batch runs, then
+    the result.
+    """
+    permission_classes = [IsAuthenticated]
+    throttle_classes = [TransferRateThrottle]
+
+    def post(self, request):
+        serializer = BatchTransferSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=400)
+
+        events = iter_batch_transfer(
+            request.user,
+            lines=serializer.validated_data['lines'],
+            idempotency_key=serializer.validated_data['idempotency_key'],
+        )
+        if request.query_params.get('stream'):
+            # The batch runs while the body streams: keep the slot till then
+            body = self.hold_admission(streaming_body(request, self.stream(events)))
+            return StreamingHttpResponse(body, content_type='application/x-ndjson')
+
+        try:
+            body, status = next(payload for kind, payload in events if kind == 'result')
         except Exception as e:
-            # Print error to console for debugging
-            print(f"Transfer Error: {str(e)}")
+            logger.exception("Batch Transfer Error")
             return Response({"error": str(e)}, status=500)
+        return Response(body, status=status)
+
+    def stream(self, events):
+        try:
+            for kind, payload in events:
+                if kind == 'result':
+                    body, status = payload
+                    payload = {"status": status, "body": body}
+                yield json.dumps({kind: payload}) + "\n"
+        except Exception as e:
+            logger.exception("Batch Transfer Error")
+            yield json.dumps({"error": str(e)}) + "\n"
 
 
-class TransactionHistoryView(ListAPIView):
+class TransactionHistoryView(ReplicaReadMixin, ListAPIView):
     """
     Returns the list of transactions where the user was sender OR receiver.
+
+    `list` doesn't page through the `sender OR receiver` filter itself: it
+    hands the paginator both sides as separate branches, each an index
+    range scan, which it UNIONs under a (created_at, id) keyset cursor.
     """
     serializer_class = TransactionHistorySerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
 
     def get_queryset(self):
         user = self.request.user
-        return Transaction.objects.filter(
-            Q(sender=user) | Q(receiver=user)
-        ).order_by('-created_at')
\ No newline at end of file
+        return Transaction.objects.history().filter(Q(sender=user) | Q(receiver=user))
+
+    def get_branches(self):
+        user = self.request.user
+        return (
+            Transaction.objects.history().filter(sender=user),
+            Transaction.objects.history().filter(receiver=user),
+        )
+
+    def list(self, request, *args, **kwargs):
+        page = self.paginate_queryset(self.get_branches())
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+
+class SummaryView(ReplicaReadMixin, APIView):
+    """
+    Sent/received totals per day or month for a date range
+    (`?start=YYYY-MM-DD&end=YYYY-MM-DD&group=day|month`, default the last
+    30 days by day). Read from the DailySummary rows plus the handful of
+    transactions the summary worker hasn't reached, so the cost grows with
+    the number of days, not the number of transactions.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        query = SummaryQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        params = query.validated_data
+        periods = summarize(request.user, params['start'], params['end'], group=params['group'])
+        return Response({
+            'start': params['start'],
+            'end': params['end'],
+            'group': params['group'],
+            'results': SummaryPeriodSerializer(periods, many=True).data,
+        })
+
+
+class StatementView(ReplicaReadMixin, APIView):
+    """
+    GET /api/wallet/statement/?start=&end=&output=csv|ndjson[&after=<reference_id>]
+    Streams every transaction in the range, oldest first, in constant
+    memory (see wallet.statements), under ASGI too (core.streaming). After
+    a dropped connection, pass the last reference_id received as `after`
+    to get the rest.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        query = StatementQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        params = query.validated_data
+
+        after = None
+        if 'after' in params:
+            after = find_resume_point(request.user, params['after'])
+            if after is None:
+                return Response({"after": ["Unknown reference_id."]}, status=400)
+
+        render, content_type = FORMATS[params['output']]
+        # The body is produced after the view returns, outside the routing
+        # context, so the rows are pinned to its database explicitly
+        rows = statement_rows(
+            request.user, params.get('start'), params.get('end'), after, using=current_read_alias()
+        )
+        response = StreamingHttpResponse(streaming_body(request, render(rows)), content_type=content_type)
+        filename = '-'.join(
+            ['statement', *(str(params[k]) for k in ('start', 'end') if k in params)]
+        ) + '.' + params['output']
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+
+class BalanceView(ReplicaReadMixin, APIView):
+    """
+    GET /api/wallet/balance/?at=<ISO datetime>
+    The user's balance as of `at`, read from the ledger's running balances
+    (wallet.ledger), or now without `at`. 404 for a moment before the
+    user's first ledger entry.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        query = BalanceQuerySerializer(data=request.query_params)
+        if not query.is_valid():
+            return Response(query.errors, status=400)
+        at = query.validated_data.get('at')
+        if at is None:
+            return Response({"balance": str(current_balance(request.user)), "at": timezone.now().isoformat()})
+        balance = balance_at(request.user, at)
+        if balance is None:
+            return Response({"error": "No ledger history that far back."}, status=404)
+        return Response({"balance": str(balance), "at": at.isoformat()})
+
+
+class TransactionDetailView(ReplicaReadMixin, APIView):
+    """
+    GET /api/wallet/transactions/<reference_id>/
+    One of the user's transactions by reference, whether it is still in
+    the live table or has been archived (`archived` says which).
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, reference_id):
+        user = request.user
+        tx = Transaction.objects.history().filter(Q(sender=user) | Q(receiver=user), reference_id=reference_id).first()
+        archived = tx is None
+        if archived:
+            tx = find_archived(reference_id)
+            if tx is None or user.pk not in (tx.sender_id, tx.receiver_id):
+                return Response({"error": "Transaction not found."}, status=404)
+            emails = dict(User.objects.filter(pk__in=(tx.sender_id, tx.receiver_id)).values_list('pk', 'email'))
+            tx.sender_email, tx.receiver_email = emails[tx.sender_id], emails[tx.receiver_id]
+        return Response({**TransactionHistorySerializer(tx).data, 'archived': archived})